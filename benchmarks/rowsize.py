@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Measures the memory used by each cached instance, with the normal and
+the compact (``sqlmeta.compact``) layouts::
+
+    python benchmarks/rowsize.py [rows] [columns]
+
+Each layout is measured in a separate process, as the growth of the
+resident set size while ``rows`` instances of a class with ``columns``
+integer and string columns are loaded from a select and kept.  The
+column values are shared between the rows, so only the cost of the
+instances themselves is counted.
+"""
+
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+def rss():
+    # In bytes; /proc is more precise than getrusage()
+    try:
+        f = open('/proc/self/statm')
+        try:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def measure(compact, rows, columns):
+    from sqlobject import SQLObject, IntCol, StringCol, sqlmeta, \
+         connectionForURI
+    conn = connectionForURI('sqlite:/:memory:?cacheSize=%d' % (rows * 2))
+    attrs = {'_connection': conn}
+    for i in range(columns):
+        if i % 2:
+            attrs['c%d' % i] = StringCol(default='value')
+        else:
+            attrs['c%d' % i] = IntCol(default=1)
+    attrs['sqlmeta'] = type('sqlmeta', (sqlmeta,), {'compact': compact})
+    cls = type('RowSize', (SQLObject,), attrs)
+    cls.createTable()
+    row = cls()
+    conn.query("INSERT INTO row_size (%s) SELECT %s FROM row_size"
+               % (', '.join(['c%d' % i for i in range(columns)]),
+                  ', '.join(['c%d' % i for i in range(columns)])))
+    # Doubling the table up to the size wanted
+    while conn.queryOne("SELECT COUNT(*) FROM row_size")[0] < rows:
+        conn.query("INSERT INTO row_size (%s) SELECT %s FROM row_size"
+                   % (', '.join(['c%d' % i for i in range(columns)]),
+                      ', '.join(['c%d' % i for i in range(columns)])))
+    conn.cache.clear()
+    select = cls.select(cls.q.id <= rows)
+    # Warm up (the row loader, the SQL of the select...)
+    list(cls.select(cls.q.id <= 10))
+    conn.cache.clear()
+    before = rss()
+    instances = list(select)
+    after = rss()
+    assert len(instances) == rows
+    return float(after - before) / rows
+
+def main(args):
+    rows = 100000
+    columns = 8
+    if args:
+        rows = int(args[0])
+    if len(args) > 1:
+        columns = int(args[1])
+    if len(args) > 2:
+        print '%.0f' % measure(args[2] == 'compact', rows, columns)
+        return
+    print '%d rows, %d columns:' % (rows, columns)
+    for layout in 'normal', 'compact':
+        output = subprocess.Popen(
+            [sys.executable, __file__, str(rows), str(columns), layout],
+            stdout=subprocess.PIPE).communicate()[0]
+        print '  %-8s %6s bytes per row' % (layout, output.strip())
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
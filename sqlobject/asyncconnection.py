@@ -0,0 +1,395 @@
+"""
+Non-blocking use of a connection.
+
+SQLObject's connections block the calling thread while a statement
+runs.  An ``AsyncConnection`` runs the work on a connection in a
+bounded pool of worker threads instead, and returns a ``Future`` for
+its result at once::
+
+    aconn = AsyncConnection(connection, workers=4)
+    person = aconn.get(Person, 1)
+    count = aconn.count(Person.select(Person.q.age > 30))
+    print person.result().name, count.result()
+
+A ``Future`` can also call a function when it is done
+(``addDoneCallback()``), which is how an event loop (Twisted's
+``deferToThread``-style code, Tornado's ``add_future()``...) picks up
+the results without blocking; the callbacks run in the worker thread,
+and the exceptions they raise are logged to the
+``sqlobject.asyncconnection`` logger.
+
+The work is done by the usual connection, with its instance cache,
+pool and compiled statements: the instances returned are the ones the
+connection caches, and are used from the thread of the caller as
+usual.  Selects run on the connection of the ``AsyncConnection``.
+``batches()`` reads the results of a select a batch at a time, and
+``transaction()`` runs a function in a transaction in one worker.
+"""
+
+import logging
+import sys
+import threading
+
+from sqlbuilder import NoDefault
+
+__all__ = ['AsyncConnection', 'Future', 'TimeoutError']
+
+log = logging.getLogger('sqlobject.asyncconnection')
+
+class TimeoutError(Exception):
+    pass
+
+class Future(object):
+
+    """
+    The result of some work run in a worker thread, available when
+    ``done()`` is true.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._excInfo = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def _wait(self, timeout):
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise TimeoutError("The work was not done after %s seconds"
+                                   % timeout)
+        finally:
+            self._condition.release()
+
+    def result(self, timeout=None):
+        """
+        Waits until the work is done (at most ``timeout`` seconds, or
+        raises ``TimeoutError``), and returns its result or raises its
+        exception.
+        """
+        self._wait(timeout)
+        if self._excInfo is not None:
+            excType, excValue, excTraceback = self._excInfo
+            raise excType, excValue, excTraceback
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Waits like ``result()``, and returns the exception the work
+        raised, or None.
+        """
+        self._wait(timeout)
+        if self._excInfo is not None:
+            return self._excInfo[1]
+        return None
+
+    def addDoneCallback(self, func):
+        """
+        Calls ``func(future)`` when the work is done -- at once if it
+        already is.  An exception raised by ``func`` is logged, not
+        raised.
+        """
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._callbacks.append(func)
+                return
+        finally:
+            self._condition.release()
+        self._call(func)
+
+    def _set(self, result=None, excInfo=None):
+        self._condition.acquire()
+        try:
+            self._result = result
+            self._excInfo = excInfo
+            self._done = True
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._condition.notifyAll()
+        finally:
+            self._condition.release()
+        for func in callbacks:
+            self._call(func)
+
+    def _call(self, func):
+        try:
+            func(self)
+        except Exception:
+            log.exception("Done callback %r of %r failed", func, self)
+
+def _run(future, func, args, kw):
+    try:
+        result = func(*args, **kw)
+    except:
+        future._set(excInfo=sys.exc_info())
+    else:
+        future._set(result)
+
+class _WorkerPool(object):
+
+    """
+    Runs the functions submitted in at most ``workers`` threads, which
+    are started when needed.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.threads = []
+        self.idle = 0
+        self.tasks = []
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def submit(self, func, *args, **kw):
+        future = Future()
+        self.condition.acquire()
+        try:
+            if self.closed:
+                raise RuntimeError("The AsyncConnection is closed")
+            self.tasks.append((future, func, args, kw))
+            if self.idle:
+                # The worker is no longer idle once woken up
+                self.idle -= 1
+                self.condition.notify()
+            elif len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                self.threads.append(thread)
+                thread.start()
+        finally:
+            self.condition.release()
+        return future
+
+    def _work(self):
+        while True:
+            self.condition.acquire()
+            try:
+                while not self.tasks and not self.closed:
+                    self.idle += 1
+                    self.condition.wait()
+                if not self.tasks:
+                    return
+                task = self.tasks.pop(0)
+            finally:
+                self.condition.release()
+            try:
+                _run(*task)
+            except Exception:
+                # The worker must stay alive for the work waiting
+                log.exception("Worker of %r failed", self)
+
+    def close(self, wait=True):
+        """
+        Stops the workers once the functions submitted are done.
+        """
+        self.condition.acquire()
+        try:
+            self.closed = True
+            self.condition.notifyAll()
+            threads = list(self.threads)
+        finally:
+            self.condition.release()
+        if wait:
+            current = threading.currentThread()
+            for thread in threads:
+                if thread is not current:
+                    thread.join()
+
+class AsyncConnection(object):
+
+    """
+    Runs the work on ``connection`` in at most ``workers`` threads, and
+    returns Futures for the results.  More work than workers waits for
+    a free one; as each worker takes a database connection of its own
+    while it works, keep ``workers`` within the connection pool.
+    """
+
+    def __init__(self, connection, workers=4):
+        self.connection = connection
+        self._workers = _WorkerPool(workers)
+
+    def call(self, func, *args, **kw):
+        """
+        Runs ``func(*args, **kw)`` in a worker; returns a Future.
+        """
+        return self._workers.submit(func, *args, **kw)
+
+    def get(self, soClass, id):
+        return self.call(soClass.get, id, connection=self.connection)
+
+    def _select(self, select):
+        return select.connection(self.connection)
+
+    def list(self, select):
+        """
+        Returns a Future of the list of the results of ``select``.
+        """
+        return self.call(list, self._select(select))
+
+    def count(self, select):
+        return self.call(self._select(select).count)
+
+    def getOne(self, select, default=NoDefault):
+        return self.call(self._select(select).getOne, default)
+
+    def batches(self, select, batchSize=100, ahead=1):
+        """
+        Reads the results of ``select`` (through ``stream()``) in a
+        worker, ``batchSize`` at a time.  The ``next()`` method of the
+        ``BatchReader`` returned gives a Future of the next batch (a
+        list), or of an empty list after the last one.  The worker
+        reads ``ahead`` batches before they are asked for, and stops
+        at ``close()``.
+        """
+        state = _BatchState(ahead)
+        self.call(state.read, self._select(select), batchSize)
+        return BatchReader(state)
+
+    def transaction(self, func, *args, **kw):
+        """
+        Runs ``func(trans, *args, **kw)`` in a worker, with ``trans`` a
+        new transaction of the connection.  The transaction is
+        committed if ``func`` returns, and rolled back if it raises;
+        returns a Future of the result of ``func``.
+        """
+        return self.call(self._inTransaction, func, args, kw)
+
+    def _inTransaction(self, func, args, kw):
+        trans = self.connection.transaction()
+        try:
+            result = func(trans, *args, **kw)
+        except:
+            excType, excValue, excTraceback = sys.exc_info()
+            trans.rollback()
+            raise excType, excValue, excTraceback
+        trans.commit(close=True)
+        return result
+
+    def close(self, wait=True):
+        """
+        Stops the workers (after the work already submitted).
+        """
+        self._workers.close(wait)
+
+class _BatchState(object):
+
+    """
+    The batches read by a worker for a BatchReader; kept apart from
+    the reader, so the reader can be dropped (and close the state)
+    while the worker waits.
+    """
+
+    def __init__(self, ahead):
+        self.ahead = ahead
+        self.condition = threading.Condition()
+        # Batches read and not asked for, and Futures asked for and
+        # not read yet
+        self.ready = []
+        self.waiting = []
+        self.finished = False
+        self.excInfo = None
+        self.closed = False
+
+    def read(self, select, batchSize):
+        try:
+            batch = []
+            for inst in select.stream(batchSize):
+                batch.append(inst)
+                if len(batch) == batchSize:
+                    if not self._put(batch):
+                        return
+                    batch = []
+            if batch:
+                self._put(batch)
+        except:
+            self._finish(sys.exc_info())
+        else:
+            self._finish()
+
+    def _put(self, batch):
+        self.condition.acquire()
+        try:
+            while not self.closed and not self.waiting \
+                    and len(self.ready) >= self.ahead:
+                self.condition.wait()
+            if self.closed:
+                return False
+            if not self.waiting:
+                self.ready.append(batch)
+                return True
+            future = self.waiting.pop(0)
+        finally:
+            self.condition.release()
+        future._set(batch)
+        return True
+
+    def _finish(self, excInfo=None):
+        self.condition.acquire()
+        try:
+            self.finished = True
+            self.excInfo = excInfo
+            waiting = self.waiting
+            self.waiting = []
+        finally:
+            self.condition.release()
+        for future in waiting:
+            future._set([], excInfo)
+
+    def next(self):
+        future = Future()
+        excInfo = None
+        self.condition.acquire()
+        try:
+            if self.ready:
+                batch = self.ready.pop(0)
+                self.condition.notify()
+            elif self.finished:
+                batch = []
+                excInfo = self.excInfo
+            else:
+                self.waiting.append(future)
+                return future
+        finally:
+            self.condition.release()
+        future._set(batch, excInfo)
+        return future
+
+    def close(self):
+        self.condition.acquire()
+        try:
+            self.closed = True
+            self.ready = []
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+class BatchReader(object):
+
+    """
+    Gives the batches of a select read by ``AsyncConnection.batches()``.
+    """
+
+    def __init__(self, state):
+        self._state = state
+
+    def next(self):
+        """
+        Returns a Future of the next batch.
+        """
+        return self._state.next()
+
+    def close(self):
+        """
+        Stops the reading of the batches.
+        """
+        self._state.close()
+
+    def __del__(self):
+        self._state.close()
@@ -8,6 +8,7 @@ objects in a cache that doesn't allow them to be garbage collected
 
 import threading
 from weakref import ref
+from util.threadinglocal import local
 from time import time as now
 
 class CacheFactory(object):
@@ -20,7 +21,7 @@ class CacheFactory(object):
     """
 
     def __init__(self, cullFrequency=100, cullFraction=2,
-                 cache=True):
+                 cache=True, cacheSize=None):
         """
         Every cullFrequency times that an item is retrieved from
         this cache, the cull method is called.
@@ -38,6 +39,10 @@ class CacheFactory(object):
         However, in all cases a weak reference is kept to created
         objects, and if the object hasn't been garbage collected
         it will be returned.
+
+        ``cacheSize`` is the maximum number of strongly-held
+        objects; it is ignored by this class (which culls by
+        frequency) but used by the bounded subclasses.
         """
 
         self.cullFrequency = cullFrequency
@@ -45,11 +50,72 @@ class CacheFactory(object):
         self.cullOffset = 0
         self.cullFraction = cullFraction
         self.doCache = cache
+        if cacheSize is not None:
+            cacheSize = int(cacheSize)
+        self.cacheSize = cacheSize
 
         if self.doCache:
             self.cache = {}
         self.expiredCache = {}
         self.lock = threading.Lock()
+        # id -> threading.Event set when the object is created
+        self._inFlight = {}
+        self._threadLocal = local()
+        self.resetStats()
+
+    def resetStats(self):
+        """
+        Resets the hit/miss/eviction counters.  The counters are not
+        protected by a lock, so they are approximate under heavy
+        concurrency, but good enough to size the cache.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dictionary with the hit/miss/eviction counters and
+        the current number of strongly and weakly held objects.
+        """
+        if self.doCache:
+            size = len(self.cache)
+        else:
+            size = 0
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': size,
+                'weakSize': len(self.expiredCache),
+                'maxSize': self.cacheSize}
+
+    # These hooks let subclasses implement another replacement
+    # policy; the default implementation is the periodic cull.
+
+    def _maybeCull(self):
+        if self.cullCount > self.cullFrequency:
+            # Two threads could hit the cull in a row, but
+            # that's not so bad.  At least by setting cullCount
+            # back to zero right away we avoid this.  The cull
+            # method has a lock, so it's threadsafe.
+            self.cullCount = 0
+            self.cull()
+        else:
+            self.cullCount = self.cullCount + 1
+
+    def _used(self, id):
+        """Called when an object is found in the strong cache."""
+        pass
+
+    def _stored(self, id):
+        """Called after an object has been put in the strong cache."""
+        pass
+
+    def _forget(self, id):
+        """Called after an object has been removed from the strong cache."""
+        pass
+
+    def _forgetAll(self):
+        """Called after the strong cache has been emptied."""
+        pass
 
     def tryGet(self, id):
         """
@@ -61,17 +127,17 @@ class CacheFactory(object):
             return value()
         if not self.doCache:
             return None
-        return self.cache.get(id)
+        value = self.cache.get(id)
+        if value is not None:
+            self._used(id)
+        return value
 
     def get(self, id):
         """
-        This method can cause deadlocks!  tryGet is safer
-
         This returns the object found in cache, or None.  If None,
-        then the cache will remain locked!  This is so that the
-        calling function can create the object in a threadsafe manner
-        before releasing the lock.  You should use this like (note
-        that ``cache`` is actually a CacheSet object in this
+        then the calling function must create the object, ``.put()``
+        it and call ``.finishPut()`` in any case.  You should use this
+        like (note that ``cache`` is actually a CacheSet object in this
         example)::
 
           obj = cache.get(some_id, my_class)
@@ -82,81 +148,112 @@ class CacheFactory(object):
               finally:
                   cache.finishPut(cls)
 
+        Objects are created "single-flight": while a thread creates
+        the object for an id, other threads asking for the same id
+        wait for it and then get it from the cache, and threads asking
+        for other ids are not held up.  A thread must not ask for the
+        id it is creating the object for; that deadlocks.
+
         This method checks both the main cache (which retains
         references) and the 'expired' cache, which retains only weak
         references.
         """
 
         if self.doCache:
-            if self.cullCount > self.cullFrequency:
-                # Two threads could hit the cull in a row, but
-                # that's not so bad.  At least by setting cullCount
-                # back to zero right away we avoid this.  The cull
-                # method has a lock, so it's threadsafe.
-                self.cullCount = 0
-                self.cull()
-            else:
-                self.cullCount = self.cullCount + 1
-
-            try:
-                return self.cache[id]
-            except KeyError:
-                pass
-            self.lock.acquire()
+            self._maybeCull()
             try:
                 val = self.cache[id]
             except KeyError:
                 pass
             else:
-                self.lock.release()
+                self.hits += 1
+                self._used(id)
                 return val
+        else:
             try:
                 val = self.expiredCache[id]()
             except KeyError:
-                return None
+                pass
             else:
-                del self.expiredCache[id]
-                if val is None:
-                    return None
-            self.cache[id] = val
-            self.lock.release()
-            return val
-
-        else:
-            try:
-                val = self.expiredCache[id]()
                 if val is not None:
+                    self.hits += 1
                     return val
-            except KeyError:
-                pass
+
+        while 1:
             self.lock.acquire()
             try:
-                val = self.expiredCache[id]()
-            except KeyError:
-                return None
-            else:
-                if val is None:
-                    del self.expiredCache[id]
+                val = self._find(id)
+                if val is not None:
+                    self.hits += 1
+                    return val
+                flight = self._inFlight.get(id)
+                if flight is None:
+                    # This thread creates the object
+                    self._inFlight[id] = threading.Event()
+                    self._creating().append(id)
+                    self.misses += 1
                     return None
-            self.lock.release()
-            return val
+            finally:
+                self.lock.release()
+            # Another thread is creating the object; if it fails,
+            # this thread will try itself
+            flight.wait()
+
+    def _find(self, id):
+        # Must be called with the lock held
+        if self.doCache:
+            val = self.cache.get(id)
+            if val is not None:
+                self._used(id)
+                return val
+        try:
+            val = self.expiredCache[id]()
+        except KeyError:
+            return None
+        if self.doCache:
+            del self.expiredCache[id]
+            if val is not None:
+                self.cache[id] = val
+                self._stored(id)
+        elif val is None:
+            del self.expiredCache[id]
+        return val
+
+    def _creating(self):
+        # The ids this thread is creating objects for
+        try:
+            return self._threadLocal.creating
+        except AttributeError:
+            creating = self._threadLocal.creating = []
+            return creating
 
     def put(self, id, obj):
         """
         Puts an object into the cache.  Should only be called after
         .get(), so that duplicate objects don't end up in the cache.
         """
-        if self.doCache:
-            self.cache[id] = obj
-        else:
-            self.expiredCache[id] = ref(obj)
+        self.lock.acquire()
+        try:
+            if self.doCache:
+                self.cache[id] = obj
+                self._stored(id)
+            else:
+                self.expiredCache[id] = ref(obj)
+        finally:
+            self.lock.release()
 
     def finishPut(self):
         """
-        Releases the lock that is retained when .get() is called and
-        returns None.
+        Ends the creation of the object .get() returned None for and
+        wakes up the threads waiting for it.  Returns None.
         """
-        self.lock.release()
+        self.lock.acquire()
+        try:
+            id = self._creating().pop()
+            flight = self._inFlight.pop(id)
+        finally:
+            self.lock.release()
+        flight.set()
 
     def created(self, id, obj):
         """
@@ -166,16 +263,9 @@ class CacheFactory(object):
         of this situation.
         """
         if self.doCache:
-            if self.cullCount > self.cullFrequency:
-                # Two threads could hit the cull in a row, but
-                # that's not so bad.  At least by setting cullCount
-                # back to zero right away we avoid this.  The cull
-                # method has a lock, so it's threadsafe.
-                self.cullCount = 0
-                self.cull()
-            else:
-                self.cullCount = self.cullCount + 1
+            self._maybeCull()
             self.cache[id] = obj
+            self._stored(id)
         else:
             self.expiredCache[id] = ref(obj)
 
@@ -200,6 +290,7 @@ class CacheFactory(object):
                 # create a weakref, then remove from the cache
                 obj = ref(self.cache[id])
                 del self.cache[id]
+                self.evictions += 1
 
                 #the object may have been gc'd when removed from the cache
                 #above, no need to place in expiredCache
@@ -219,6 +310,7 @@ class CacheFactory(object):
         """
         if self.doCache:
             self.cache.clear()
+            self._forgetAll()
         self.expiredCache.clear()
 
     def expire(self, id):
@@ -232,6 +324,7 @@ class CacheFactory(object):
         try:
             if id in self.cache:
                 del self.cache[id]
+                self._forget(id)
             if id in self.expiredCache:
                 del self.expiredCache[id]
         finally:
@@ -249,6 +342,7 @@ class CacheFactory(object):
             for key, value in self.cache.items():
                 self.expiredCache[key] = ref(value)
             self.cache = {}
+            self._forgetAll()
         finally:
             self.lock.release()
 
@@ -278,6 +372,186 @@ class CacheFactory(object):
                 all.append(value())
         return all
 
+class LRUCacheFactory(CacheFactory):
+
+    """
+    A CacheFactory that holds at most ``cacheSize`` objects in the
+    strong cache.  When the limit is exceeded the least recently used
+    object is moved to the weakref cache, so (unlike the periodic
+    cull) frequently used objects are never thrown away.
+    """
+
+    defaultCacheSize = 1000
+
+    def __init__(self, *args, **kw):
+        self._orderLock = threading.Lock()
+        CacheFactory.__init__(self, *args, **kw)
+        if self.cacheSize is None:
+            self.cacheSize = self.defaultCacheSize
+        self._forgetAll()
+
+    def _maybeCull(self):
+        pass
+
+    # The recency order is kept in a circular doubly linked list of
+    # [prev, next, id] links, the oldest one right after the root;
+    # self._links maps ids to their links.  The order lock is never
+    # held while the database is accessed.
+
+    def _unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+
+    def _append(self, link):
+        root = self._root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+    def _used(self, id):
+        self._orderLock.acquire()
+        try:
+            link = self._links.get(id)
+            if link is not None:
+                self._unlink(link)
+                self._append(link)
+        finally:
+            self._orderLock.release()
+
+    def _stored(self, id):
+        self._orderLock.acquire()
+        try:
+            link = self._links.get(id)
+            if link is None:
+                link = self._links[id] = [None, None, id]
+            else:
+                self._unlink(link)
+            self._append(link)
+            self._trim()
+        finally:
+            self._orderLock.release()
+
+    def _forget(self, id):
+        self._orderLock.acquire()
+        try:
+            link = self._links.pop(id, None)
+            if link is not None:
+                self._unlink(link)
+        finally:
+            self._orderLock.release()
+
+    def _forgetAll(self):
+        self._orderLock.acquire()
+        try:
+            root = []
+            root[:] = [root, root, None]
+            self._root = root
+            self._links = {}
+        finally:
+            self._orderLock.release()
+
+    def _trim(self):
+        # Must be called with the order lock held
+        root = self._root
+        while len(self._links) > self.cacheSize:
+            link = root[1]
+            self._unlink(link)
+            del self._links[link[2]]
+            self._evict(link[2])
+        if len(self.expiredCache) > self.cacheSize:
+            self._purgeExpired()
+
+    def _evict(self, id):
+        obj = self.cache.pop(id, None)
+        if obj is not None:
+            self.expiredCache[id] = ref(obj)
+            self.evictions += 1
+
+    def _purgeExpired(self):
+        for key, value in self.expiredCache.items():
+            if value() is None:
+                self.expiredCache.pop(key, None)
+
+    def cull(self):
+        """
+        Trims the cache down to ``cacheSize`` objects and removes
+        dead references from the expired cache.
+        """
+        self._orderLock.acquire()
+        try:
+            self._trim()
+            self._purgeExpired()
+        finally:
+            self._orderLock.release()
+
+class LFUCacheFactory(LRUCacheFactory):
+
+    """
+    A CacheFactory that keeps the most frequently used objects.
+    Finding the least frequently used object is not cheap, so the
+    strong cache is allowed to grow ``1/cullFraction`` over
+    ``cacheSize`` and is then trimmed back to ``cacheSize`` in one
+    pass.  Use counts are halved on every trim, so objects that were
+    popular a long time ago eventually age out.
+    """
+
+    def _used(self, id):
+        counts = self._counts
+        counts[id] = counts.get(id, 0) + 1
+
+    def _stored(self, id):
+        self._orderLock.acquire()
+        try:
+            self._counts[id] = self._counts.get(id, 0) + 1
+            if len(self._counts) > \
+                    self.cacheSize + self.cacheSize // self.cullFraction:
+                self._trim()
+        finally:
+            self._orderLock.release()
+
+    def _forget(self, id):
+        self._counts.pop(id, None)
+
+    def _forgetAll(self):
+        self._counts = {}
+
+    def _trim(self):
+        # Must be called with the order lock held
+        counts = self._counts
+        excess = len(counts) - self.cacheSize
+        if excess > 0:
+            byCount = [(count, id) for id, count in counts.items()]
+            byCount.sort()
+            for count, id in byCount[:excess]:
+                del counts[id]
+                self._evict(id)
+            for id, count in counts.items():
+                counts[id] = (count + 1) // 2
+        if len(self.expiredCache) > self.cacheSize:
+            self._purgeExpired()
+
+# Replacement policies by name; sqlmeta.cachePolicy and the
+# ``cachePolicy`` connection parameter may also be given a
+# CacheFactory subclass directly.
+cachePolicies = {
+    'cull': CacheFactory,
+    'lru': LRUCacheFactory,
+    'lfu': LFUCacheFactory,
+    }
+
+def getCachePolicy(policy):
+    if policy is None:
+        return CacheFactory
+    if isinstance(policy, basestring):
+        try:
+            return cachePolicies[policy.lower()]
+        except KeyError:
+            raise ValueError(
+                "Unknown cache policy %r (expected one of: %s)"
+                % (policy, ', '.join(cachePolicies.keys())))
+    return policy
+
 class CacheSet(object):
 
     """
@@ -290,15 +564,35 @@ class CacheSet(object):
 
     def __init__(self, *args, **kw):
         self.caches = {}
+        # The classes of the caches, by name
+        self.classes = {}
+        self.policy = kw.pop('policy', None)
         self.args = args
         self.kw = kw
 
+    def _newCache(self, cls):
+        """
+        Creates the cache for ``cls``; the replacement policy and
+        the size can be overridden per class with
+        ``sqlmeta.cachePolicy`` and ``sqlmeta.cacheSize``.
+        """
+        sqlmeta = getattr(cls, 'sqlmeta', None)
+        policy = getattr(sqlmeta, 'cachePolicy', None) or self.policy
+        kw = self.kw
+        cacheSize = getattr(sqlmeta, 'cacheSize', None)
+        if cacheSize is not None:
+            kw = kw.copy()
+            kw['cacheSize'] = cacheSize
+        cache = getCachePolicy(policy)(*self.args, **kw)
+        self.caches[cls.__name__] = cache
+        self.classes[cls.__name__] = cls
+        return cache
+
     def get(self, id, cls):
         try:
             return self.caches[cls.__name__].get(id)
         except KeyError:
-            self.caches[cls.__name__] = CacheFactory(*self.args, **self.kw)
-            return self.caches[cls.__name__].get(id)
+            return self._newCache(cls).get(id)
 
     def put(self, id, cls, obj):
         self.caches[cls.__name__].put(id, obj)
@@ -310,8 +604,7 @@ class CacheSet(object):
         try:
             self.caches[cls.__name__].created(id, obj)
         except KeyError:
-            self.caches[cls.__name__] = CacheFactory(*self.args, **self.kw)
-            self.caches[cls.__name__].created(id, obj)
+            self._newCache(cls).created(id, obj)
 
     def expire(self, id, cls):
         try:
@@ -337,7 +630,7 @@ class CacheSet(object):
 
     def allIDs(self, cls):
         try:
-            self.caches[cls.__name__].allIDs()
+            return self.caches[cls.__name__].allIDs()
         except KeyError:
             return []
 
@@ -374,3 +667,128 @@ class CacheSet(object):
         else:
             return []
         
+
+    def stats(self, cls=None):
+        """
+        Returns the hit/miss/eviction counters of the cache for the
+        given class, or a dictionary of them keyed by class name.
+        """
+        if cls is None:
+            results = {}
+            for name, cache in self.caches.items():
+                results[name] = cache.stats()
+            return results
+        elif cls.__name__ in self.caches:
+            return self.caches[cls.__name__].stats()
+        else:
+            return None
+
+    def resetStats(self):
+        for cache in self.caches.values():
+            cache.resetStats()
+
+class ResultCache(object):
+
+    """
+    Caches the results of SELECT queries, keyed by their SQL.  Each
+    result is stored with the set of tables the query reads; a change
+    to one of the tables drops only the results that read it.
+
+    At most ``size`` results are kept (when it is full the least
+    recently used quarter is dropped), each for ``ttl`` seconds unless
+    given another TTL (None: until a table changes).
+
+    ``generation`` changes with every invalidation; a result computed
+    while a table changed is not stored if ``put()`` is given the
+    generation read before the query.
+    """
+
+    def __init__(self, size=100, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        # key -> [value, tables, expiry time or None, tick]
+        self.results = {}
+        # table -> {key: None}
+        self.tables = {}
+        self.tick = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations,
+                'size': len(self.results), 'maxSize': self.size}
+
+    def get(self, key, default=None):
+        self.tick += 1
+        entry = self.results.get(key)
+        if entry is None or (entry[2] is not None and entry[2] < now()):
+            self.misses += 1
+            return default
+        self.hits += 1
+        entry[3] = self.tick
+        return entry[0]
+
+    def put(self, key, tables, value, ttl=None, generation=None):
+        if ttl is None:
+            ttl = self.ttl
+        if ttl is None:
+            expires = None
+        else:
+            expires = now() + ttl
+        self.lock.acquire()
+        try:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self.results[key] = [value, tables, expires, self.tick]
+            for table in tables:
+                self.tables.setdefault(table, {})[key] = None
+            if len(self.results) > self.size:
+                entries = [(entry[3], key)
+                           for key, entry in self.results.items()]
+                entries.sort()
+                for tick, key in entries[:len(entries) - self.size * 3 // 4]:
+                    self._remove(key)
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        entry = self.results.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[1]:
+            keys = self.tables.get(table)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del self.tables[table]
+
+    def invalidate(self, tables):
+        """
+        Drops the results that read any of ``tables``.
+        """
+        self.lock.acquire()
+        try:
+            self.generation += 1
+            for table in tables:
+                keys = self.tables.get(table)
+                if keys:
+                    for key in keys.keys():
+                        self._remove(key)
+                        self.invalidations += 1
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.generation += 1
+            self.results.clear()
+            self.tables.clear()
+        finally:
+            self.lock.release()
@@ -0,0 +1,422 @@
+"""
+Set-based cascading deletes.
+
+The dependency graph of a class -- the ForeignKeys with ``cascade``
+set that point to it and the RelatedJoins it takes part in -- is
+worked out once per class (and forgotten when a class, column or
+join is added or removed).  Deleting a row then runs one ``DELETE ...
+WHERE fk IN (SELECT ...)`` or ``UPDATE ... SET fk = NULL`` statement
+per dependent table, deepest tables first, in one transaction,
+instead of instantiating and destroying every dependent row.
+
+``sqlmeta.cascadeMode`` selects the strategy:
+
+``None`` (the default)
+    Set-based, unless a receiver is connected to the row destroy or
+    update signals of a class in the graph; then per-row.
+``'rows'``
+    Always per-row: every dependent row is instantiated and destroyed
+    (or updated) with its own signals, as ``destroySelf()`` always did.
+``'sets'``
+    Set-based; no row signals are sent for the dependent rows.
+``'batches'``
+    Set-based, but the dependent rows are fetched ``maxInListSize``
+    at a time and their row signals are sent around the statement
+    that deletes or updates the batch.  Changes made by
+    ``RowUpdateSignal`` receivers to the new values are ignored.
+
+Graphs with inheritable classes, or with classes that override
+``destroySelf()`` or ``set()``, always use the per-row path.
+"""
+
+import classregistry
+import dbconnection
+import events
+import joins
+import main
+import sqlbuilder
+
+_plans = {}
+_watchedRegistries = {}
+
+def forgetPlans(*args):
+    """
+    Forgets all the plans; they are made again when needed.
+    """
+    _plans.clear()
+
+def getPlan(soClass):
+    try:
+        return _plans[soClass]
+    except KeyError:
+        pass
+    registryName = soClass.sqlmeta.registry
+    if registryName not in _watchedRegistries:
+        _watchedRegistries[registryName] = True
+        classregistry.registry(registryName).addCallback(forgetPlans)
+    plan = _plans[soClass] = CascadePlan(soClass)
+    return plan
+
+class CascadeStep(object):
+    """
+    The rows of ``soClass`` that point, through ``columns``, to rows
+    being deleted.
+    """
+
+    def __init__(self, soClass, columns):
+        self.soClass = soClass
+        self.columns = columns
+        self.restrict = self.delete = False
+        self.nullColumns = []
+        for col in columns:
+            if col.cascade == False:
+                self.restrict = True
+            elif col.cascade == 'null':
+                self.nullColumns.append(col)
+            elif col.cascade:
+                self.delete = True
+
+class CascadePlan(object):
+    """
+    What has to be done before a row of ``soClass`` can be deleted.
+    """
+
+    def __init__(self, soClass):
+        self.soClass = soClass
+        name = soClass.__name__
+        # (table, column) of the intermediate tables of RelatedJoins
+        self.joinTables = []
+        for join in soClass.sqlmeta.joins:
+            if isinstance(join, joins.SORelatedJoin):
+                self.joinTables.append((join.intermediateTable,
+                                        join.joinColumn))
+        self.steps = []
+        for k in soClass._SO_depends():
+            for join in k.sqlmeta.joins:
+                if isinstance(join, joins.SORelatedJoin) \
+                       and join.otherClassName == name \
+                       and (join.intermediateTable, join.otherColumn) \
+                           not in self.joinTables:
+                    self.joinTables.append((join.intermediateTable,
+                                            join.otherColumn))
+            cols = main.findDependantColumns(name, k)
+            if cols:
+                self.steps.append(CascadeStep(k, cols))
+        self._setBased = None
+        self._deleted = self._updated = None
+
+    def _walk(self):
+        # The classes whose rows may be deleted or updated
+        deleted = {}
+        updated = {}
+        pending = [self]
+        while pending:
+            plan = pending.pop()
+            for step in plan.steps:
+                if step.restrict:
+                    continue
+                if step.delete:
+                    if step.soClass not in deleted:
+                        deleted[step.soClass] = None
+                        pending.append(getPlan(step.soClass))
+                elif step.nullColumns:
+                    updated[step.soClass] = None
+        self._deleted = deleted.keys()
+        self._updated = updated.keys()
+        self._setBased = not self.soClass._inheritable
+        for k in self._deleted:
+            if k._inheritable or \
+                   k.destroySelf.im_func is not main.SQLObject.destroySelf.im_func:
+                self._setBased = False
+        for k in self._updated:
+            if k._inheritable or \
+                   k.set.im_func is not main.SQLObject.set.im_func:
+                self._setBased = False
+
+    def setBased(self):
+        """
+        Tells if the rows depending on a row can be deleted with
+        set-based statements.
+        """
+        if self._setBased is None:
+            self._walk()
+        return self._setBased
+
+    def observed(self):
+        """
+        Tells if a receiver listens to the row signals of the
+        dependent rows.
+        """
+        if self._setBased is None:
+            self._walk()
+        for k in self._deleted:
+            if events.hasReceivers(events.RowDestroySignal, k) or \
+                   events.hasReceivers(events.RowDestroyedSignal, k):
+                return True
+        for k in self._updated:
+            if events.hasReceivers(events.RowUpdateSignal, k) or \
+                   events.hasReceivers(events.RowUpdatedSignal, k):
+                return True
+        return False
+
+def destroyRow(inst):
+    """
+    Deletes the row of ``inst`` and the rows depending on it with
+    set-based statements.  Returns false, having done nothing, when
+    the per-row path has to be used instead -- also when no row
+    depends on ``inst``.  Row signals for ``inst`` itself are the
+    caller's business.
+    """
+    soClass = inst.__class__
+    plan = getPlan(soClass)
+    if not plan.steps and not plan.joinTables:
+        return False
+    strategy = getStrategy(soClass)
+    if strategy == 'rows':
+        return False
+    deleteRows(soClass, [soClass.q.id == inst.id], inst._connection,
+               '%s::%s' % (soClass.__name__, inst.id),
+               strategy == 'batches', inst)
+    return True
+
+def getStrategy(soClass):
+    """
+    Returns how the rows depending on rows of ``soClass`` are deleted:
+    ``'rows'`` (per-row, by ``destroySelf()``), ``'sets'`` or
+    ``'batches'`` (set-based, with the row signals sent per batch).
+    """
+    mode = soClass.sqlmeta.cascadeMode
+    if mode == 'rows':
+        return 'rows'
+    plan = getPlan(soClass)
+    if not plan.setBased():
+        return 'rows'
+    if mode is None and plan.observed():
+        return 'rows'
+    if mode == 'batches':
+        return 'batches'
+    return 'sets'
+
+def deleteRows(soClass, clauses, conn, name, signals=False, root=None):
+    """
+    Deletes the rows of ``soClass`` matching any of ``clauses``
+    (clauses on its table only) and the rows depending on them with
+    set-based statements, in a transaction if the backend supports
+    them.  ``name`` names the rows in the error raised for a
+    restriction.  No row signals are sent for the rows matching
+    ``clauses``.  With ``root``, the instance whose row is the one
+    row matching ``clauses``, that row is deleted by ``_SO_delete()``.
+    """
+    caches = [conn.cache]
+    inTransaction = isinstance(conn, dbconnection.Transaction)
+    if inTransaction:
+        caches.append(conn._dbConnection.cache)
+    if inTransaction or not conn.supportTransactions:
+        trans = conn
+    else:
+        trans = conn.transaction()
+    cascade = _Cascade(trans, caches, signals, name)
+    try:
+        for clause in clauses:
+            cascade.delete(soClass, clause, (), False, root)
+    except:
+        if trans is not conn:
+            trans.rollback()
+        raise
+    if trans is not conn:
+        trans.commit(close=True)
+    cascade.expireCaches(conn.cache)
+    if inTransaction:
+        # The parent connection's instances are expired on commit
+        deleted = conn._deletedCache
+        for soClass, id in cascade.obsolete + cascade.stale:
+            deleted.setdefault(soClass.__name__, []).append(id)
+
+class _Cascade(object):
+    """
+    One cascading delete, run through the transaction ``conn``.
+
+    The rows to delete from a class are given by a clause on its
+    table that may use subqueries on the tables of the classes in
+    ``path``.  Where a statement would have to read the table it
+    changes (a cycle in the graph, which MySQL refuses anyway) the
+    ids are fetched first.
+    """
+
+    def __init__(self, conn, caches, signals, name):
+        self.conn = conn
+        self.caches = caches
+        self.signals = signals
+        self.name = name
+        # (class, id) of the cached rows deleted/updated
+        self.obsolete = []
+        self.stale = []
+        # class -> {id: None} of the rows whose ids were fetched
+        self.seen = {}
+
+    def delete(self, soClass, clause, path, signals, root=None):
+        conn = self.conn
+        plan = getPlan(soClass)
+        fetched = []
+        if root is not None:
+            # The id is known, no need to fetch it
+            self.seen.setdefault(soClass, {})[root.id] = None
+            fetched.append([([root.id], ())])
+        for step in plan.steps:
+            k = step.soClass
+            for subquery, subpath in self._sources(soClass, clause, path, k,
+                                                   fetched):
+                if step.restrict:
+                    where = sqlbuilder.OR(*[
+                        sqlbuilder.IN(getattr(k.q, col.name), subquery)
+                        for col in step.columns])
+                    if k.select(where, connection=conn).count():
+                        raise main.SQLObjectIntegrityError, (
+                            "Tried to delete %s but "
+                            "table %s has a restriction against it" %
+                            (self.name, k.__name__))
+                elif step.delete:
+                    where = sqlbuilder.OR(*[
+                        sqlbuilder.IN(getattr(k.q, col.name), subquery)
+                        for col in step.columns])
+                    self.delete(k, where, subpath, self.signals)
+                else:
+                    for col in step.nullColumns:
+                        self.setNull(k, col, sqlbuilder.IN(
+                            getattr(k.q, col.name), subquery))
+        if plan.joinTables:
+            for subquery, subpath in self._sources(soClass, clause, path,
+                                                   None, fetched):
+                for table, column in plan.joinTables:
+                    conn.query(conn.sqlrepr(sqlbuilder.Delete(
+                        table,
+                        where=sqlbuilder.IN(sqlbuilder.Field(table, column),
+                                            subquery))))
+                    conn._tableChanged(table)
+        if root is not None:
+            conn._SO_delete(root)
+        elif signals:
+            self._inBatches(soClass, clause, self._deleteBatch)
+        else:
+            self._forget(soClass, clause, self.obsolete, fetched)
+            conn.query(conn.sqlrepr(sqlbuilder.Delete(
+                soClass.sqlmeta.table, where=clause)))
+            conn._forgetTable(soClass.sqlmeta.table, rowsTracked=True)
+
+    def setNull(self, soClass, col, clause):
+        if self.signals:
+            self._inBatches(soClass, clause, self._updateBatch, col)
+        else:
+            self._forget(soClass, clause, self.stale)
+            self.conn.query(self.conn.sqlrepr(sqlbuilder.Update(
+                soClass.sqlmeta.table, {col.dbName: None}, where=clause)))
+            self.conn._forgetTable(soClass.sqlmeta.table, rowsTracked=True)
+
+    def _ids(self, soClass, clause):
+        return [row[0] for row in self.conn.queryAll(self.conn.sqlrepr(
+            sqlbuilder.Select(soClass.q.id, where=clause)))]
+
+    def _chunks(self, ids):
+        size = self.conn.maxInListSize
+        return [ids[start:start+size] for start in range(0, len(ids), size)]
+
+    def _sources(self, soClass, clause, path, target, fetched):
+        """
+        Returns (subquery, path) pairs that select the ids of the
+        rows of ``soClass`` matching ``clause``, for statements on
+        the table of ``target``.  Fetched ids are kept in ``fetched``
+        (and used once there); ids fetched before for another level
+        are left out, which ends the recursion on cycles.
+        """
+        if not fetched and target is not soClass and target not in path:
+            return [(sqlbuilder.Select(soClass.q.id, where=clause),
+                     path + (soClass,))]
+        if not fetched:
+            seen = self.seen.setdefault(soClass, {})
+            ids = []
+            for id in self._ids(soClass, clause):
+                if id not in seen:
+                    seen[id] = None
+                    ids.append(id)
+            fetched.append([(chunk, ()) for chunk in self._chunks(ids)])
+        return fetched[0]
+
+    def _forget(self, soClass, clause, into, fetched=None):
+        """
+        Adds the cached rows of ``soClass`` matching ``clause`` to
+        ``into``; their ids are the ones in ``fetched``, or are
+        selected (only if the class has cached rows at all).
+        """
+        cached = {}
+        for cache in self.caches:
+            for id in cache.allIDs(soClass):
+                cached[id] = None
+        if not cached:
+            return
+        if fetched:
+            ids = []
+            for chunk, path in fetched[0]:
+                ids.extend(chunk)
+        else:
+            ids = self._ids(soClass, clause)
+        for id in ids:
+            if id in cached:
+                into.append((soClass, id))
+
+    def _inBatches(self, soClass, clause, func, *args):
+        for chunk in self._chunks(self._ids(soClass, clause)):
+            rows = soClass.getMany(chunk, connection=self.conn, default=None)
+            func(soClass, chunk, [row for row in rows if row is not None],
+                 *args)
+
+    def _deleteBatch(self, soClass, ids, rows):
+        conn = self.conn
+        post = []
+        for row in rows:
+            post_funcs = []
+            row.sqlmeta.send(events.RowDestroySignal, row, post_funcs)
+            post.append((row, post_funcs))
+        conn.query(conn.sqlrepr(sqlbuilder.Delete(
+            soClass.sqlmeta.table, where=sqlbuilder.IN(soClass.q.id, ids))))
+        conn._forgetRows(soClass.sqlmeta.table, ids)
+        self.obsolete.extend([(soClass, id) for id in ids])
+        for row, post_funcs in post:
+            row.sqlmeta._obsolete = True
+            conn.cache.expire(row.id, soClass)
+            for func in post_funcs:
+                func(row)
+            post_funcs = []
+            row.sqlmeta.send(events.RowDestroyedSignal, row, post_funcs)
+            for func in post_funcs:
+                func(row)
+
+    def _updateBatch(self, soClass, ids, rows, col):
+        conn = self.conn
+        for row in rows:
+            row.sqlmeta.send(events.RowUpdateSignal, row, {col.name: None})
+        conn.query(conn.sqlrepr(sqlbuilder.Update(
+            soClass.sqlmeta.table, {col.dbName: None},
+            where=sqlbuilder.IN(soClass.q.id, ids))))
+        conn._forgetRows(soClass.sqlmeta.table, ids)
+        self.stale.extend([(soClass, id) for id in ids])
+        for row in rows:
+            row.expire()
+            post_funcs = []
+            row.sqlmeta.send(events.RowUpdatedSignal, row, post_funcs)
+            for func in post_funcs:
+                func(row)
+
+    def expireCaches(self, cache):
+        """
+        Drops the deleted rows from ``cache`` and expires the updated
+        ones.
+        """
+        for soClass, id in self.obsolete:
+            inst = cache.tryGet(id, soClass)
+            if inst is not None:
+                inst.sqlmeta._obsolete = True
+                cache.expire(id, soClass)
+        for soClass, id in self.stale:
+            inst = cache.tryGet(id, soClass)
+            if inst is not None:
+                inst.expire()
@@ -225,6 +225,10 @@ class SOCol(object):
         else:
             self.to_python = None
             self.from_python = None
+        # The class converts its rows with the old to_python
+        soClass = getattr(self, 'soClass', None)
+        if soClass is not None:
+            soClass.sqlmeta._rowLoader = None
 
     def _get_validator(self):
         return self._validator
@@ -501,6 +505,10 @@ class SOStringLikeCol(SOCol):
 
 
 class StringValidator(validators.Validator):
+    # The (exact) types of the values to_python() returns unchanged;
+    # rows are loaded without calling it for these.  Only used where
+    # the class defines it, as subclasses may convert differently.
+    identityTypes = (type(None), str)
 
     def to_python(self, value, state):
         if value is None:
@@ -547,6 +555,7 @@ class NQuoted(sqlbuilder.SQLExpression):
         return "N" + sqlbuilder.sqlrepr(self.value, db)
 
 class UnicodeStringValidator(validators.Validator):
+    identityTypes = (type(None), unicode)
 
     def getDbEncoding(self, state):
         try:
@@ -622,6 +631,7 @@ class UnicodeCol(Col):
 
 
 class IntValidator(validators.Validator):
+    identityTypes = (type(None), int, long)
 
     def to_python(self, value, state):
         if value is None:
@@ -703,6 +713,7 @@ class BigIntCol(Col):
 
 
 class BoolValidator(validators.Validator):
+    identityTypes = (type(None), bool)
 
     def to_python(self, value, state):
         if value is None:
@@ -750,6 +761,7 @@ class BoolCol(Col):
 
 
 class FloatValidator(validators.Validator):
+    identityTypes = (type(None), float, int, long)
 
     def to_python(self, value, state):
         if value is None:
@@ -1076,6 +1088,9 @@ class SetCol(Col):
 
 
 class DateTimeValidator(validators.DateValidator):
+    identityTypes = (type(None), datetime.datetime, datetime.date,
+                     datetime.time)
+
     def to_python(self, value, state):
         if value is None:
             return None
@@ -1198,6 +1213,8 @@ class DateTimeCol(Col):
 
 
 class DateValidator(DateTimeValidator):
+    identityTypes = (type(None), datetime.date)
+
     def to_python(self, value, state):
         if isinstance(value, datetime.datetime):
             value = value.date()
@@ -1258,6 +1275,8 @@ class DateCol(Col):
 
 
 class TimeValidator(DateTimeValidator):
+    identityTypes = (type(None), datetime.time)
+
     def to_python(self, value, state):
         if isinstance(value, (datetime.time, sqlbuilder.SQLExpression)):
             return value
@@ -6,17 +6,21 @@ import new
 import os
 import sys
 import threading
+import time
 import types
 import urllib
 import warnings
 import weakref
 
-from cache import CacheSet
+from cache import CacheSet, ResultCache
 import classregistry
 import col
 from converters import sqlrepr
+from dberrors import PoolTimeoutError
 import main
+from rowcache import makeRowCache
 import sqlbuilder
+import timing
 from util.threadinglocal import local as threading_local
 
 warnings.filterwarnings("ignore", "DB-API extension cursor.lastrowid used")
@@ -69,17 +73,46 @@ class Boolean(object):
 
 class DBConnection:
 
+    # The maximum number of values put in one IN (...) list when
+    # rows are fetched in bulk; larger sets are fetched in chunks.
+    maxInListSize = 500
+
     def __init__(self, name=None, debug=False, debugOutput=False,
                  cache=True, style=None, autoCommit=True,
                  debugThreading=False, registry=None,
-                 logger=None, loglevel=None):
+                 logger=None, loglevel=None,
+                 cachePolicy=None, cacheSize=None, selectAfterInsert=True,
+                 paramQueries=False, statementCacheSize=100,
+                 rowCache=None, resultCacheSize=100, resultCacheTTL=60,
+                 transactionMerge=False):
         self.name = name
         self.debug = Boolean(debug)
         self.debugOutput = Boolean(debugOutput)
         self.debugThreading = Boolean(debugThreading)
         self.debugWriter = makeDebugWriter(self, logger, loglevel)
         self.doCache = Boolean(cache)
-        self.cache = CacheSet(cache=self.doCache)
+        self.cachePolicy = cachePolicy or None
+        if cacheSize:
+            cacheSize = int(cacheSize)
+        else:
+            cacheSize = None
+        self.cacheSize = cacheSize
+        self.cache = CacheSet(cache=self.doCache, policy=self.cachePolicy,
+                              cacheSize=self.cacheSize)
+        self.selectAfterInsert = Boolean(selectAfterInsert)
+        self.paramQueries = Boolean(paramQueries)
+        self.statementCache = StatementCache(int(statementCacheSize))
+        self.rowCache = makeRowCache(rowCache)
+        resultCacheSize = int(resultCacheSize)
+        if resultCacheTTL is not None and resultCacheTTL != '':
+            resultCacheTTL = float(resultCacheTTL)
+        else:
+            resultCacheTTL = None
+        if resultCacheSize:
+            self.resultCache = ResultCache(resultCacheSize, resultCacheTTL)
+        else:
+            self.resultCache = None
+        self.transactionMerge = Boolean(transactionMerge)
         self.style = style
         self._connectionNumbers = {}
         self._connectionCount = 1
@@ -316,14 +349,179 @@ class DBAPI(DBConnection):
 
     dbName = None
 
+    # Can many rows be inserted with one INSERT ... VALUES (...), (...)?
+    # If not, bulk inserts run one INSERT per row.
+    multiRowInsert = True
+
+    # Can an INSERT return the new row (queryInsertReturning())?
+    insertReturning = False
+
+    # Can UPDATE and DELETE statements end with RETURNING id?
+    updateReturning = False
+    deleteReturning = False
+
+    # Can other statements run on a connection while the rows of a
+    # stream cursor (_streamCursor()) on it are being read?  If so
+    # stream() reads the rows lazily in transactions too.
+    streamInterleaves = False
+
+    # The query run to check a pooled connection (poolPrePing)
+    pingQuery = 'SELECT 1'
+
+    # The connections opened beyond poolSize when maxOverflow is not
+    # given
+    defaultMaxOverflow = 10
+
     def __init__(self, **kw):
         self._pool = []
         self._poolLock = threading.Lock()
+        self._poolAvailable = threading.Condition(self._poolLock)
+        # Connections handed out by getConnection(), by id
+        self._checkedOut = {}
+        # Connections being checked or made by getConnection()
+        self._reserved = 0
+        self._connectionCreated = {}
+        # The number of idle connections kept (None: no limit), the
+        # number of connections allowed beyond that (only with a
+        # poolSize; defaultMaxOverflow when not given), how long to wait for a connection when all are in use, the
+        # age after which a connection is replaced (None: never), and
+        # whether to check connections before handing them out.
+        self.poolSize = _intOrNone(kw.pop('poolSize', None))
+        self.maxOverflow = _intOrNone(kw.pop('maxOverflow', None))
+        if self.poolSize is None and self.maxOverflow is not None:
+            raise ValueError("maxOverflow needs a poolSize")
+        self.poolTimeout = float(kw.pop('poolTimeout', 30))
+        poolRecycle = kw.pop('poolRecycle', None)
+        if poolRecycle is not None and poolRecycle != '':
+            poolRecycle = float(poolRecycle)
+        else:
+            poolRecycle = None
+        self.poolRecycle = poolRecycle
+        self.poolPrePing = Boolean(kw.pop('poolPrePing', False))
+        self.resetPoolStats()
+        # The query sinks (see sqlobject.timing), and the time the
+        # thread waited for its connection, reported with the next
+        # statement
+        self._querySinks = []
+        self._timingLocal = threading_local()
+        slowQueryThreshold = kw.pop('slowQueryThreshold', None)
         DBConnection.__init__(self, **kw)
         self._binaryType = type(self.module.Binary(''))
+        if slowQueryThreshold is not None and slowQueryThreshold != '':
+            self.addQuerySink(timing.SlowQueryLog(float(slowQueryThreshold),
+                                                  self.debugWriter))
 
-    def _runWithConnection(self, meth, *args):
+    def resetPoolStats(self):
+        self._poolStats = {'created': 0, 'waits': 0, 'waitTime': 0.0,
+                           'maxWaitTime': 0.0, 'timeouts': 0,
+                           'recycled': 0, 'pingFailures': 0}
+
+    def poolStats(self):
+        """
+        Returns a dictionary with the numbers of connections checked
+        out and idle, and counters of created connections, waits for
+        a free connection (with the total and longest wait time in
+        seconds), timeouts, recycled connections and failed pings.
+        """
+        self._poolLock.acquire()
+        try:
+            stats = self._poolStats.copy()
+            stats['checkedOut'] = len(self._checkedOut)
+            stats['idle'] = len(self._pool or ())
+        finally:
+            self._poolLock.release()
+        return stats
+
+    def _maxConnections(self):
+        if self.poolSize is None:
+            return None
+        if self.maxOverflow is None:
+            return self.poolSize + self.defaultMaxOverflow
+        return self.poolSize + self.maxOverflow
+
+    def addQuerySink(self, sink):
+        """
+        Times the statements run on this connection, passing a
+        ``timing.QueryEvent`` for each of them to ``sink.record()``.
+        """
+        self._querySinks = self._querySinks + [sink]
+        if len(self._querySinks) == 1:
+            # Time the statements run directly with _executeRetry()
+            self._executeRetry = _TimedExecute(self)
+
+    def removeQuerySink(self, sink):
+        sinks = list(self._querySinks)
+        sinks.remove(sink)
+        self._querySinks = sinks
+        if not sinks:
+            del self._executeRetry
+
+    def _recordQuery(self, event):
+        for sink in self._querySinks:
+            sink.record(event)
+
+    def _startQuery(self, conn, cursor, query, params=None):
+        """
+        Runs ``query`` and returns its ``QueryEvent``, to be completed
+        with the fetch of the rows and recorded by the caller.  A
+        statement that fails is recorded here.
+        """
+        local = self._timingLocal
+        event = timing.QueryEvent(self, query, params,
+                                  getattr(local, 'wait', 0.0))
+        local.wait = 0.0
+        execute = self._executeRetry
+        execute = getattr(execute, 'untimed', execute)
+        start = time.time()
+        try:
+            execute(conn, cursor, query, params)
+        except:
+            excType, excValue, excTraceback = sys.exc_info()
+            event.duration = time.time() - start
+            event.error = excValue
+            self._recordQuery(event)
+            raise excType, excValue, excTraceback
+        event.duration = time.time() - start
+        return event
+
+    def _timedQuery(self, conn, cursor, query, params=None, fetch=None):
+        """
+        Runs ``query`` for the query sinks, with the fetch of its rows
+        (``fetch`` is 'all' or 'one') or else counting the rows the
+        cursor reports.
+        """
+        event = self._startQuery(conn, cursor, query, params)
+        start = time.time()
+        if fetch == 'all':
+            value = cursor.fetchall()
+            event.rows = len(value)
+        elif fetch == 'one':
+            value = cursor.fetchone()
+            event.rows = int(value is not None)
+        else:
+            value = None
+            rowcount = getattr(cursor, 'rowcount', -1)
+            if rowcount is not None and rowcount >= 0:
+                event.rows = rowcount
+        event.duration += time.time() - start
+        self._recordQuery(event)
+        return value
+
+    def _getQueryConnection(self):
+        """
+        Like getConnection(); with query sinks the time it took
+        (waiting for the pool or connecting) is reported as the wait
+        time of the next statement of the thread.
+        """
+        if not self._querySinks:
+            return self.getConnection()
+        start = time.time()
         conn = self.getConnection()
+        self._timingLocal.wait = time.time() - start
+        return conn
+
+    def _runWithConnection(self, meth, *args):
+        conn = self._getQueryConnection()
         try:
             val = meth(conn, *args)
         finally:
@@ -331,22 +529,109 @@ class DBAPI(DBConnection):
         return val
 
     def getConnection(self):
+        conn = None
+        waitStart = None
         self._poolLock.acquire()
         try:
-            if not self._pool:
+            maxConnections = self._maxConnections()
+            while True:
+                if self._pool:
+                    conn = self._pool.pop()
+                    break
+                if maxConnections is None or \
+                        len(self._checkedOut) + self._reserved < maxConnections:
+                    break
+                # All the connections are in use; wait for one
+                now = time.time()
+                if waitStart is None:
+                    waitStart = now
+                    self._poolStats['waits'] += 1
+                remaining = self.poolTimeout - (now - waitStart)
+                if remaining <= 0:
+                    self._poolStats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        "No connection available after %s seconds "
+                        "(%i connections in use)"
+                        % (self.poolTimeout, len(self._checkedOut)))
+                self._poolAvailable.wait(remaining)
+            if waitStart is not None:
+                waitTime = time.time() - waitStart
+                self._poolStats['waitTime'] += waitTime
+                if waitTime > self._poolStats['maxWaitTime']:
+                    self._poolStats['maxWaitTime'] = waitTime
+            # Hold the place of the connection while it is checked
+            # or made outside of the lock
+            self._reserved += 1
+        finally:
+            self._poolLock.release()
+
+        try:
+            if conn is not None and not self._connectionUsable(conn):
+                self._discardConnection(conn)
+                conn = None
+            if conn is None:
                 conn = self.makeConnection()
+                created = True
+            else:
+                created = False
+        except:
+            self._poolLock.acquire()
+            try:
+                self._reserved -= 1
+                self._poolAvailable.notify()
+            finally:
+                self._poolLock.release()
+            raise
+
+        self._poolLock.acquire()
+        try:
+            self._reserved -= 1
+            self._checkedOut[id(conn)] = conn
+            if created:
                 self._connectionNumbers[id(conn)] = self._connectionCount
                 self._connectionCount += 1
-            else:
-                conn = self._pool.pop()
+                self._connectionCreated[id(conn)] = time.time()
+                self._poolStats['created'] += 1
             if self.debug:
                 s = 'ACQUIRE'
                 if self._pool is not None:
                     s += ' pool=[%s]' % ', '.join([str(self._connectionNumbers[id(v)]) for v in self._pool])
                 self.printDebug(conn, s, 'Pool')
-            return conn
         finally:
             self._poolLock.release()
+        return conn
+
+    def _connectionUsable(self, conn):
+        """
+        Checks an idle connection before it is handed out: it must be
+        younger than ``poolRecycle`` and, with ``poolPrePing``, answer
+        a simple query.
+        """
+        if self.poolRecycle is not None:
+            created = self._connectionCreated.get(id(conn))
+            if created is not None and time.time() - created > self.poolRecycle:
+                self._poolStats['recycled'] += 1
+                return False
+        if self.poolPrePing:
+            try:
+                self._pingConnection(conn)
+            except Exception:
+                self._poolStats['pingFailures'] += 1
+                return False
+        return True
+
+    def _pingConnection(self, conn):
+        c = conn.cursor()
+        c.execute(self.pingQuery)
+        c.fetchall()
+        c.close()
+
+    def _discardConnection(self, conn):
+        self._connectionCreated.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
 
     def releaseConnection(self, conn, explicit=False):
         if self.debug:
@@ -374,14 +659,26 @@ class DBAPI(DBConnection):
                 if self.debug:
                     self.printDebug(conn, 'auto', 'ROLLBACK')
                 conn.rollback()
-        if self._pool is not None:
-            if conn not in self._pool:
+        if self._pool is None:
+            self._checkedOut.pop(id(conn), None)
+            self._discardConnection(conn)
+            return
+        self._poolLock.acquire()
+        try:
+            if self._checkedOut.pop(id(conn), None) is not None:
+                if self.poolSize is None or len(self._pool) < self.poolSize:
+                    self._pool.insert(0, conn)
+                else:
+                    # An overflow connection
+                    self._discardConnection(conn)
+                self._poolAvailable.notify()
+            elif self.poolSize is None and conn not in self._pool:
                 # @@: We can get duplicate releasing of connections with
                 # the __del__ in Iteration (unfortunately, not sure why
                 # it happens)
                 self._pool.insert(0, conn)
-        else:
-            conn.close()
+        finally:
+            self._poolLock.release()
 
     def printDebug(self, conn, s, name, type='query'):
         if name == 'Pool' and self.debug != 'Pool':
@@ -401,31 +698,36 @@ class DBAPI(DBConnection):
         msg = '%(n)2i%(threadName)s/%(name)s%(spaces)s%(sep)s %(s)s' % locals()
         self.debugWriter.write(msg)
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
-        return cursor.execute(query)
+        if params is None:
+            return cursor.execute(query)
+        return cursor.execute(query, params)
 
-    def _query(self, conn, s):
+    def _query(self, conn, s, params=None):
         if self.debug:
-            self.printDebug(conn, s, 'Query')
-        self._executeRetry(conn, conn.cursor(), s)
+            self.printDebug(conn, _debugQuery(s, params), 'Query')
+        self._executeRetry(conn, conn.cursor(), s, params)
 
-    def query(self, s):
-        return self._runWithConnection(self._query, s)
+    def query(self, s, params=None):
+        return self._runWithConnection(self._query, s, params)
 
-    def _queryAll(self, conn, s):
+    def _queryAll(self, conn, s, params=None):
         if self.debug:
-            self.printDebug(conn, s, 'QueryAll')
+            self.printDebug(conn, _debugQuery(s, params), 'QueryAll')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
-        value = c.fetchall()
+        if self._querySinks:
+            value = self._timedQuery(conn, c, s, params, 'all')
+        else:
+            self._executeRetry(conn, c, s, params)
+            value = c.fetchall()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryAll', 'result')
         return value
 
-    def queryAll(self, s):
-        return self._runWithConnection(self._queryAll, s)
+    def queryAll(self, s, params=None):
+        return self._runWithConnection(self._queryAll, s, params)
 
     def _queryAllDescription(self, conn, s):
         """
@@ -435,8 +737,11 @@ class DBAPI(DBConnection):
         if self.debug:
             self.printDebug(conn, s, 'QueryAllDesc')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
-        value = c.fetchall()
+        if self._querySinks:
+            value = self._timedQuery(conn, c, s, None, 'all')
+        else:
+            self._executeRetry(conn, c, s)
+            value = c.fetchall()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryAll', 'result')
         return c.description, value
@@ -444,41 +749,113 @@ class DBAPI(DBConnection):
     def queryAllDescription(self, s):
         return self._runWithConnection(self._queryAllDescription, s)
 
-    def _queryOne(self, conn, s):
+    def _queryOne(self, conn, s, params=None):
         if self.debug:
-            self.printDebug(conn, s, 'QueryOne')
+            self.printDebug(conn, _debugQuery(s, params), 'QueryOne')
         c = conn.cursor()
-        self._executeRetry(conn, c, s)
-        value = c.fetchone()
+        if self._querySinks:
+            value = self._timedQuery(conn, c, s, params, 'one')
+        else:
+            self._executeRetry(conn, c, s, params)
+            value = c.fetchone()
         if self.debugOutput:
             self.printDebug(conn, value, 'QueryOne', 'result')
         return value
 
-    def queryOne(self, s):
-        return self._runWithConnection(self._queryOne, s)
+    def queryOne(self, s, params=None):
+        return self._runWithConnection(self._queryOne, s, params)
 
     def _insertSQL(self, table, names, values):
         return ("INSERT INTO %s (%s) VALUES (%s)" %
                 (table, ', '.join(names),
                  ', '.join([self.sqlrepr(v) for v in values])))
 
+    def _insertManySQL(self, soClass, names, rows):
+        return self.sqlrepr(sqlbuilder.Insert(soClass.sqlmeta.table,
+                                              valueList=rows, template=names))
+
+    def _insertedIDs(self, soClass, cursor, count):
+        """
+        Returns the ids of the ``count`` rows just inserted by
+        ``cursor``, or None if the backend cannot tell them.
+        """
+        return None
+
+    def _queryInsertMany(self, conn, soClass, names, rows):
+        """
+        Inserts ``rows`` (lists of values for the columns ``names``)
+        into the table of ``soClass``; returns the list of their ids,
+        or None if they are not known.  If the ids are given the id
+        column must come first in ``names``.
+        """
+        if not self.multiRowInsert or not names:
+            if names and names[0] == soClass.sqlmeta.idName:
+                return [self._queryInsertID(conn, soClass, row[0],
+                                            names[1:], list(row[1:]))
+                        for row in rows]
+            return [self._queryInsertID(conn, soClass, None, names, list(row))
+                    for row in rows]
+        q = self._insertManySQL(soClass, names, rows)
+        if self.debug:
+            self.printDebug(conn, q, 'QueryIns')
+        c = conn.cursor()
+        self._executeRetry(conn, c, q)
+        ids = self._insertedIDs(soClass, c, len(rows))
+        if self.debugOutput:
+            self.printDebug(conn, ids, 'QueryIns', 'result')
+        return ids
+
     def transaction(self):
         return Transaction(self)
 
     def queryInsertID(self, soInstance, id, names, values):
-        return self._runWithConnection(self._queryInsertID, soInstance, id, names, values)
+        result = self._runWithConnection(self._queryInsertID, soInstance, id, names, values)
+        self._tableChanged(soInstance.sqlmeta.table)
+        return result
+
+    def queryInsertMany(self, soClass, names, rows):
+        result = self._runWithConnection(self._queryInsertMany, soClass, names, rows)
+        self._tableChanged(soClass.sqlmeta.table)
+        return result
+
+    def queryInsertReturning(self, soInstance, id, names, values, returnNames):
+        """
+        Like queryInsertID(), but returns the id and the values of
+        ``returnNames`` of the new row; only for backends with
+        ``insertReturning``.
+        """
+        result = self._runWithConnection(self._queryInsertReturning, soInstance, id, names, values, returnNames)
+        self._tableChanged(soInstance.sqlmeta.table)
+        return result
 
     def iterSelect(self, select):
-        return select.IterationClass(self, self.getConnection(),
+        if select.ops.get('cached') and self.resultCache is not None:
+            query = self.queryForSelect(select)
+            return CachedIteration(self, select, query,
+                                   self._cachedQuery(select, query))
+        return select.IterationClass(self, self._getQueryConnection(),
                          select, keepConnection=False)
 
+    def streamSelect(self, select, batchSize, cache=True):
+        return StreamIteration(self, self._getQueryConnection(), select,
+                               keepConnection=False, batchSize=batchSize,
+                               cache=cache)
+
+    def _streamCursor(self, conn, hold=True):
+        """
+        Returns a cursor that fetches the rows from the server as they
+        are needed; by default a plain cursor.  With ``hold`` false it
+        is only used inside a transaction, and need not outlive it.
+        """
+        return conn.cursor()
+
     def accumulateSelect(self, select, *expressions):
         """ Apply an accumulate function(s) (SUM, COUNT, MIN, AVG, MAX, etc...)
             to the select object.
         """
         q = select.queryForSelect().newItems(expressions).unlimited().orderBy(None)
         q = self.sqlrepr(q)
-        val = self.queryOne(q)
+        val = self._cachedQuery(select, q, all=False)
         if len(expressions) == 1:
             val = val[0]
         return val
@@ -499,6 +876,7 @@ class DBAPI(DBConnection):
 
     def _SO_dropJoinTable(self, join):
         self.query("DROP TABLE %s" % join.intermediateTable)
+        self._tableChanged(join.intermediateTable)
 
     def _SO_createIndex(self, soClass, index):
         self.query(self.createIndexSQL(soClass, index))
@@ -566,6 +944,7 @@ class DBAPI(DBConnection):
         # the query won't go through, but maybe we shouldn't override
         # that.
         self.query("DELETE FROM %s" % tableName)
+        self._forgetTable(tableName)
 
     def createBinary(self, value):
         """
@@ -580,15 +959,71 @@ class DBAPI(DBConnection):
     # the database directly.  This way no SQL is actually created
     # in the SQLObject class.
 
+    # Types of values passed to the driver as query parameters when
+    # paramQueries is on; statements with other values are rendered
+    # with sqlrepr() as usual.
+    paramTypes = (int, long, float, bool, str, unicode, types.NoneType)
+
+    def _queryParams(self, values):
+        """
+        Returns ``values`` as a tuple of query parameters, or None if
+        the statement has to be rendered with literal values (because
+        the mode is off, the driver's paramstyle is not supported, or
+        some value is not a plain type).
+        """
+        if not self.paramQueries or \
+                getattr(self.module, 'paramstyle', None) not in _placeholders:
+            return None
+        for value in values:
+            if not isinstance(value, self.paramTypes):
+                return None
+        return tuple(values)
+
+    def _paramStatement(self, key, template, *args):
+        """
+        Returns the text of the statement ``key`` from the statement
+        cache, building it on a miss from ``template`` (with ``%s`` for
+        the ``args``, which are lists of SQL snippets, and ``%%s`` for
+        the placeholders, which are numbered in order).
+        """
+        statement = self.statementCache.get(key)
+        if statement is None:
+            text = template % tuple([', '.join(arg) for arg in args])
+            placeholder = _placeholders[self.module.paramstyle]
+            parts = text.split('%s')
+            statement = parts[0]
+            for i in range(1, len(parts)):
+                statement += placeholder(i) + parts[i]
+            self.statementCache.put(key, statement)
+        return statement
+
     def _SO_update(self, so, values):
-        self.query("UPDATE %s SET %s WHERE %s = (%s)" %
-                   (so.sqlmeta.table,
-                    ", ".join(["%s = (%s)" % (dbName, self.sqlrepr(value))
-                               for dbName, value in values]),
-                    so.sqlmeta.idName,
-                    self.sqlrepr(so.id)))
+        params = self._queryParams([value for dbName, value in values] + [so.id])
+        if params is not None:
+            dbNames = [dbName for dbName, value in values]
+            q = self._paramStatement(
+                ('update', so.sqlmeta.table, so.sqlmeta.idName, tuple(dbNames)),
+                "UPDATE %s SET %s WHERE %s = %%s",
+                [so.sqlmeta.table], ["%s = %%s" % dbName for dbName in dbNames],
+                [so.sqlmeta.idName])
+            self.query(q, params)
+        else:
+            self.query("UPDATE %s SET %s WHERE %s = (%s)" %
+                       (so.sqlmeta.table,
+                        ", ".join(["%s = (%s)" % (dbName, self.sqlrepr(value))
+                                   for dbName, value in values]),
+                        so.sqlmeta.idName,
+                        self.sqlrepr(so.id)))
+        self._forgetRows(so.sqlmeta.table, [so.id])
 
     def _SO_selectOne(self, so, columnNames):
+        params = columnNames and self._queryParams([so.id])
+        if params:
+            q = self._paramStatement(
+                ('selectOne', so.sqlmeta.table, so.sqlmeta.idName, tuple(columnNames)),
+                "SELECT %s FROM %s WHERE %s = %%s",
+                columnNames, [so.sqlmeta.table], [so.sqlmeta.idName])
+            return self.queryOne(q, params)
         return self._SO_selectOneAlt(so, columnNames, so.q.id==so.id)
 
 
@@ -601,13 +1036,114 @@ class DBAPI(DBConnection):
                                                             staticTables=[so.sqlmeta.table],
                                                             clause=condition)))
 
+    def _SO_selectRow(self, so, columnNames):
+        """
+        Like ``_SO_selectOne()``, but the row is looked up in (and
+        stored into) the row cache first, if there is one.
+        """
+        rowCache = self.rowCache
+        if rowCache is None or not so.sqlmeta.rowCache:
+            return self._SO_selectOne(so, columnNames)
+        table = so.sqlmeta.table
+        columnNames = tuple(columnNames)
+        cached = rowCache.get(table, so.id)
+        if cached is not None and cached[0] == columnNames:
+            rowCache.hits += 1
+            return cached[1]
+        rowCache.misses += 1
+        # A change made while the row is read must win over the row
+        version = rowCache.version(table)
+        row = self._SO_selectOne(so, columnNames)
+        if row and version is not None:
+            rowCache.set(table, so.id, columnNames, tuple(row), version)
+        return row
+
+    def _forgetRows(self, table, ids):
+        """
+        Removes rows that were changed from the row cache.
+        """
+        if self.rowCache is not None:
+            self.rowCache.delete(table, ids)
+        self._tableChanged(table)
+
+    def _forgetTable(self, table, rowsTracked=False):
+        """
+        Removes the rows of a table that was changed by a set-based
+        statement from the row cache.  ``rowsTracked`` tells that the
+        caller finds the cached instances of the changed rows itself
+        (in a transaction: for ``_deletedCache``).
+        """
+        if self.rowCache is not None:
+            self.rowCache.clear(table)
+        self._tableChanged(table)
+
+    def _tableChanged(self, table):
+        """
+        Drops the cached query results that read the table.
+        """
+        if self.resultCache is not None:
+            self.resultCache.invalidate([table])
+
+    def _cachedQuery(self, select, query, all=True):
+        """
+        Runs ``query`` (the SQL of a query on ``select``) with
+        ``queryAll()`` or ``queryOne()``; if the select asks for it,
+        the result is looked up in and stored into the result cache.
+        """
+        ttl = select.ops.get('cached')
+        cache = self.resultCache
+        if not ttl or cache is None:
+            if all:
+                return self.queryAll(query)
+            return self.queryOne(query)
+        key = (all, query)
+        result = cache.get(key, _missing)
+        if result is _missing:
+            generation = cache.generation
+            if all:
+                result = self.queryAll(query)
+            else:
+                result = self.queryOne(query)
+            tables = {}
+            _tablesRead(select.queryForSelect(), self.dbName, tables)
+            if ttl is True:
+                ttl = None
+            cache.put(key, tables.keys(), result, ttl, generation)
+        return result
+
+    def _SO_selectMany(self, soClass, columnNames, ids):
+        """
+        Selects ``columnNames`` from the rows of ``soClass`` whose ids
+        are in ``ids``, using a single ``IN (...)`` query.
+        """
+        columns = [isinstance(x, basestring) and sqlbuilder.SQLConstant(x) or x for x in columnNames]
+        return self.queryAll(self.sqlrepr(sqlbuilder.Select(columns,
+                                                            staticTables=[soClass.sqlmeta.table],
+                                                            clause=sqlbuilder.IN(soClass.q.id, list(ids)))))
+
     def _SO_delete(self, so):
-        self.query("DELETE FROM %s WHERE %s = (%s)" %
-                   (so.sqlmeta.table,
-                    so.sqlmeta.idName,
-                    self.sqlrepr(so.id)))
+        params = self._queryParams([so.id])
+        if params is not None:
+            q = self._paramStatement(
+                ('delete', so.sqlmeta.table, so.sqlmeta.idName),
+                "DELETE FROM %s WHERE %s = %%s",
+                [so.sqlmeta.table], [so.sqlmeta.idName])
+            self.query(q, params)
+        else:
+            self.query("DELETE FROM %s WHERE %s = (%s)" %
+                       (so.sqlmeta.table,
+                        so.sqlmeta.idName,
+                        self.sqlrepr(so.id)))
+        self._forgetRows(so.sqlmeta.table, [so.id])
 
     def _SO_selectJoin(self, soClass, column, value):
+        params = self._queryParams([value])
+        if params is not None:
+            q = self._paramStatement(
+                ('selectJoin', soClass.sqlmeta.table, soClass.sqlmeta.idName, column),
+                "SELECT %s FROM %s WHERE %s = %%s",
+                [soClass.sqlmeta.idName], [soClass.sqlmeta.table], [column])
+            return self.queryAll(q, params)
         return self.queryAll("SELECT %s FROM %s WHERE %s = (%s)" %
                              (soClass.sqlmeta.idName,
                               soClass.sqlmeta.table,
@@ -615,12 +1151,35 @@ class DBAPI(DBConnection):
                               self.sqlrepr(value)))
 
     def _SO_intermediateJoin(self, table, getColumn, joinColumn, value):
+        params = self._queryParams([value])
+        if params is not None:
+            q = self._paramStatement(
+                ('intermediateJoin', table, getColumn, joinColumn),
+                "SELECT %s FROM %s WHERE %s = %%s",
+                [getColumn], [table], [joinColumn])
+            return self.queryAll(q, params)
         return self.queryAll("SELECT %s FROM %s WHERE %s = (%s)" %
                              (getColumn,
                               table,
                               joinColumn,
                               self.sqlrepr(value)))
 
+    def _SO_selectJoinMany(self, soClass, column, values):
+        return self.queryAll("SELECT %s, %s FROM %s WHERE %s IN %s" %
+                             (column,
+                              soClass.sqlmeta.idName,
+                              soClass.sqlmeta.table,
+                              column,
+                              self.sqlrepr(list(values))))
+
+    def _SO_intermediateJoinMany(self, table, getColumn, joinColumn, values):
+        return self.queryAll("SELECT %s, %s FROM %s WHERE %s IN %s" %
+                             (joinColumn,
+                              getColumn,
+                              table,
+                              joinColumn,
+                              self.sqlrepr(list(values))))
+
     def _SO_intermediateDelete(self, table, firstColumn, firstValue,
                                secondColumn, secondValue):
         self.query("DELETE FROM %s WHERE %s = (%s) AND %s = (%s)" %
@@ -629,6 +1188,7 @@ class DBAPI(DBConnection):
                     self.sqlrepr(firstValue),
                     secondColumn,
                     self.sqlrepr(secondValue)))
+        self._tableChanged(table)
 
     def _SO_intermediateInsert(self, table, firstColumn, firstValue,
                                secondColumn, secondValue):
@@ -638,6 +1198,7 @@ class DBAPI(DBConnection):
                     secondColumn,
                     self.sqlrepr(firstValue),
                     self.sqlrepr(secondValue)))
+        self._tableChanged(table)
 
     def _SO_columnClause(self, soClass, kw):
         ops = {None: "IS"}
@@ -703,41 +1264,260 @@ class DBAPI(DBConnection):
         """
         raise NotImplementedError
 
+_missing = object()
+
+def _tablesRead(expr, db, tables):
+    """
+    Adds the names of the tables read by the query ``expr`` --
+    including the tables of joins, subqueries and aliases -- to the
+    dictionary ``tables``.
+    """
+    if isinstance(expr, (list, tuple)):
+        for item in expr:
+            _tablesRead(item, db, tables)
+    elif isinstance(expr, sqlbuilder.Select):
+        for table in expr.ops['staticTables']:
+            _tableRead(table, db, tables)
+        for key in ('items', 'clause', 'join', 'having'):
+            _tablesRead(expr.ops[key], db, tables)
+    elif isinstance(expr, sqlbuilder.SQLJoin):
+        for table in (expr.table1, expr.table2):
+            if table:
+                _tableRead(table, db, tables)
+    elif isinstance(expr, (sqlbuilder.INSubquery, sqlbuilder.Subquery)):
+        _tablesRead(expr.subquery, db, tables)
+        _tablesRead(getattr(expr, 'item', None), db, tables)
+    elif isinstance(expr, (sqlbuilder.Alias, sqlbuilder.AliasTable)):
+        _tableRead(expr, db, tables)
+    elif isinstance(expr, sqlbuilder.SQLExpression):
+        for table in expr.tablesUsedImmediate():
+            _tableRead(table, db, tables)
+        for component in expr.components():
+            _tablesRead(component, db, tables)
+
+def _tableRead(table, db, tables):
+    """
+    Adds the name of ``table`` to ``tables``; an alias stands for the
+    table it names (or the tables its subquery reads).
+    """
+    if isinstance(table, sqlbuilder.Alias):
+        table = table.q
+    if isinstance(table, sqlbuilder.AliasTable):
+        table = table.tableName
+        if isinstance(table, sqlbuilder.Subquery):
+            _tablesRead(table, db, tables)
+            return
+    tables[sqlbuilder._str_or_sqlrepr(table, db)] = None
+
+def _intOrNone(value):
+    if value is None or value == '':
+        return None
+    return int(value)
+
+_placeholders = {
+    'qmark': lambda i: '?',
+    'format': lambda i: '%s',
+    'pyformat': lambda i: '%s',
+    'numeric': lambda i: ':%i' % i,
+}
+
+def _debugQuery(s, params):
+    if params is None:
+        return s
+    return '%s %r' % (s, params)
+
+class _TimedExecute(object):
+
+    """
+    Stands in for the ``_executeRetry()`` of a connection with query
+    sinks, so the statements run through it directly are timed.  The
+    connection is only weakly referenced, as it has a ``__del__``.
+    """
+
+    def __init__(self, connection):
+        self.connection = weakref.ref(connection)
+        self.method = connection.__class__._executeRetry
+
+    def __call__(self, conn, cursor, query, params=None):
+        return self.connection()._timedQuery(conn, cursor, query, params)
+
+    def untimed(self, conn, cursor, query, params=None):
+        return self.method(self.connection(), conn, cursor, query, params)
+
+class StatementCache(object):
+    """
+    Keeps the text of parameterized statements by key, up to
+    ``size`` entries; when it is full the least recently used
+    quarter is dropped.
+    """
+
+    def __init__(self, size=100):
+        self.size = size
+        self.statements = {}
+        self.tick = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.statements), 'maxSize': self.size}
+
+    def get(self, key):
+        self.tick += 1
+        entry = self.statements.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[1] = self.tick
+        return entry[0]
+
+    def put(self, key, statement):
+        self.statements[key] = [statement, self.tick]
+        if len(self.statements) > self.size:
+            entries = [(entry[1], key) for key, entry in self.statements.items()]
+            entries.sort()
+            for tick, key in entries[:len(entries) - self.size * 3 // 4]:
+                self.statements.pop(key, None)
+
+    def clear(self):
+        self.statements.clear()
+
 class Iteration(object):
 
+    # Array size for cursor.fetchmany(); the rows of a batch are
+    # converted column by column, and processed together when
+    # foreign keys and joins are prefetched
+    defaultArraySize = 100
+    # Are the instances looked up in and stored into the cache?
+    useCache = True
+    # The QueryEvent of the select when the connection has query
+    # sinks, recorded when the iteration ends (when a transaction
+    # may be over)
+    _event = None
+    _querySinks = ()
+
     def __init__(self, dbconn, rawconn, select, keepConnection=False):
         self.dbconn = dbconn
         self.rawconn = rawconn
         self.select = select
         self.keepConnection = keepConnection
-        self.cursor = rawconn.cursor()
+        self.prefetch = select.ops.get('prefetch')
+        self._rows = []
+        self._batch = []
+        self._prefetched = []
+        self.cursor = self._makeCursor(rawconn)
         self.query = self.dbconn.queryForSelect(select)
         if dbconn.debug:
             dbconn.printDebug(rawconn, self.query, 'Select')
-        self.dbconn._executeRetry(self.rawconn, self.cursor, self.query)
+        querySinks = dbconn._querySinks
+        if querySinks:
+            self._querySinks = querySinks
+            self._event = dbconn._startQuery(rawconn, self.cursor,
+                                             self.query)
+            self._event.rows = 0
+        else:
+            self.dbconn._executeRetry(self.rawconn, self.cursor, self.query)
+
+    def _makeCursor(self, rawconn):
+        return rawconn.cursor()
 
     def __iter__(self):
         return self
 
     def next(self):
-        result = self.cursor.fetchone()
-        if result is None:
-            self._cleanup()
-            raise StopIteration
-        if result[0] is None:
-            return None
-        if self.select.ops.get('lazyColumns', 0):
-            obj = self.select.sourceClass.get(result[0], connection=self.dbconn)
-            return obj
+        if self.prefetch:
+            return self._nextFromBatch()
+        if not self._rows:
+            rows = self._fetchRows()
+            if not rows:
+                self._cleanup()
+                raise StopIteration
+            rows.reverse()
+            self._rows = rows
+        id, selectResults = self._rows.pop()
+        return self._makeObject(id, selectResults)
+
+    def _nextFromBatch(self):
+        if not self._batch:
+            rows = self._fetchRows()
+            if not rows:
+                self._prefetched = []
+                self._cleanup()
+                raise StopIteration
+            batch = [self._makeObject(id, selectResults)
+                     for id, selectResults in rows]
+            # Keep the prefetched objects alive until the next batch,
+            # so the cache cannot drop them before they are used
+            self._prefetched = self.select._prefetch(batch)
+            batch.reverse()
+            self._batch = batch
+        return self._batch.pop()
+
+    def _fetchRows(self):
+        """
+        Fetches the next batch of results as ``(id, selectResults)``
+        pairs, the column values converted by the class' row loader
+        (with the validator state of the class, not of an instance).
+        The rows of cached instances are left to ``get()``, which
+        converts them only to refresh an instance that is not dirty.
+        """
+        if self._event is not None:
+            start = time.time()
+            results = self.cursor.fetchmany(self.defaultArraySize)
+            self._event.duration += time.time() - start
+            self._event.rows += len(results)
         else:
-            obj = self.select.sourceClass.get(result[0], selectResults=result[1:], connection=self.dbconn)
-            return obj
+            results = self.cursor.fetchmany(self.defaultArraySize)
+        if not results:
+            return []
+        if self.select.ops.get('lazyColumns', 0):
+            return [(result[0], None) for result in results]
+        sourceClass = self.select.sourceClass
+        cached = {}
+        if self.useCache:
+            idType = sourceClass.sqlmeta.idType
+            cache = self.dbconn.cache
+            for result in results:
+                if result[0] is not None and cache.tryGet(
+                        idType(result[0]), sourceClass) is not None:
+                    cached[result[0]] = result[1:]
+        state = sqlbuilder.SQLObjectState(sourceClass, self.dbconn)
+        loader = sourceClass.sqlmeta._getRowLoader()
+        if not cached:
+            return loader.convertRows(results, state)
+        converted = loader.convertRows(
+            [result for result in results if result[0] not in cached],
+            state)
+        converted.reverse()
+        rows = []
+        for result in results:
+            if result[0] in cached:
+                rows.append((result[0], cached[result[0]]))
+            else:
+                rows.append(converted.pop())
+        return rows
+
+    def _makeObject(self, id, selectResults):
+        if id is None:
+            return None
+        if not self.useCache:
+            return self.select.sourceClass._SO_getUncached(
+                id, connection=self.dbconn, selectResults=selectResults)
+        return self.select.sourceClass.get(
+            id, selectResults=selectResults, connection=self.dbconn)
 
     def _cleanup(self):
         if getattr(self, 'query', None) is None:
             # already cleaned up
             return
         self.query = None
+        if self._event is not None:
+            for sink in self._querySinks:
+                sink.record(self._event)
+            self._event = None
         if not self.keepConnection:
             self.dbconn.releaseConnection(self.rawconn)
         self.dbconn = self.rawconn = self.select = self.cursor = None
@@ -745,8 +1525,144 @@ class Iteration(object):
     def __del__(self):
         self._cleanup()
 
+class _RowCursor(object):
+    """
+    Reads a list of rows like a cursor.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.position = 0
+
+    def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+class CachedIteration(Iteration):
+    """
+    Iterates over the rows of a select kept in the result cache.
+    """
+
+    def __init__(self, dbconn, select, query, rows):
+        self.dbconn = dbconn
+        self.rawconn = None
+        self.select = select
+        self.keepConnection = True
+        self.prefetch = select.ops.get('prefetch')
+        self._rows = []
+        self._batch = []
+        self._prefetched = []
+        self.cursor = _RowCursor(rows)
+        self.query = query
+
+class StreamIteration(Iteration):
+
+    """
+    Iterates over the results with a server-side cursor (where the
+    backend has one), fetching ``batchSize`` rows at a time, so the
+    whole result set is never held in memory.
+    """
+
+    def __init__(self, dbconn, rawconn, select, keepConnection=False,
+                 batchSize=1000, cache=True):
+        self.defaultArraySize = batchSize
+        self.useCache = cache
+        Iteration.__init__(self, dbconn, rawconn, select, keepConnection)
+
+    def _makeCursor(self, rawconn):
+        return self.dbconn._streamCursor(rawconn)
+
+    def next(self):
+        return self._nextFromBatch()
+
+    def _cleanup(self):
+        if getattr(self, 'query', None) is None:
+            return
+        # Free the server-side cursor before the connection is reused
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+        Iteration._cleanup(self)
+
+def _mergeValues(source, target):
+    """
+    Copies the column values of ``source`` (the instance of a row in a
+    transaction) into ``target`` (the instance of the same row in the
+    parent connection); returns False if it cannot, because either
+    instance has changes not written yet or ``source`` misses values.
+    """
+    if source is None or source.sqlmeta.expired or source.sqlmeta.dirty \
+            or not source.sqlmeta.cacheValues or target.sqlmeta.dirty:
+        return False
+    names = [main.instanceName(column.name)
+             for column in target.sqlmeta.columnList]
+    values = []
+    for name in names:
+        try:
+            values.append(getattr(source, name))
+        except AttributeError:
+            return False
+    target._SO_writeLock.acquire()
+    try:
+        if target.sqlmeta.expired:
+            # Reloaded when used next anyway
+            return True
+        for name, value in zip(names, values):
+            setattr(target, name, value)
+        target._SO_joinCache = None
+    finally:
+        target._SO_writeLock.release()
+    return True
+
+# (transaction class, connection class) -> delegating subclass
+_delegatingClasses = {}
+
+def _delegatingClass(cls, connectionClass):
+    """
+    Returns the subclass of ``cls`` (Transaction) that has the methods
+    of ``connectionClass`` it lacks, so the methods of the parent
+    connection run with the transaction as ``self`` without going
+    through ``__getattr__()``.
+    """
+    key = (cls, connectionClass)
+    try:
+        return _delegatingClasses[key]
+    except KeyError:
+        pass
+    methods = {}
+    bases = list(inspect.getmro(connectionClass))
+    bases.reverse()
+    for base in bases:
+        for name, value in base.__dict__.items():
+            if isinstance(value, types.FunctionType) \
+                   and not name.startswith('__'):
+                methods[name] = value
+    for name in methods.keys():
+        if hasattr(cls, name):
+            del methods[name]
+    subclass = type('%sFor%s' % (cls.__name__, connectionClass.__name__),
+                    (cls,), methods)
+    _delegatingClasses[key] = subclass
+    return subclass
+
 class Transaction(object):
 
+    # Results read in a transaction are not shared
+    resultCache = None
+
+    def __new__(cls, dbConnection):
+        # The methods of the connection are delegated through the
+        # class, made once for each class of connection
+        return object.__new__(_delegatingClass(cls, dbConnection.__class__))
+
     def __init__(self, dbConnection):
         # this is to skip __del__ in case of an exception in this __init__
         self._obsolete = True
@@ -754,28 +1670,55 @@ class Transaction(object):
         self._connection = dbConnection.getConnection()
         self._dbConnection._setAutoCommit(self._connection, 0)
         self.cache = CacheSet(cache=dbConnection.doCache)
+        # Merge the rows written into the parent cache on commit?
+        self.mergeOnCommit = dbConnection.transactionMerge
         self._deletedCache = {}
+        self._forgottenRows = {}
+        self._changedTables = {}
+        # The rows written, by table (None for all of them), and the
+        # ones of those written through an instance of the transaction
+        self._dirtyRows = {}
+        self._updatedRows = {}
+        # (intermediate table, column) -> {id: None} of the RelatedJoin
+        # rows written
+        self._joinRows = {}
         self._obsolete = False
 
     def assertActive(self):
         assert not self._obsolete, "This transaction has already gone through ROLLBACK; begin another transaction"
 
-    def query(self, s):
+    def query(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._query(self._connection, s)
+        return self._dbConnection._query(self._connection, s, params)
 
-    def queryAll(self, s):
+    def queryAll(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._queryAll(self._connection, s)
+        return self._dbConnection._queryAll(self._connection, s, params)
 
-    def queryOne(self, s):
+    def queryOne(self, s, params=None):
         self.assertActive()
-        return self._dbConnection._queryOne(self._connection, s)
+        return self._dbConnection._queryOne(self._connection, s, params)
 
     def queryInsertID(self, soInstance, id, names, values):
         self.assertActive()
-        return self._dbConnection._queryInsertID(
+        result = self._dbConnection._queryInsertID(
             self._connection, soInstance, id, names, values)
+        self._tableChanged(soInstance.sqlmeta.table)
+        return result
+
+    def queryInsertMany(self, soClass, names, rows):
+        self.assertActive()
+        result = self._dbConnection._queryInsertMany(
+            self._connection, soClass, names, rows)
+        self._tableChanged(soClass.sqlmeta.table)
+        return result
+
+    def queryInsertReturning(self, soInstance, id, names, values, returnNames):
+        self.assertActive()
+        result = self._dbConnection._queryInsertReturning(
+            self._connection, soInstance, id, names, values, returnNames)
+        self._tableChanged(soInstance.sqlmeta.table)
+        return result
 
     def iterSelect(self, select):
         self.assertActive()
@@ -787,6 +1730,30 @@ class Transaction(object):
         return iter(list(select.IterationClass(self, self._connection,
                                    select, keepConnection=True)))
 
+    def streamSelect(self, select, batchSize, cache=True):
+        self.assertActive()
+        iteration = StreamIteration(self, self._connection, select,
+                                    keepConnection=True,
+                                    batchSize=batchSize, cache=cache)
+        if self._dbConnection.streamInterleaves:
+            # The rows are read as they are used, with the other
+            # statements of the transaction run in between
+            return iteration
+        # See iterSelect() -- the rows are read before they are returned
+        return iter(list(iteration))
+
+    def _streamCursor(self, conn):
+        return self._dbConnection._streamCursor(conn, hold=False)
+
+    # The connection may replace its _executeRetry() (see
+    # addQuerySink()), and times the statements itself
+
+    def _executeRetry(self, conn, cursor, query, params=None):
+        return self._dbConnection._executeRetry(conn, cursor, query, params)
+
+    def _startQuery(self, conn, cursor, query, params=None):
+        return self._dbConnection._startQuery(conn, cursor, query, params)
+
     def _SO_delete(self, inst):
         cls = inst.__class__.__name__
         if not cls in self._deletedCache:
@@ -795,6 +1762,69 @@ class Transaction(object):
         meth = new.instancemethod(self._dbConnection._SO_delete.im_func, self, self.__class__)
         return meth(inst)
 
+    def _SO_update(self, so, values):
+        meth = new.instancemethod(self._dbConnection._SO_update.im_func, self, self.__class__)
+        meth(so, values)
+        self._updatedRows.setdefault(so.sqlmeta.table, {})[so.id] = None
+
+    def _SO_intermediateDelete(self, table, firstColumn, firstValue,
+                               secondColumn, secondValue):
+        meth = new.instancemethod(self._dbConnection._SO_intermediateDelete.im_func, self, self.__class__)
+        meth(table, firstColumn, firstValue, secondColumn, secondValue)
+        self._joinWritten(table, firstColumn, firstValue, secondColumn,
+                          secondValue)
+
+    def _SO_intermediateInsert(self, table, firstColumn, firstValue,
+                               secondColumn, secondValue):
+        meth = new.instancemethod(self._dbConnection._SO_intermediateInsert.im_func, self, self.__class__)
+        meth(table, firstColumn, firstValue, secondColumn, secondValue)
+        self._joinWritten(table, firstColumn, firstValue, secondColumn,
+                          secondValue)
+
+    def _joinWritten(self, table, firstColumn, firstValue, secondColumn,
+                     secondValue):
+        # The instances on both sides get their joins read again
+        self._joinRows.setdefault((table, firstColumn), {})[firstValue] = None
+        self._joinRows.setdefault((table, secondColumn), {})[secondValue] = None
+
+    def _SO_selectRow(self, so, columnNames):
+        # The row may have been changed by this transaction, so it
+        # must not get into the row cache.
+        return self._SO_selectOne(so, columnNames)
+
+    def _forgetRows(self, table, ids):
+        # Other connections may read (and cache) the old rows again
+        # until we commit, so they are forgotten again then.
+        self._dbConnection._forgetRows(table, ids)
+        if self._dbConnection.rowCache is not None:
+            forgotten = self._forgottenRows.setdefault(table, [])
+            if forgotten is not None:
+                forgotten.extend(ids)
+        self._changedTables[table] = None
+        dirty = self._dirtyRows.setdefault(table, {})
+        updated = self._updatedRows.get(table, {})
+        for id in ids:
+            if dirty is not None:
+                dirty[id] = None
+            # Written behind the instance's back (until _SO_update()
+            # marks it again)
+            updated.pop(id, None)
+
+    def _forgetTable(self, table, rowsTracked=False):
+        self._dbConnection._forgetTable(table)
+        if self._dbConnection.rowCache is not None:
+            self._forgottenRows[table] = None
+        self._changedTables[table] = None
+        if not rowsTracked:
+            self._dirtyRows[table] = None
+            self._updatedRows.pop(table, None)
+
+    def _tableChanged(self, table):
+        # The results of the parent connection are dropped now and
+        # again on commit, like the rows above.
+        self._dbConnection._tableChanged(table)
+        self._changedTables[table] = None
+
     def commit(self, close=False):
         if self._obsolete:
             # @@: is it okay to get extraneous commits?
@@ -804,15 +1834,78 @@ class Transaction(object):
         self._send_event(events.CommitSignal)
         self._connection.commit()
 
-        subCaches = [(sub[0], sub[1].allIDs()) for sub in self.cache.allSubCachesByClassNames().items()]
-        subCaches.extend([(x[0], x[1]) for x in self._deletedCache.items()])
-        for cls, ids in subCaches:
+        for table, ids in self._forgottenRows.items():
+            if ids is None:
+                self._dbConnection._forgetTable(table)
+            else:
+                self._dbConnection._forgetRows(table, ids)
+        self._forgottenRows = {}
+        for table in self._changedTables:
+            self._dbConnection._tableChanged(table)
+        self._changedTables = {}
+        if self.mergeOnCommit:
+            self._mergeRows()
+        else:
+            subCaches = [(sub[0], sub[1].allIDs()) for sub in self.cache.allSubCachesByClassNames().items()]
+            subCaches.extend([(x[0], x[1]) for x in self._deletedCache.items()])
+            for cls, ids in subCaches:
+                for id in ids:
+                    inst = self._dbConnection.cache.tryGetByName(id, cls)
+                    if inst is not None:
+                        inst.expire()
+        self._deletedCache = {}
+        self._dirtyRows = {}
+        self._updatedRows = {}
+        self._joinRows = {}
+        if close:
+            self._makeObsolete()
+
+    def _mergeRows(self):
+        """
+        Brings the instances of the parent connection up to date with
+        the rows this transaction wrote (and only those): the values
+        of a row updated through an instance of the transaction are
+        copied into the parent's instance, the other rows written
+        (deleted, or changed by set-based statements) are expired, and
+        the instances whose RelatedJoin rows were added or removed
+        forget their preloaded joins.
+        """
+        parentCache = self._dbConnection.cache
+        for name, ids in self._deletedCache.items():
             for id in ids:
-                inst = self._dbConnection.cache.tryGetByName(id, cls)
+                inst = parentCache.tryGetByName(id, name)
                 if inst is not None:
                     inst.expire()
-        if close:
-            self._makeObsolete()
+        for name, soClass in parentCache.classes.items():
+            table = soClass.sqlmeta.table
+            if table not in self._dirtyRows:
+                continue
+            ids = self._dirtyRows[table]
+            if ids is None:
+                for inst in parentCache.getAll(soClass):
+                    inst.expire()
+                continue
+            updated = self._updatedRows.get(table, {})
+            for id in ids:
+                inst = parentCache.tryGetByName(id, name)
+                if inst is None:
+                    continue
+                if id not in updated or not _mergeValues(
+                        self.cache.tryGetByName(id, name), inst):
+                    inst.expire()
+        if self._joinRows:
+            for name, soClass in parentCache.classes.items():
+                for join in soClass.sqlmeta.joins:
+                    if join is None:
+                        continue
+                    table = getattr(join, 'intermediateTable', None)
+                    ids = self._joinRows.get((table, join.joinColumn))
+                    if not ids:
+                        continue
+                    for id in ids:
+                        inst = parentCache.tryGetByName(id, name)
+                        if inst is not None:
+                            inst._SO_joinCache = None
 
     def rollback(self):
         if self._obsolete:
@@ -846,19 +1939,20 @@ class Transaction(object):
         If nothing else works, let the parent connection handle it.
         Except with this transaction as 'self'.  Poor man's
         acquisition?  Bad programming?  Okay, maybe.
+
+        The methods of the connection's class are found on the class
+        of the transaction (see _delegatingClass()); this is left for
+        the attributes of the connection, and its methods that are
+        not plain functions of its class.
         """
         self.assertActive()
         attr = getattr(self._dbConnection, attr)
-        try:
-            func = attr.im_func
-        except AttributeError:
-            if isinstance(attr, ConnWrapper):
-                return ConnWrapper(attr._soClass, self)
-            else:
-                return attr
-        else:
-            meth = new.instancemethod(func, self, self.__class__)
-            return meth
+        if isinstance(attr, ConnWrapper):
+            return ConnWrapper(attr._soClass, self)
+        func = getattr(attr, 'im_func', None)
+        if func is None:
+            return attr
+        return new.instancemethod(func, self, self.__class__)
 
     def _makeObsolete(self):
         self._obsolete = True
@@ -868,6 +1962,11 @@ class Transaction(object):
                                              explicit=True)
         self._connection = None
         self._deletedCache = {}
+        self._forgottenRows = {}
+        self._changedTables = {}
+        self._dirtyRows = {}
+        self._updatedRows = {}
+        self._joinRows = {}
 
     def begin(self):
         # @@: Should we do this, or should begin() be a no-op when we're
@@ -1,11 +1,41 @@
 import sys
 import types
-from sqlobject.include.pydispatch import dispatcher
+from sqlobject.include.pydispatch import dispatcher, robustapply
 from weakref import ref
 
 
 subclassClones = {}
 
+# Maps (id(sender), signal) to whether anything listens to it, so that
+# sending an unobserved signal costs a dictionary lookup.  A stale true
+# value (a weak receiver went away) only means a slow send; connecting
+# or disconnecting anything clears the whole index.
+_receiverIndex = {}
+
+# Maps (code, startIndex, number of positional arguments) to the
+# introspection robustApply would otherwise do on every call:
+# (names of the positional arguments, acceptable keyword names or
+# None if the receiver takes **kw).
+_receiverArgs = {}
+
+_dispatcherConnect = dispatcher.connect
+_dispatcherDisconnect = dispatcher.disconnect
+
+def connect(receiver, signal=dispatcher.Any, sender=dispatcher.Any,
+            weak=True):
+    _receiverIndex.clear()
+    return _dispatcherConnect(receiver, signal, sender, weak)
+
+def disconnect(receiver, signal=dispatcher.Any, sender=dispatcher.Any,
+               weak=True):
+    _receiverIndex.clear()
+    return _dispatcherDisconnect(receiver, signal, sender, weak)
+
+# Connections made directly through the dispatcher invalidate the
+# index too:
+dispatcher.connect = connect
+dispatcher.disconnect = disconnect
+
 def listen(receiver, soClass, signal, alsoSubclasses=True, weak=True):
     """
     Listen for the given ``signal`` on the SQLObject subclass
@@ -15,12 +45,76 @@ def listen(receiver, soClass, signal, alsoSubclasses=True, weak=True):
     If ``alsoSubclasses`` is true, receiver will also be called when
     an event is fired on any subclass.
     """
-    dispatcher.connect(receiver, signal=signal, sender=soClass, weak=weak)
+    connect(receiver, signal=signal, sender=soClass, weak=weak)
     weakReceiver = ref(receiver)
     subclassClones.setdefault(soClass, []).append((weakReceiver, signal))
 
-# We export this function:
-send = dispatcher.send
+def hasReceivers(signal, sender):
+    """
+    Tells if anything would receive ``signal`` sent by ``sender``.
+    """
+    key = (id(sender), signal)
+    try:
+        return _receiverIndex[key]
+    except KeyError:
+        found = False
+        for receiver in dispatcher.liveReceivers(
+                dispatcher.getAllReceivers(sender, signal)):
+            found = True
+            break
+        _receiverIndex[key] = found
+        return found
+
+def send(signal=dispatcher.Any, sender=dispatcher.Anonymous,
+         *arguments, **named):
+    """
+    Like ``dispatcher.send()``, but returns at once if nothing listens
+    to ``signal`` from ``sender``, and caches the introspection of
+    the receivers' arguments.
+    """
+    key = (id(sender), signal)
+    try:
+        if not _receiverIndex[key]:
+            return []
+    except KeyError:
+        if not hasReceivers(signal, sender):
+            return []
+    responses = []
+    for receiver in dispatcher.liveReceivers(
+            dispatcher.getAllReceivers(sender, signal)):
+        response = _applyReceiver(receiver, arguments, signal=signal,
+                                  sender=sender, **named)
+        responses.append((receiver, response))
+    return responses
+
+def _applyReceiver(receiver, arguments, **named):
+    """
+    ``robustapply.robustApply()`` with the argument introspection
+    cached by code object.
+    """
+    receiver, codeObject, startIndex = robustapply.function(receiver)
+    key = (codeObject, startIndex, len(arguments))
+    try:
+        positional, acceptable = _receiverArgs[key]
+    except KeyError:
+        varnames = codeObject.co_varnames
+        positional = varnames[startIndex:startIndex+len(arguments)]
+        if codeObject.co_flags & 8:
+            acceptable = None
+        else:
+            acceptable = varnames[startIndex+len(arguments):
+                                  codeObject.co_argcount]
+        _receiverArgs[key] = positional, acceptable
+    for name in positional:
+        if name in named:
+            raise TypeError(
+                "Argument %r specified both positionally and as a keyword "
+                "for calling %r" % (name, receiver))
+    if acceptable is not None:
+        for name in named.keys():
+            if name not in acceptable:
+                del named[name]
+    return receiver(*arguments, **named)
 
 class Signal(object):
     """
@@ -60,7 +154,7 @@ def _makeSubclassConnectionsPost(new_class):
                 continue
             listen(receiver, new_class, signal)
 
-dispatcher.connect(_makeSubclassConnections, signal=ClassCreateSignal)
+connect(_makeSubclassConnections, signal=ClassCreateSignal)
 
 # @@: Should there be a class reload event?  This would allow modules
 # to be reloaded, possibly.  Or it could even be folded into
@@ -255,7 +349,7 @@ def sort_name(value):
     else:
         return str(value)
 
-_real_dispatcher_send = dispatcher.send
+_real_dispatcher_send = send
 _real_dispatcher_sendExact = dispatcher.sendExact
 _real_dispatcher_disconnect = dispatcher.disconnect
 _real_dispatcher_connect = dispatcher.connect
@@ -320,7 +414,7 @@ def nice_repr(v):
         return repr(v)
 
 
-__all__ = ['listen', 'send']
+__all__ = ['listen', 'send', 'hasReceivers']
 for name, value in globals().items():
     if isinstance(value, type) and issubclass(value, Signal):
         __all__.append(name)
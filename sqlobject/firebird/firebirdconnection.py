@@ -9,6 +9,8 @@ kinterbasdb = None
 class FirebirdConnection(DBAPI):
 
     supportTransactions = False
+    multiRowInsert = False
+    pingQuery = 'SELECT 1 FROM rdb$database'
     dbName = 'firebird'
     schemes = [dbName]
 
@@ -1,3 +1,5 @@
+import time
+
 from sqlobject import sqlbuilder
 from sqlobject.classregistry import findClass
 from sqlobject.dbconnection import Iteration
@@ -22,7 +24,13 @@ class InheritableIteration(Iteration):
 
     def next(self):
         if not self._results:
-            self._results = list(self.cursor.fetchmany())
+            if self._event is not None:
+                start = time.time()
+                self._results = list(self.cursor.fetchmany())
+                self._event.duration += time.time() - start
+                self._event.rows += len(self._results)
+            else:
+                self._results = list(self.cursor.fetchmany())
             if not self.lazyColumns: self.fetchChildren()
         if not self._results:
             self._cleanup()
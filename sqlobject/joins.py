@@ -91,6 +91,21 @@ class SOJoin(object):
             results.sort(sorter(self.orderBy))
         return results
 
+    def _preloaded(self, inst):
+        """
+        Returns a copy of the list stored for ``inst`` by
+        ``.preload()``, or None.
+        """
+        cache = inst._SO_joinCache
+        if cache and self.joinMethodName in cache:
+            return list(cache[self.joinMethodName])
+        return None
+
+    def _forgetPreloaded(self, inst):
+        cache = getattr(inst, '_SO_joinCache', None)
+        if cache:
+            cache.pop(self.joinMethodName, None)
+
 def sorter(orderBy):
     if isinstance(orderBy, (tuple, list)):
         if len(orderBy) == 1:
@@ -145,7 +160,13 @@ class SOMultipleJoin(SOJoin):
         else:
             self.addRemoveName = capword(self.otherClassName)
 
+    # Can the results of the join be fetched with .preload()?
+    preloadable = True
+
     def performJoin(self, inst):
+        results = self._preloaded(inst)
+        if results is not None:
+            return results
         ids = inst._connection._SO_selectJoin(
             self.otherClass,
             self.joinColumn,
@@ -156,6 +177,57 @@ class SOMultipleJoin(SOJoin):
             conn = None
         return self._applyOrderBy([self.otherClass.get(id, conn) for (id,) in ids if id is not None], self.otherClass)
 
+    def _selectJoinMany(self, dbconn, ids):
+        return dbconn._SO_selectJoinMany(
+            self.otherClass,
+            self.joinColumn,
+            ids)
+
+    def preload(self, instances):
+        """
+        Fetches the join for all of ``instances`` at once: one query
+        over the join column with ``IN (...)`` (per
+        ``maxInListSize`` ids) and one ``.getMany()`` of the other
+        class.  The results are kept in every instance, and returned
+        by the join accessor until the instance expires.
+        """
+        if not self.preloadable:
+            raise TypeError("%s joins cannot be preloaded"
+                            % self.__class__.__name__)
+        instances = [inst for inst in instances if inst is not None]
+        if not instances:
+            return
+        if instances[0].sqlmeta._perConnection:
+            conn = instances[0]._connection
+        else:
+            conn = None
+        dbconn = instances[0]._connection
+        joined = {}
+        for inst in instances:
+            joined[inst.id] = []
+        ids = joined.keys()
+        rows = []
+        for start in range(0, len(ids), dbconn.maxInListSize):
+            rows.extend(self._selectJoinMany(
+                dbconn, ids[start:start+dbconn.maxInListSize]))
+        otherIDs = {}
+        for ownerID, otherID in rows:
+            if otherID is not None:
+                otherIDs[otherID] = None
+        otherIDs = otherIDs.keys()
+        others = dict(zip(otherIDs, self.otherClass.getMany(
+            otherIDs, connection=conn, default=None)))
+        for ownerID, otherID in rows:
+            other = others.get(otherID)
+            if other is not None and ownerID in joined:
+                joined[ownerID].append(other)
+        for results in joined.values():
+            self._applyOrderBy(results, self.otherClass)
+        for inst in instances:
+            if inst._SO_joinCache is None:
+                inst._SO_joinCache = {}
+            inst._SO_joinCache[self.joinMethodName] = joined[inst.id]
+
     def _dbNameToPythonName(self):
         for column in self.otherClass.sqlmeta.columns.values():
             if column.dbName == self.joinColumn:
@@ -167,6 +239,8 @@ class MultipleJoin(Join):
 
 class SOSQLMultipleJoin(SOMultipleJoin):
 
+    preloadable = False
+
     def performJoin(self, inst):
         if inst.sqlmeta._perConnection:
             conn = inst._connection
@@ -210,6 +284,9 @@ class SORelatedJoin(SOMultipleJoin):
         return True
 
     def performJoin(self, inst):
+        results = self._preloaded(inst)
+        if results is not None:
+            return results
         ids = inst._connection._SO_intermediateJoin(
             self.intermediateTable,
             self.otherColumn,
@@ -221,6 +298,13 @@ class SORelatedJoin(SOMultipleJoin):
             conn = None
         return self._applyOrderBy([self.otherClass.get(id, conn) for (id,) in ids if id is not None], self.otherClass)
 
+    def _selectJoinMany(self, dbconn, ids):
+        return dbconn._SO_intermediateJoinMany(
+            self.intermediateTable,
+            self.otherColumn,
+            self.joinColumn,
+            ids)
+
     def remove(self, inst, other):
         inst._connection._SO_intermediateDelete(
             self.intermediateTable,
@@ -228,6 +312,10 @@ class SORelatedJoin(SOMultipleJoin):
             getID(inst),
             self.otherColumn,
             getID(other))
+        self._forgetPreloaded(inst)
+        # The other side may have preloaded this relation too
+        if getattr(other, '_SO_joinCache', None):
+            other._SO_joinCache = None
 
     def add(self, inst, other):
         inst._connection._SO_intermediateInsert(
@@ -236,6 +324,9 @@ class SORelatedJoin(SOMultipleJoin):
             getID(inst),
             self.otherColumn,
             getID(other))
+        self._forgetPreloaded(inst)
+        if getattr(other, '_SO_joinCache', None):
+            other._SO_joinCache = None
 
 class RelatedJoin(MultipleJoin):
     baseClass = SORelatedJoin
@@ -280,6 +371,9 @@ class TableToId(sqlbuilder.SQLExpression):
         return '%s.%s = %s' % (self.table, self.idName, self.idValue)
 
 class SOSQLRelatedJoin(SORelatedJoin):
+
+    preloadable = False
+
     def performJoin(self, inst):
         if inst.sqlmeta._perConnection:
             conn = inst._connection
@@ -304,6 +398,8 @@ class SQLRelatedJoin(RelatedJoin):
 
 class SOSingleJoin(SOMultipleJoin):
 
+    preloadable = False
+
     def __init__(self, **kw):
         self.makeDefault = kw.pop('makeDefault', False)
         SOMultipleJoin.__init__(self, **kw)
@@ -39,6 +39,7 @@ import index
 import classregistry
 import declarative
 import events
+import cascade
 from sresults import SelectResults
 from util.threadinglocal import local
 
@@ -183,6 +184,27 @@ class sqlmeta(object):
     lazyUpdate = False
     defaultOrder = None
     cacheValues = True
+    # Replacement policy ('cull', 'lru', 'lfu' or a CacheFactory
+    # subclass) and maximum number of strongly cached instances;
+    # None means use the connection's settings.
+    cachePolicy = None
+    cacheSize = None
+    # Whether a new row is SELECTed back after its INSERT; if false,
+    # the values just inserted are trusted.  None means use the
+    # connection's setting.
+    selectAfterInsert = None
+    # How destroySelf() deletes the rows that depend on a row: None
+    # (set-based statements unless somebody listens to their row
+    # signals), 'rows', 'sets' or 'batches'; see sqlobject.cascade.
+    cascadeMode = None
+    # Whether rows fetched by id go through the connection's row
+    # cache, if it has one; see sqlobject.rowcache.
+    rowCache = True
+    # Whether the instances use the compact layout: the column values
+    # in one list (_SO_values), the lock, validator state and pending
+    # values made when first needed.  Saves memory for large caches;
+    # reading a value is a little slower.
+    compact = False
     registry = None
     fromDatabase = False
     # Default is false, but we set it to true for the *instance*
@@ -237,6 +259,16 @@ class sqlmeta(object):
     # Default encoding for UnicodeCol's
     dbEncoding = None
 
+    # The plan for loading rows into instances (a _RowLoader), made
+    # by _getRowLoader() after the columns change:
+    _rowLoader = None
+    # For compact classes, the position of the value of each column
+    # in _SO_values; positions of deleted columns aren't reused.
+    _slots = {}
+    _slotCount = 0
+    # For compact classes, the class of the sqlmeta instances
+    _instanceClass = None
+
     __metaclass__ = declarative.DeclarativeMeta
 
     def __classinit__(cls, new_attrs):
@@ -290,6 +322,53 @@ class sqlmeta(object):
         cls.indexDefinitions = cls.indexDefinitions[:]
         cls.joins = []
         cls.joinDefinitions = cls.joinDefinitions[:]
+        cls._rowLoader = None
+        cls._slots = cls._slots.copy()
+        cls._instanceClass = None
+        for base in soClass.__bases__:
+            # The values of the columns of a compact class are kept
+            # in the list by its subclasses, too
+            if getattr(getattr(base, 'sqlmeta', None), 'compact', False):
+                cls.compact = True
+        if cls.compact:
+            for name, factory in _lazyInstanceAttributes:
+                setattr(soClass, name, _LazyInstanceAttribute(name, factory))
+            cls._instanceClass = cls._makeInstanceClass()
+
+    # The attributes of sqlmeta instances kept in slots by compact
+    # classes (so the instances don't need a __dict__):
+    _instanceSlots = ('instance', 'dirty', 'expired', '_perConnection',
+                      '_obsolete')
+
+    @classmethod
+    def _makeInstanceClass(cls):
+        def __init__(self, instance):
+            for name in cls._instanceSlots[1:]:
+                setattr(self, name, getattr(cls, name))
+            cls.__init__(self, instance)
+        instanceClass = type(cls.__name__, (cls,), {
+            '__slots__': cls._instanceSlots, '__init__': __init__})
+        # Created by __classinit__, but these belong to cls
+        for attr in cls._unshared_attributes:
+            delattr(instanceClass, attr)
+        return instanceClass
+
+    @classmethod
+    def _getRowLoader(cls):
+        # Kept on the class of soClass, not on a subclass (like the
+        # _instanceClass of compact classes)
+        sqlmeta = cls.soClass.sqlmeta
+        loader = sqlmeta._rowLoader
+        if loader is None:
+            if sqlmeta.compact:
+                slots = [sqlmeta._slots[column.name]
+                         for column in sqlmeta.columnList]
+                loader = _RowLoader(sqlmeta.columnList, slots,
+                                    sqlmeta._slotCount)
+            else:
+                loader = _RowLoader(sqlmeta.columnList)
+            sqlmeta._rowLoader = loader
+        return loader
 
     ############################################################
     ## Adding special values, like columns and indexes
@@ -332,6 +411,13 @@ class sqlmeta(object):
         sqlmeta.columns[name] = column
         # A stable-ordered version of the list...
         sqlmeta.columnList.append(column)
+        sqlmeta._rowLoader = None
+        if sqlmeta.compact:
+            if name not in sqlmeta._slots:
+                sqlmeta._slots[name] = sqlmeta._slotCount
+                sqlmeta._slotCount += 1
+            setattr(soClass, instanceName(name),
+                    _CompactValue(instanceName(name), sqlmeta._slots[name]))
 
         ###################################################
         # Create the getter function(s).  We'll start by
@@ -431,6 +517,7 @@ class sqlmeta(object):
 
         if soClass._SO_finishedClassCreation:
             makeProperties(soClass)
+            cascade.forgetPlans()
 
         for func in post_funcs:
             func(soClass, column)
@@ -471,6 +558,10 @@ class sqlmeta(object):
         del sqlmeta.columns[name]
         del sqlmeta.columnDefinitions[name]
         sqlmeta.columnList.remove(column)
+        sqlmeta._rowLoader = None
+        if sqlmeta.compact:
+            del sqlmeta._slots[name]
+            delattr(soClass, instanceName(name))
         delattr(soClass, rawGetterName(name))
         if name in sqlmeta._plainGetters:
             delattr(soClass, getterName(name))
@@ -494,6 +585,7 @@ class sqlmeta(object):
         if soClass._SO_finishedClassCreation:
             unmakeProperties(soClass)
             makeProperties(soClass)
+            cascade.forgetPlans()
 
         for func in post_funcs:
             func(soClass, column)
@@ -550,6 +642,7 @@ class sqlmeta(object):
 
         if soClass._SO_finishedClassCreation:
             makeProperties(soClass)
+            cascade.forgetPlans()
 
     @classmethod
     def delJoin(sqlmeta, joinDef):
@@ -587,6 +680,7 @@ class sqlmeta(object):
         if soClass._SO_finishedClassCreation:
             unmakeProperties(soClass)
             makeProperties(soClass)
+            cascade.forgetPlans()
 
     ########################################
     ## Indexes
@@ -718,6 +812,9 @@ class SQLObject(object):
     _parent = None # A reference to the parent instance
     childName = None # Children name (to be able to get a subclass)
 
+    # Join results stored by preloadJoins(), by join name
+    _SO_joinCache = None
+
     # The law of Demeter: the class should not call another classes by name
     SelectResultsClass = SelectResults
 
@@ -890,7 +987,8 @@ class SQLObject(object):
         if val is None:
             try:
                 val = cls(_SO_fetch_no_create=1)
-                val._SO_validatorState = sqlbuilder.SQLObjectState(val)
+                if not cls.sqlmeta.compact:
+                    val._SO_validatorState = sqlbuilder.SQLObjectState(val)
                 val._init(id, connection, selectResults)
                 cache.put(id, cls, val)
             finally:
@@ -904,6 +1002,196 @@ class SQLObject(object):
                 val._SO_writeLock.release()
         return val
 
+    @classmethod
+    def _SO_getUncached(cls, id, connection=None, selectResults=None):
+        """
+        Like get(), but always makes a new instance, without looking
+        into or storing it in the cache.
+        """
+        val = cls(_SO_fetch_no_create=1)
+        if not cls.sqlmeta.compact:
+            val._SO_validatorState = sqlbuilder.SQLObjectState(val)
+        val._init(cls.sqlmeta.idType(id), connection, selectResults)
+        return val
+
+    @classmethod
+    def getMany(cls, ids, connection=None, default=NoDefault):
+        """
+        Returns the instances for all the given ids, in the same
+        order.  Instances already in the cache are used as they are;
+        the rest are fetched with ``IN (...)`` queries of at most
+        ``connection.maxInListSize`` ids each.
+
+        If some of the rows don't exist ``SQLObjectNotFound`` is raised
+        once, listing all the missing ids, unless a ``default`` is
+        given, which is then returned in their place.
+        """
+        idType = cls.sqlmeta.idType
+        ids = [idType(id) for id in ids]
+        conn = connection or cls._connection
+        cache = conn.cache
+
+        found = {}
+        missing = []
+        for id in ids:
+            if id in found:
+                continue
+            val = cache.tryGet(id, cls)
+            if val is None:
+                missing.append(id)
+            found[id] = val
+
+        if missing:
+            dbNames = [cls.sqlmeta.idName] + \
+                [col.dbName for col in cls.sqlmeta.columnList]
+            chunkSize = conn.maxInListSize
+            for start in range(0, len(missing), chunkSize):
+                rows = conn._SO_selectMany(cls, dbNames,
+                                           missing[start:start+chunkSize])
+                for row in rows:
+                    val = cls.get(row[0], connection=connection,
+                                  selectResults=row[1:])
+                    found[val.id] = val
+
+        notFound = [id for id in missing if found[id] is None]
+        if notFound:
+            if default is NoDefault:
+                raise SQLObjectNotFound, "The %s objects by the IDs %s do not exist" % (cls.__name__, ', '.join([str(id) for id in notFound]))
+            for id in notFound:
+                found[id] = default
+        return [found[id] for id in ids]
+
+    @classmethod
+    def preloadJoins(cls, instances, *joinNames):
+        """
+        Fetches the MultipleJoin/RelatedJoin attributes ``joinNames``
+        for all of ``instances`` (a list or a SelectResults) with one
+        query per join, plus a ``.getMany()`` of the joined class.
+        The join accessors then return the preloaded lists until the
+        instance expires.  Returns the list of instances.
+        """
+        instances = list(instances)
+        for name in joinNames:
+            for join in cls.sqlmeta.joins:
+                if join is not None and join.joinMethodName == name:
+                    break
+            else:
+                raise AttributeError("%s has no join %r" % (cls.__name__, name))
+            join.preload(instances)
+        return instances
+
+    @classmethod
+    def bulkInsert(cls, rows, batchSize=1000, returnObjects=False,
+                   connection=None):
+        """
+        Inserts many rows at once.  ``rows`` is an iterable of
+        dictionaries, with the keyword arguments the constructor would
+        get; they are written with multi-row ``INSERT`` statements of
+        at most ``batchSize`` rows.  Validators and constant defaults
+        are looked up once per column; callable defaults are called
+        for each row, as on a normal insert.  No instances are created
+        and no RowCreateSignal or RowCreatedSignal is sent.
+
+        Returns the list of new ids (None if the backend cannot tell
+        them), or the new instances if ``returnObjects`` is true.
+        """
+        if cls._inheritable:
+            raise TypeError("%s.bulkInsert() does not support inheritable classes" % cls.__name__)
+        conn = connection or cls._connection
+        state = sqlbuilder.SQLObjectState(cls, connection=connection)
+        sqlmeta = cls.sqlmeta
+        idName = sqlmeta.idName
+
+        columns = {}
+        converters = {}
+        defaults = {}
+        # Columns whose default is called for each row
+        callDefaults = {}
+        for column in sqlmeta.columnList:
+            columns[column.name] = column
+            if column.foreignName:
+                columns[column.foreignName] = column
+            from_python = getattr(cls, '_SO_from_python_%s' % column.name, None)
+            converters[column.name] = from_python
+            if column._default is not NoDefault \
+                   and callable(column._default) \
+                   and not hasattr(column._default, '__sqlrepr__'):
+                callDefaults[column.name] = True
+                continue
+            default = column.default
+            if default is not NoDefault and from_python:
+                default = from_python(default, state)
+            defaults[column.name] = default
+
+        def insert(names, batch):
+            if names and names[0] == idName:
+                conn.queryInsertMany(cls, names, batch)
+                return [row[0] for row in batch]
+            return conn.queryInsertMany(cls, names, batch)
+
+        ids = []
+        names = None
+        batch = []
+        for row in rows:
+            values = {}
+            for name, value in row.items():
+                if name == 'id':
+                    values[idName] = sqlmeta.idType(value)
+                    continue
+                column = columns.get(name)
+                if column is None:
+                    raise TypeError, "%s.bulkInsert() got an unexpected column %s" % (cls.__name__, name)
+                if name != column.name:
+                    value = getID(value, column.refColumn)
+                from_python = converters[column.name]
+                if from_python:
+                    value = from_python(value, state)
+                values[column.dbName] = value
+            for column in sqlmeta.columnList:
+                if column.dbName in values:
+                    continue
+                if column.name in callDefaults:
+                    default = column.default
+                    from_python = converters[column.name]
+                    if from_python:
+                        default = from_python(default, state)
+                    values[column.dbName] = default
+                    continue
+                default = defaults[column.name]
+                if default is NoDefault:
+                    if column.defaultSQL is None:
+                        raise TypeError, "%s.bulkInsert() did not get expected column '%s'" % (cls.__name__, column.name)
+                    # Let the backend create the value
+                    continue
+                values[column.dbName] = default
+            rowNames = values.keys()
+            rowNames.sort()
+            if idName in values:
+                rowNames.remove(idName)
+                rowNames.insert(0, idName)
+            # Rows in one INSERT must set the same columns
+            if batch and (rowNames != names or len(batch) >= batchSize):
+                newIDs = insert(names, batch)
+                if ids is not None and newIDs is not None:
+                    ids.extend(newIDs)
+                else:
+                    ids = None
+                batch = []
+            names = rowNames
+            batch.append([values[name] for name in names])
+        if batch:
+            newIDs = insert(names, batch)
+            if ids is not None and newIDs is not None:
+                ids.extend(newIDs)
+            else:
+                ids = None
+
+        if not returnObjects:
+            return ids
+        if ids is None:
+            raise ValueError("%s cannot tell the ids of the inserted rows" % conn.__class__.__name__)
+        return cls.getMany(ids, connection=connection)
+
     @classmethod
     def _notifyFinishClassCreation(cls):
         pass
@@ -914,7 +1202,9 @@ class SQLObject(object):
         # created, unlike __init__ which would be called
         # anytime the object was returned from cache.
         self.id = id
-        self._SO_writeLock = threading.Lock()
+        compact = self.sqlmeta.compact
+        if not compact:
+            self._SO_writeLock = threading.Lock()
 
         # If no connection was given, we'll inherit the class
         # instance variable which should have a _connection
@@ -929,11 +1219,12 @@ class SQLObject(object):
 
         if not selectResults:
             dbNames = [col.dbName for col in self.sqlmeta.columnList]
-            selectResults = self._connection._SO_selectOne(self, dbNames)
+            selectResults = self._connection._SO_selectRow(self, dbNames)
             if not selectResults:
                 raise SQLObjectNotFound, "The object %s by the ID %s does not exist" % (self.__class__.__name__, self.id)
         self._SO_selectInit(selectResults)
-        self._SO_createValues = {}
+        if not compact:
+            self._SO_createValues = {}
         self.sqlmeta.dirty = False
 
     def _SO_loadValue(self, attrName):
@@ -999,6 +1290,7 @@ class SQLObject(object):
             func(self)
 
     def expire(self):
+        self._SO_joinCache = None
         if self.sqlmeta.expired:
             return
         self._SO_writeLock.acquire()
@@ -1006,7 +1298,11 @@ class SQLObject(object):
             if self.sqlmeta.expired:
                 return
             for column in self.sqlmeta.columnList:
-                delattr(self, instanceName(column.name))
+                try:
+                    delattr(self, instanceName(column.name))
+                except AttributeError:
+                    # Not loaded yet (left to the database on insert)
+                    pass
             self.sqlmeta.expired = True
             self._connection.cache.expire(self.id, self.__class__)
             self._SO_createValues = {}
@@ -1148,10 +1444,7 @@ class SQLObject(object):
             func(self)
 
     def _SO_selectInit(self, row):
-        for col, colValue in zip(self.sqlmeta.columnList, row):
-            if col.to_python:
-                colValue = col.to_python(colValue, self._SO_validatorState)
-            setattr(self, instanceName(col.name), colValue)
+        self.sqlmeta._getRowLoader().load(self, row)
 
     def _SO_getValue(self, name):
         # Retrieves a single value from the database.  Simple.
@@ -1198,7 +1491,8 @@ class SQLObject(object):
             # We shadow the sqlmeta class with an instance of sqlmeta
             # that points to us (our sqlmeta buddy object; where the
             # sqlmeta class is our class's buddy class)
-            self.sqlmeta = self.__class__.sqlmeta(self)
+            self.sqlmeta = (self.__class__.sqlmeta._instanceClass
+                            or self.__class__.sqlmeta)(self)
             # The get() classmethod/constructor uses a magic keyword
             # argument when it wants an empty object, fetched from the
             # database.  So we have nothing more to do in that case:
@@ -1294,11 +1588,36 @@ class SQLObject(object):
         # Do the insert -- most of the SQL in this case is left
         # up to DBConnection, since getting a new ID is
         # non-standard.
-        id = self._connection.queryInsertID(self,
-                                            id, names, values)
-        cache = self._connection.cache
-        cache.created(id, self.__class__, self)
-        self._init(id)
+        connection = self._connection
+        selectAfterInsert = self.sqlmeta.selectAfterInsert
+        if selectAfterInsert is None:
+            selectAfterInsert = connection.selectAfterInsert
+        if selectAfterInsert:
+            id = connection.queryInsertID(self, id, names, values)
+            connection.cache.created(id, self.__class__, self)
+            self._init(id)
+        elif connection.insertReturning:
+            # Get the values the database stored, defaults included,
+            # with the INSERT itself
+            dbNames = [col.dbName for col in self.sqlmeta.columnList]
+            row = connection.queryInsertReturning(self, id, names, values,
+                                                  dbNames)
+            id = row[0]
+            connection.cache.created(id, self.__class__, self)
+            self.id = id
+            self._SO_selectInit(row[1:])
+            if not self.sqlmeta.compact:
+                self._SO_createValues = {}
+            self.sqlmeta.dirty = False
+        else:
+            # The values set by set() are kept; columns left to
+            # the database (defaultSQL) are loaded when accessed
+            id = connection.queryInsertID(self, id, names, values)
+            connection.cache.created(id, self.__class__, self)
+            self.id = id
+            if not self.sqlmeta.compact:
+                self._SO_createValues = {}
+            self.sqlmeta.dirty = False
         post_funcs = []
         kw = dict([('class', self.__class__), ('id', id)])
         def _send_RowCreatedSignal():
@@ -1393,6 +1712,7 @@ class SQLObject(object):
         cls.sqlmeta.send(events.DropTableSignal, cls, connection,
                          extra_sql, post_funcs)
         conn.dropTable(cls.sqlmeta.table, cascade)
+        conn._forgetTable(cls.sqlmeta.table)
         if dropJoinTables:
             cls.dropJoinTables(ifExists=ifExists, connection=conn)
         for sql in extra_sql:
@@ -1520,6 +1840,22 @@ class SQLObject(object):
         self.sqlmeta.send(events.RowDestroySignal, self, post_funcs)
         # Kills this object.  Kills it dead!
 
+        if cascade.destroyRow(self):
+            self.sqlmeta._obsolete = True
+        else:
+            self._SO_destroyRows()
+        self._connection.cache.expire(self.id, self.__class__)
+
+        for func in post_funcs:
+            func(self)
+
+        post_funcs = []
+        self.sqlmeta.send(events.RowDestroyedSignal, self, post_funcs)
+        for func in post_funcs:
+            func(self)
+
+    def _SO_destroyRows(self):
+        # Deletes the dependent rows one by one, then this one
         klass = self.__class__
 
         # Free related joins on the base class
@@ -1577,15 +1913,6 @@ class SQLObject(object):
 
         self.sqlmeta._obsolete = True
         self._connection._SO_delete(self)
-        self._connection.cache.expire(self.id, self.__class__)
-
-        for func in post_funcs:
-            func(self)
-
-        post_funcs = []
-        self.sqlmeta.send(events.RowDestroyedSignal, self, post_funcs)
-        for func in post_funcs:
-            func(self)
 
     @classmethod
     def delete(cls, id, connection=None):
@@ -1596,12 +1923,14 @@ class SQLObject(object):
     def deleteMany(cls, where=NoDefault, connection=None):
         conn = connection or cls._connection
         conn.query(conn.sqlrepr(sqlbuilder.Delete(cls.sqlmeta.table, where)))
+        conn._forgetTable(cls.sqlmeta.table)
 
     @classmethod
     def deleteBy(cls, connection=None, **kw):
         conn = connection or cls._connection
         conn.query(conn.sqlrepr(sqlbuilder.Delete(cls.sqlmeta.table,
             conn._SO_columnClause(cls, kw))))
+        conn._forgetTable(cls.sqlmeta.table)
 
     def __repr__(self):
         if not hasattr(self, 'id'):
@@ -1680,9 +2009,8 @@ class SQLObject(object):
             self.syncUpdate()
         d = self.__dict__.copy()
         del d['sqlmeta']
-        del d['_SO_validatorState']
-        del d['_SO_writeLock']
-        del d['_SO_createValues']
+        for name, factory in _lazyInstanceAttributes:
+            d.pop(name, None)
         return d
 
     def __setstate__(self, d):
@@ -1710,6 +2038,177 @@ def rawGetterName(name):
 def instanceName(name):
     return '_SO_val_%s' % name
 
+class _ConvertedRow(tuple):
+    """
+    Column values already converted by _RowLoader.convertRows().
+    """
+
+class _Unloaded:
+    """
+    Marks the values of a compact instance that aren't loaded.
+    """
+
+class _CompactValue(object):
+
+    """
+    The ``_SO_val_*`` attribute of a column of a compact class: the
+    value is kept in the ``_SO_values`` list of the instance, at the
+    position of the column.
+    """
+
+    def __init__(self, name, slot):
+        self.name = name
+        self.slot = slot
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        try:
+            value = obj.__dict__['_SO_values'][self.slot]
+        except (KeyError, IndexError):
+            value = _Unloaded
+        if value is _Unloaded:
+            raise AttributeError("%r object has no attribute %r"
+                                 % (obj.__class__.__name__, self.name))
+        return value
+
+    def __set__(self, obj, value):
+        values = obj.__dict__.get('_SO_values')
+        if values is None:
+            values = obj.__dict__['_SO_values'] = []
+        if len(values) <= self.slot:
+            values.extend([_Unloaded] * (self.slot + 1 - len(values)))
+        values[self.slot] = value
+
+    def __delete__(self, obj):
+        self.__get__(obj)
+        obj.__dict__['_SO_values'][self.slot] = _Unloaded
+
+_lazyLock = threading.Lock()
+
+class _LazyInstanceAttribute(object):
+
+    """
+    Makes an instance attribute of a compact class the first time it
+    is used.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        _lazyLock.acquire()
+        try:
+            try:
+                return obj.__dict__[self.name]
+            except KeyError:
+                value = obj.__dict__[self.name] = self.factory(obj)
+                return value
+        finally:
+            _lazyLock.release()
+
+_lazyInstanceAttributes = [
+    ('_SO_writeLock', lambda obj: threading.Lock()),
+    ('_SO_validatorState', lambda obj: sqlbuilder.SQLObjectState(obj)),
+    ('_SO_createValues', lambda obj: {}),
+    ]
+
+class _RowLoader(object):
+
+    """
+    Loads the rows of a class into its instances: the attribute
+    names are computed (and interned) once, only the columns that have
+    a converter (``to_python``) go through it, skipping the values of
+    the types it returns unchanged (the ``identityTypes`` of
+    SQLObject's validators), and the values are then stored with a
+    single ``__dict__.update()`` -- or, for compact classes, as the
+    ``_SO_values`` list.
+
+    Rows may have more values than there are columns (the extra ones
+    are ignored) or fewer (the missing columns are left unloaded).
+    """
+
+    def __init__(self, columnList, slots=None, slotCount=0):
+        self.names = [intern(instanceName(column.name))
+                      for column in columnList]
+        self.converters = []
+        for index, column in enumerate(columnList):
+            if not column.to_python:
+                continue
+            validatorClass = type(column.validator)
+            identityTypes = validatorClass.__dict__.get('identityTypes', ())
+            self.converters.append((index, column.to_python,
+                                    frozenset(identityTypes)))
+        # For compact classes: the positions of the values, and
+        # whether a whole row makes the whole list
+        self.slots = slots
+        self.contiguous = slots == range(slotCount)
+
+    def load(self, instance, row):
+        if self.slots is not None:
+            self._loadCompact(instance, row)
+            return
+        if type(row) is not _ConvertedRow:
+            row = self.convert(row, instance._SO_validatorState)
+        instance.__dict__.update(zip(self.names, row))
+
+    def _loadCompact(self, instance, row):
+        d = instance.__dict__
+        if type(row) is not _ConvertedRow:
+            state = d.get('_SO_validatorState')
+            if state is None:
+                state = sqlbuilder.SQLObjectState(instance)
+            row = self.convert(row, state)
+        size = len(self.slots)
+        if self.contiguous and len(row) >= size:
+            values = list(row)
+            del values[size:]
+            d['_SO_values'] = values
+            return
+        values = list(d.get('_SO_values') or ())
+        if self.slots:
+            missing = max(self.slots) + 1 - len(values)
+            if missing > 0:
+                values.extend([_Unloaded] * missing)
+        for slot, value in zip(self.slots, row):
+            values[slot] = value
+        d['_SO_values'] = values
+
+    def convert(self, row, state):
+        values = list(row)
+        converters = self.converters
+        if len(values) < len(self.names):
+            converters = [converter for converter in converters
+                          if converter[0] < len(values)]
+        for index, to_python, identityTypes in converters:
+            value = values[index]
+            if type(value) not in identityTypes:
+                values[index] = to_python(value, state)
+        return values
+
+    def convertRows(self, results, state):
+        """
+        Converts a batch of select results -- ids followed by the
+        column values -- column by column.  Returns ``(id, row)``
+        pairs, the rows ready for ``_SO_selectInit()``.
+        """
+        columns = map(list, zip(*results))
+        if not columns:
+            return []
+        ids = columns.pop(0)
+        for index, to_python, identityTypes in self.converters:
+            if index >= len(columns):
+                continue
+            column = columns[index]
+            if identityTypes.issuperset(map(type, column)):
+                continue
+            columns[index] = [to_python(value, state) for value in column]
+        rows = map(_ConvertedRow, zip(*columns)) or [()] * len(ids)
+        return zip(ids, rows)
+
 
 ########################################
 ## Utility functions (for external consumption)
@@ -56,6 +56,8 @@ SAPDBMAX_ID_LENGTH=32
 class MaxdbConnection(DBAPI):
 
     supportTransactions = True
+    multiRowInsert = False
+    pingQuery = 'SELECT 1 FROM DUAL'
     dbName = 'maxdb'
     schemes = [dbName]
 
@@ -89,7 +89,7 @@ class MySQLConnection(DBAPI):
         if hasattr(conn, 'autocommit'):
             conn.autocommit(auto)
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.need_unicode and not isinstance(query, unicode):
             try:
                 query = unicode(query, self.dbEncoding)
@@ -110,7 +110,9 @@ class MySQLConnection(DBAPI):
         # done by calling ping(True) on the connection.
         for count in range(3):
             try:
-                return cursor.execute(query)
+                if params is None:
+                    return cursor.execute(query)
+                return cursor.execute(query, params)
             except self.module.OperationalError, e:
                 if e.args[0] in (self.module.constants.CR.SERVER_GONE_ERROR, self.module.constants.CR.SERVER_LOST):
                     if count == 2:
@@ -162,6 +164,21 @@ class MySQLConnection(DBAPI):
             self.printDebug(conn, id, 'QueryIns', 'result')
         return id
 
+    def _streamCursor(self, conn, hold=True):
+        # An unbuffered cursor reads the rows from the server as they
+        # are fetched; no other statement can run on the connection
+        # until they all are, so it doesn't set streamInterleaves
+        import MySQLdb.cursors
+        return conn.cursor(MySQLdb.cursors.SSCursor)
+
+    def _insertedIDs(self, soClass, cursor, count):
+        # MySQL reports the id of the first row of a multi-row INSERT
+        try:
+            firstID = cursor.lastrowid
+        except AttributeError:
+            firstID = cursor.insert_id()
+        return range(firstID, firstID + count)
+
     @classmethod
     def _queryAddLimitOffset(cls, query, start, end):
         if not start:
@@ -0,0 +1,318 @@
+"""
+Parallel scans of a select.
+
+``SelectResults.parallelMap(func)`` splits a select into key ranges of
+a numeric column (the id by default), found with ``MIN()``/``MAX()``,
+and calls ``func(instance)`` on the rows of each range in a worker of
+its own::
+
+    for total in Order.select(Order.q.paid == False).parallelMap(
+            computeTotal, workers=8):
+        ...
+
+In the ``'thread'`` mode the workers are threads; each iterates over
+its range with a database connection of its own from the pool of the
+connection.  In the ``'process'`` mode (with the ``multiprocessing``
+module) they are processes, each opening a new connection from the
+``uri()`` of the connection; ``func`` must then be a function of a
+module, and its results are pickled back, so they should not be
+instances.
+
+The results come back in batches as the workers make them: range
+after range (in the order of the select within each range) by
+default, or as soon as they are made with ``ordered=False``.
+"""
+
+import sys
+import threading
+import traceback
+import Queue
+from collections import deque
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+import dbconnection
+import sqlbuilder
+
+__all__ = ['ParallelError', 'ParallelResults']
+
+class ParallelError(Exception):
+
+    """
+    Raised for an exception of a worker process that could not be
+    sent back as it was; its message has the traceback of the worker.
+    """
+
+def keyRanges(low, high, count):
+    """
+    Splits ``low``-``high`` (inclusive) into at most ``count`` ranges:
+    a list of ``(start, stop, last)``, the last range including its
+    ``stop``.  Integers are split exactly, without empty ranges.
+    """
+    if isinstance(low, (int, long)) and isinstance(high, (int, long)):
+        size = high - low + 1
+        bounds = []
+        for i in range(count + 1):
+            bound = low + size * i // count
+            if not bounds or bound != bounds[-1]:
+                bounds.append(bound)
+        return [(bounds[i], bounds[i+1], False)
+                for i in range(len(bounds) - 1)]
+    size = float(high - low)
+    bounds = [low + size * i / count for i in range(count)] + [high]
+    return [(bounds[i], bounds[i+1], i == count - 1)
+            for i in range(count)
+            if i == count - 1 or bounds[i] != bounds[i+1]]
+
+def partitions(select, column, count):
+    """
+    Returns the selects of the rows of ``select`` in at most ``count``
+    ranges of ``column`` (rows with a NULL key are left out).
+    """
+    low, high = select.accumulateMany(('MIN', column), ('MAX', column))
+    if low is None:
+        return []
+    for value in (low, high):
+        if not isinstance(value, (int, long, float)):
+            raise ValueError("Cannot split %s into ranges of %s, it is not numeric (got %r)" % (select.sourceClass.__name__, select._getConnection().sqlrepr(column), value))
+    result = []
+    for start, stop, last in keyRanges(low, high, count):
+        if last:
+            clause = sqlbuilder.AND(column >= start, column <= stop)
+        else:
+            clause = sqlbuilder.AND(column >= start, column < stop)
+        result.append(select.filter(clause))
+    return result
+
+def parallelMap(select, func, workers, partitionBy, mode, ordered, batchSize):
+    if select.ops.get('start') or select.ops.get('end') is not None:
+        raise ValueError("Cannot split a sliced select into ranges")
+    if workers < 1:
+        raise ValueError("parallelMap() needs at least one worker (got %r)" % workers)
+    if mode not in ('thread', 'process'):
+        raise ValueError("parallelMap() mode must be 'thread' or 'process' (got %r)" % mode)
+    conn = select._getConnection()
+    if isinstance(conn, dbconnection.Transaction):
+        raise ValueError("A transaction cannot be shared by workers")
+    if getattr(conn, '_memory', False):
+        raise ValueError("An in-memory database cannot be shared by workers")
+    if partitionBy is None:
+        partitionBy = select.sourceClass.q.id
+    elif isinstance(partitionBy, basestring):
+        partitionBy = getattr(select.sourceClass.q, partitionBy)
+    selects = partitions(select, partitionBy, workers)
+    if mode == 'thread':
+        return _threadMap(selects, func, ordered, batchSize)
+    return _processMap(conn, selects, func, ordered, batchSize)
+
+def _put(queue, message, stopped):
+    """
+    Puts ``message`` in ``queue`` unless ``stopped`` is set (while
+    waiting for room); returns whether it did.
+    """
+    if stopped is None:
+        queue.put(message)
+        return True
+    while not stopped.isSet():
+        try:
+            queue.put(message, True, 0.1)
+        except Queue.Full:
+            continue
+        return True
+    return False
+
+def _mapRange(select, func, index, queue, batchSize, stopped, remote=False):
+    """
+    Sends the results of ``func`` on the rows of ``select`` to
+    ``queue`` as messages ``(index, 'rows', results)``, then
+    ``(index, 'done', None)`` or ``(index, 'error', error)``.
+    """
+    try:
+        batch = []
+        for inst in select.lazyIter():
+            batch.append(func(inst))
+            if len(batch) >= batchSize:
+                if not _put(queue, (index, 'rows', batch), stopped):
+                    return
+                batch = []
+        if batch and not _put(queue, (index, 'rows', batch), stopped):
+            return
+    except:
+        if remote:
+            error = _remoteError()
+        else:
+            error = sys.exc_info()
+        _put(queue, (index, 'error', error), stopped)
+    else:
+        _put(queue, (index, 'done', None), stopped)
+
+def _remoteError():
+    """
+    Returns the exception being handled if it can be pickled, else a
+    ParallelError with its traceback.
+    """
+    import cPickle
+    excType, excValue, excTraceback = sys.exc_info()
+    try:
+        cPickle.dumps(excValue, 2)
+    except Exception:
+        excValue = ParallelError(''.join(traceback.format_exception(
+            excType, excValue, excTraceback)))
+    return excValue
+
+def _queues(queueClass, selects, ordered):
+    # A queue of two batches per range when they are read in order,
+    # else one shared queue
+    if ordered:
+        return [queueClass(2) for select in selects]
+    return [queueClass(2 * len(selects))] * len(selects)
+
+def _threadMap(selects, func, ordered, batchSize):
+    queues = _queues(Queue.Queue, selects, ordered)
+    stopped = threading.Event()
+    for index, select in enumerate(selects):
+        thread = threading.Thread(
+            target=_mapRange,
+            args=(select, func, index, queues[index], batchSize, stopped))
+        thread.setDaemon(True)
+        thread.start()
+    def stop(finished):
+        stopped.set()
+    return ParallelResults(queues, ordered, stop)
+
+def _openConnection(uri):
+    """
+    Opens a new connection for ``uri``; ``connectionForURI()`` would
+    give the cached connection inherited from the parent process.
+    """
+    scheme = uri.split(':', 1)[0]
+    return dbconnection.dbConnectionForScheme(scheme).connectionFromURI(uri)
+
+def _processRange(uri, soClass, where, clauseTables, ops, func, index,
+                  queue, batchSize):
+    conn = _openConnection(uri)
+    try:
+        select = soClass.select(sqlbuilder.SQLConstant(where),
+                                clauseTables=clauseTables,
+                                connection=conn, **ops)
+        _mapRange(select, func, index, queue, batchSize, None, remote=True)
+    finally:
+        conn.close()
+
+def _processArgs(conn, select):
+    """
+    Returns the arguments of ``_processRange()`` that rebuild
+    ``select`` in another process: its class, its WHERE clause and
+    ORDER BY rendered in SQL, and the other options.
+    """
+    if select.ops.get('join', sqlbuilder.NoDefault) not in (None, sqlbuilder.NoDefault):
+        raise ValueError("Cannot send a select with joins to a worker process")
+    orderBy = select.ops.get('dbOrderBy')
+    if orderBy is not None and orderBy is not sqlbuilder.NoDefault:
+        if isinstance(orderBy, (tuple, list)):
+            orderBy = ', '.join([conn.sqlrepr(item) for item in orderBy])
+        else:
+            orderBy = conn.sqlrepr(orderBy)
+        orderBy = sqlbuilder.SQLConstant(orderBy)
+    else:
+        orderBy = None
+    ops = {'orderBy': orderBy}
+    for name in ('distinct', 'lazyColumns', 'reversed', 'prefetch'):
+        if name in select.ops:
+            ops[name] = select.ops[name]
+    clauseTables = [table for table in select.tables
+                    if table != select.sourceClass.sqlmeta.table]
+    return (select.sourceClass, conn.sqlrepr(select.clause), clauseTables,
+            ops)
+
+def _processMap(conn, selects, func, ordered, batchSize):
+    if multiprocessing is None:
+        raise ImportError("parallelMap(mode='process') needs the multiprocessing module")
+    uri = conn.uri()
+    args = [_processArgs(conn, select) for select in selects]
+    queues = _queues(multiprocessing.Queue, selects, ordered)
+    processes = []
+    for index, (soClass, where, clauseTables, ops) in enumerate(args):
+        process = multiprocessing.Process(
+            target=_processRange,
+            args=(uri, soClass, where, clauseTables, ops, func, index,
+                  queues[index], batchSize))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+    def stop(finished):
+        for process in processes:
+            if not finished and process.is_alive():
+                process.terminate()
+            process.join()
+    def check():
+        for process in processes:
+            if process.exitcode:
+                raise ParallelError("A worker process exited with code %s"
+                                    % process.exitcode)
+    return ParallelResults(queues, ordered, stop, check)
+
+class ParallelResults(object):
+
+    """
+    Iterates over the results sent by the workers of
+    ``parallelMap()``; ``close()`` (or dropping the iterator) stops
+    them.  An exception raised by a worker is raised by ``next()``.
+    """
+
+    def __init__(self, queues, ordered, stop, check=None):
+        self._queues = queues
+        self._ordered = ordered
+        self._stop = stop
+        self._check = check
+        self._pending = deque()
+        self._done = 0
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while not self._pending:
+            if self._closed or self._done == len(self._queues):
+                self.close()
+                raise StopIteration
+            if self._ordered:
+                queue = self._queues[self._done]
+            else:
+                queue = self._queues[0]
+            index, kind, payload = self._get(queue)
+            if kind == 'rows':
+                self._pending.extend(payload)
+            elif kind == 'done':
+                self._done += 1
+            else:
+                self.close()
+                if isinstance(payload, tuple):
+                    raise payload[0], payload[1], payload[2]
+                raise payload
+        return self._pending.popleft()
+
+    def _get(self, queue):
+        if self._check is None:
+            return queue.get()
+        while True:
+            try:
+                return queue.get(True, 1.0)
+            except Queue.Empty:
+                self._check()
+
+    def close(self):
+        """
+        Stops the workers; the results not read yet are lost.
+        """
+        if not self._closed:
+            self._closed = True
+            self._pending.clear()
+            self._stop(self._done == len(self._queues))
+
+    def __del__(self):
+        self.close()
@@ -1,3 +1,4 @@
+from itertools import count
 from sqlobject.dbconnection import DBAPI
 import re
 from sqlobject import col
@@ -5,6 +6,8 @@ from sqlobject import sqlbuilder
 from sqlobject.converters import registerConverter
 from sqlobject.dberrors import *
 
+_streamCursorCount = count()
+
 class ErrorMessage(str):
     def __new__(cls, e):
         obj = str.__new__(cls, str(e))
@@ -19,6 +22,12 @@ class ErrorMessage(str):
 class PostgresConnection(DBAPI):
 
     supportTransactions = True
+    insertReturning = True
+    updateReturning = True
+    deleteReturning = True
+    # Named cursors (psycopg2) read their portal while other cursors
+    # run statements; the other drivers fetch all rows at execute()
+    streamInterleaves = True
     dbName = 'postgres'
     schemes = [dbName, 'postgresql']
 
@@ -156,11 +165,13 @@ class PostgresConnection(DBAPI):
             self._executeRetry(conn, c, "SET client_encoding TO '%s'" % dbEncoding)
         return conn
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
         try:
-            return cursor.execute(query)
+            if params is None:
+                return cursor.execute(query)
+            return cursor.execute(query, params)
         except self.module.OperationalError, e:
             raise OperationalError(ErrorMessage(e))
         except self.module.IntegrityError, e:
@@ -210,6 +221,44 @@ class PostgresConnection(DBAPI):
             self.printDebug(conn, id, 'QueryIns', 'result')
         return id
 
+    def _streamCursor(self, conn, hold=True):
+        if self.module.__name__ != 'psycopg2':
+            return conn.cursor()
+        # A named cursor keeps the result set on the server
+        name = 'sqlobject_stream_%i' % _streamCursorCount.next()
+        if hold and self.autoCommit:
+            # Outside a transaction the cursor must be WITH HOLD
+            return conn.cursor(name, withhold=True)
+        return conn.cursor(name)
+
+    def _queryInsertReturning(self, conn, soInstance, id, names, values,
+                              returnNames):
+        table = soInstance.sqlmeta.table
+        idName = soInstance.sqlmeta.idName
+        c = conn.cursor()
+        if id is not None:
+            names = [idName] + names
+            values = [id] + values
+        if names and values:
+            q = self._insertSQL(table, names, values)
+        else:
+            q = "INSERT INTO %s DEFAULT VALUES" % table
+        q += " RETURNING " + ", ".join([idName] + returnNames)
+        if self.debug:
+            self.printDebug(conn, q, 'QueryIns')
+        self._executeRetry(conn, c, q)
+        row = c.fetchone()
+        if self.debugOutput:
+            self.printDebug(conn, row, 'QueryIns', 'result')
+        return row
+
+    def _insertManySQL(self, soClass, names, rows):
+        return DBAPI._insertManySQL(self, soClass, names, rows) + \
+            " RETURNING " + soClass.sqlmeta.idName
+
+    def _insertedIDs(self, soClass, cursor, count):
+        return [row[0] for row in cursor.fetchall()]
+
     @classmethod
     def _queryAddLimitOffset(cls, query, start, end):
         if not start:
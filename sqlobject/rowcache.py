@@ -0,0 +1,258 @@
+"""
+Second-level row cache.
+
+Below the instance cache of each connection (``CacheSet``), which is
+private to a process, a connection can keep the rows it fetches by id
+in a ``RowCache``, keyed by table and id.  Other connections using
+the same backend -- typically the other worker processes on a host --
+then create the instances from the cached rows without a ``SELECT``.
+
+The cache is used when an instance is fetched by id (``.get()`` on a
+cache miss); rows read inside a transaction are never stored.  A row
+is removed when it is updated or deleted through ``_SO_update()`` or
+``_SO_delete()``; set-based updates and deletes (``deleteMany()``,
+``SelectResults.update()``, cascades...) empty the cache for the
+table.  Changes made inside a transaction are removed again on commit.
+Changes made behind SQLObject's back are not seen, so don't cache
+tables other programs write to (``sqlmeta.rowCache = False``).
+
+Each table has a version, changed by every deletion from the table:
+a row is stored only if the version read before its ``SELECT`` is
+still current, so a row read while another connection changes it
+cannot overwrite the invalidation.
+
+A backend only has to implement ``get()``, ``set()``, ``delete()``,
+``clear()`` and ``version()``; ``MemoryRowCache`` (private to the process, mostly a
+stand-in for tests) and ``SQLiteRowCache`` (a file shared by the
+processes of a host) are provided.  Set one with the ``rowCache``
+connection parameter -- a backend, ``'memory'`` or a file name.
+"""
+
+import base64
+import os
+import threading
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+class RowCache(object):
+
+    """
+    The interface of row cache backends.  Rows are tuples of the
+    values returned by the database driver, stored together with the
+    names of the columns they were selected for.
+    """
+
+    def __init__(self):
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def get(self, table, id):
+        """
+        Returns the ``(columnNames, row)`` stored for the id, or None.
+        """
+        raise NotImplementedError
+
+    def version(self, table):
+        """
+        Returns the version of ``table``, which changes whenever rows
+        of the table are deleted or cleared.
+        """
+        raise NotImplementedError
+
+    def set(self, table, id, columnNames, row, version=None):
+        """
+        Stores the row, unless ``version`` is given and is no longer
+        the version of the table.
+        """
+        raise NotImplementedError
+
+    def delete(self, table, ids):
+        raise NotImplementedError
+
+    def clear(self, table=None):
+        """
+        Removes the rows of ``table``, or all the rows.
+        """
+        raise NotImplementedError
+
+class MemoryRowCache(RowCache):
+
+    """
+    Keeps the rows in a dictionary.  Only the connections of this
+    process see them; when ``maxSize`` rows are stored, arbitrary ones
+    are dropped.
+    """
+
+    def __init__(self, maxSize=10000):
+        RowCache.__init__(self)
+        self.maxSize = maxSize
+        self._rows = {}
+        # Versions of the tables, and of all of them (for clear())
+        self._versions = {}
+        self._allVersion = 0
+        self._lock = threading.Lock()
+
+    def get(self, table, id):
+        return self._rows.get((table, id))
+
+    def version(self, table):
+        return self._allVersion + self._versions.get(table, 0)
+
+    def set(self, table, id, columnNames, row, version=None):
+        self._lock.acquire()
+        try:
+            if version is not None and version != self.version(table):
+                return
+            while len(self._rows) >= self.maxSize:
+                self._rows.popitem()
+            self._rows[(table, id)] = (columnNames, row)
+        finally:
+            self._lock.release()
+
+    def delete(self, table, ids):
+        self._lock.acquire()
+        try:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            for id in ids:
+                self._rows.pop((table, id), None)
+        finally:
+            self._lock.release()
+
+    def clear(self, table=None):
+        self._lock.acquire()
+        try:
+            if table is None:
+                self._allVersion += 1
+                self._rows.clear()
+            else:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in self._rows.keys():
+                    if key[0] == table:
+                        del self._rows[key]
+        finally:
+            self._lock.release()
+
+class SQLiteRowCache(RowCache):
+
+    """
+    Keeps the rows, pickled, in an SQLite database file that all the
+    processes on the host can share.  Each thread (and each process
+    after a fork) opens its own connection to it.  The pickles are
+    stored base64-encoded, out of the way of the adapters other code
+    (like SQLiteConnection) registers for buffers.
+
+    Reads and writes that fail (e.g. the file is locked for longer
+    than ``timeout`` seconds) are ignored, but failed deletions raise
+    an exception, because they would leave stale rows behind.
+    """
+
+    def __init__(self, filename, timeout=5.0):
+        RowCache.__init__(self)
+        try:
+            import sqlite3 as sqlite
+        except ImportError:
+            from pysqlite2 import dbapi2 as sqlite
+        self.module = sqlite
+        self.filename = filename
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS sqlobject_row_cache ("
+                     "tbl TEXT, id TEXT, row TEXT, PRIMARY KEY (tbl, id))")
+        # The version of all the tables is the one of the '' table
+        conn.execute("CREATE TABLE IF NOT EXISTS sqlobject_row_cache_version ("
+                     "tbl TEXT PRIMARY KEY, version INTEGER)")
+        conn.commit()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self.module.connect(self.filename,
+                                             timeout=self.timeout)
+            local.pid = os.getpid()
+        return local.conn
+
+    def get(self, table, id):
+        try:
+            result = self._connection().execute(
+                "SELECT row FROM sqlobject_row_cache WHERE tbl = ? AND id = ?",
+                (table, str(id))).fetchone()
+        except self.module.Error:
+            return None
+        if result is None:
+            return None
+        return pickle.loads(base64.b64decode(str(result[0])))
+
+    _versionQuery = ("SELECT COALESCE(SUM(version), 0) "
+                     "FROM sqlobject_row_cache_version WHERE tbl IN (?, '')")
+
+    def version(self, table):
+        try:
+            return self._connection().execute(
+                self._versionQuery, (table,)).fetchone()[0]
+        except self.module.Error:
+            return None
+
+    def set(self, table, id, columnNames, row, version=None):
+        try:
+            value = base64.b64encode(pickle.dumps((columnNames, row), 2))
+        except (pickle.PicklingError, TypeError):
+            return
+        conn = self._connection()
+        try:
+            if version is None:
+                conn.execute("INSERT OR REPLACE INTO sqlobject_row_cache "
+                             "(tbl, id, row) VALUES (?, ?, ?)",
+                             (table, str(id), value))
+            else:
+                # Checked and stored in one statement
+                conn.execute("INSERT OR REPLACE INTO sqlobject_row_cache "
+                             "(tbl, id, row) SELECT ?, ?, ? WHERE (%s) = ?"
+                             % self._versionQuery,
+                             (table, str(id), value, table, version))
+            conn.commit()
+        except self.module.Error:
+            conn.rollback()
+
+    def _newVersion(self, conn, table):
+        conn.execute("INSERT OR IGNORE INTO sqlobject_row_cache_version "
+                     "(tbl, version) VALUES (?, 0)", (table,))
+        conn.execute("UPDATE sqlobject_row_cache_version "
+                     "SET version = version + 1 WHERE tbl = ?", (table,))
+
+    def delete(self, table, ids):
+        conn = self._connection()
+        self._newVersion(conn, table)
+        conn.executemany(
+            "DELETE FROM sqlobject_row_cache WHERE tbl = ? AND id = ?",
+            [(table, str(id)) for id in ids])
+        conn.commit()
+
+    def clear(self, table=None):
+        conn = self._connection()
+        if table is None:
+            self._newVersion(conn, '')
+            conn.execute("DELETE FROM sqlobject_row_cache")
+        else:
+            self._newVersion(conn, table)
+            conn.execute("DELETE FROM sqlobject_row_cache WHERE tbl = ?",
+                         (table,))
+        conn.commit()
+
+def makeRowCache(value):
+    """
+    Returns the backend for the ``rowCache`` connection parameter.
+    """
+    if not isinstance(value, basestring):
+        return value
+    if value == 'memory':
+        return MemoryRowCache()
+    return SQLiteRowCache(value)
@@ -60,6 +60,7 @@ See the bottom of this module for some examples, and run it (i.e.
 ## Constants
 ########################################
 
+import copy
 import fnmatch
 import operator
 import re
@@ -620,8 +621,15 @@ class Select(SQLExpression):
             clause = SQLConstant('(%s)' % clause)
         return self.newClause(AND(clause, filter_clause))
 
+    # Is the SQL rendered through sqlbuilder.selectCache?
+    _cacheSQL = True
+
     def __sqlrepr__(self, db):
+        if selectCache is None or not self._cacheSQL:
+            return self._sqlrepr(db)
+        return selectCache.sqlrepr(self, db)
 
+    def _sqlrepr(self, db):
         select = "SELECT"
         if self.ops['distinct']:
             select += " DISTINCT"
@@ -1308,6 +1316,290 @@ class _Delay_proxy(object):
 ######
 
 
+########################################
+## Compiled SELECTs
+########################################
+
+class _Uncacheable(Exception):
+    pass
+
+class _Slot(object):
+    """
+    Stands for the literal value number ``index`` while a Select is
+    compiled into a template.
+    """
+
+    def __init__(self, index, paren):
+        self.index = index
+        self.paren = paren
+
+    def __sqlrepr__(self, db):
+        # SQLOp doesn't parenthesize values that start with '('
+        if self.paren:
+            return '(\x01%d\x00' % self.index
+        return '\x00%d\x00' % self.index
+
+_slotRE = re.compile('\\(\x01(\\d+)\x00|\x00(\\d+)\x00')
+
+_STRUCTURE, _LITERAL, _LITERALS = range(3)
+
+def _shapeOf(value, db, key, values):
+    """
+    Appends the shape of ``value`` (a part of a Select) to ``key``
+    and the SQL of its literal values to ``values``.
+    """
+    cls = type(value)
+    if cls in _atomClasses:
+        key.append(value)
+        return
+    if cls is types.InstanceType:
+        cls = value.__class__
+    if cls in _fieldClasses:
+        key.append(cls)
+        key.append(value.tableName)
+        key.append(value.fieldName)
+    elif cls is SQLOp:
+        # The most common node, inlined
+        key.append(cls)
+        key.append(value.op)
+        for item in (value.expr1, value.expr2):
+            if isinstance(item, SQLExpression):
+                _shapeOf(item, db, key, values)
+            elif item is None:
+                key.append(None)
+            else:
+                sql = sqlrepr(item, db)
+                key.append(sql[:1] == '(')
+                values.append(sql)
+    elif isinstance(value, SQLExpression):
+        shape = _shapes.get(cls)
+        if shape is None:
+            if cls is Select and value._cacheSQL:
+                key.append(cls)
+                ops = value.ops
+                for name in _selectOps:
+                    item = ops[name]
+                    if type(item) in _atomClasses:
+                        key.append(item)
+                    else:
+                        _shapeOf(item, db, key, values)
+                return
+            raise _Uncacheable
+        key.append(cls)
+        for attr, kind in shape:
+            item = getattr(value, attr)
+            if kind == _STRUCTURE or isinstance(item, SQLExpression):
+                _shapeOf(item, db, key, values)
+            elif kind == _LITERAL:
+                if item is None:
+                    key.append(None)
+                else:
+                    sql = sqlrepr(item, db)
+                    key.append(sql[:1] == '(')
+                    values.append(sql)
+            else:
+                key.append(len(item))
+                for item in item:
+                    if isinstance(item, SQLExpression):
+                        _shapeOf(item, db, key, values)
+                    elif item is None:
+                        key.append(None)
+                    else:
+                        sql = sqlrepr(item, db)
+                        key.append(sql[:1] == '(')
+                        values.append(sql)
+    elif cls is list or cls is tuple:
+        key.append(cls)
+        key.append(len(value))
+        for item in value:
+            if type(item) in _atomClasses:
+                key.append(item)
+            else:
+                _shapeOf(item, db, key, values)
+    elif cls is types.GeneratorType:
+        raise _Uncacheable
+    else:
+        hash(value)
+        key.append(cls)
+        key.append(value)
+
+def _template(value, db, values):
+    """
+    Returns a copy of ``value`` (a part of a Select, with the shape
+    _shapeOf() found) with the literal values replaced by _Slots.
+    """
+    if isinstance(value, SQLExpression):
+        cls = value.__class__
+        if cls is Select:
+            ops = {}
+            for name in _selectOps:
+                ops[name] = _template(value.ops[name], db, values)
+            value = copy.copy(value)
+            value.ops = ops
+            value._cacheSQL = False
+            return value
+        changes = []
+        for attr, kind in _shapes[cls]:
+            item = getattr(value, attr)
+            if kind == _STRUCTURE or isinstance(item, SQLExpression):
+                new = _template(item, db, values)
+            elif kind == _LITERAL:
+                new = _slot(item, db, values)
+            else:
+                new = type(item)([_slot(element, db, values)
+                                  for element in item])
+            if new is not item:
+                changes.append((attr, new))
+        if changes:
+            value = copy.copy(value)
+            for attr, new in changes:
+                setattr(value, attr, new)
+        return value
+    elif isinstance(value, (list, tuple)):
+        return type(value)([_template(item, db, values) for item in value])
+    return value
+
+def _slot(value, db, values):
+    if isinstance(value, SQLExpression):
+        return _template(value, db, values)
+    if value is None:
+        return value
+    values.append(None)
+    return _Slot(len(values) - 1, sqlrepr(value, db)[:1] == '(')
+
+# class -> attributes of its instances and how they are rendered.
+# Instances of other classes (or subclasses) are not compiled.
+_shapes = {}
+
+# Classes of structural values appended to the key as they are
+_atomClasses = dict.fromkeys([str, unicode, int, long, bool,
+                              types.NoneType, types.ClassType])
+_fieldClasses = dict.fromkeys([Field, SQLObjectField])
+
+_selectOps = ['items', 'clause', 'groupBy', 'having', 'orderBy', 'limit',
+              'join', 'lazyColumns', 'distinct', 'distinctOn', 'start',
+              'end', 'reversed', 'forUpdate', 'staticTables']
+
+for _cls, _shape in [
+        (SQLOp, [('op', _STRUCTURE), ('expr1', _LITERAL), ('expr2', _LITERAL)]),
+        (SQLModulo, [('expr1', _LITERAL), ('expr2', _LITERAL)]),
+        (ColumnAS, [('op', _STRUCTURE), ('expr1', _LITERAL), ('expr2', _LITERAL)]),
+        (SQLCall, [('expr', _LITERAL), ('args', _LITERALS)]),
+        (SQLPrefix, [('prefix', _STRUCTURE), ('expr', _LITERAL)]),
+        (SQLConstant, [('const', _STRUCTURE)]),
+        (SQLTrueClauseClass, []),
+        (Field, [('tableName', _STRUCTURE), ('fieldName', _STRUCTURE)]),
+        (SQLObjectField, [('tableName', _STRUCTURE), ('fieldName', _STRUCTURE)]),
+        (Table, [('tableName', _STRUCTURE)]),
+        (SQLObjectTable, [('tableName', _STRUCTURE)]),
+        (DESC, [('expr', _LITERAL)]),
+        (LIKE, [('expr', _LITERAL), ('string', _LITERAL), ('escape', _LITERAL)]),
+        (RLIKE, [('expr', _LITERAL), ('string', _LITERAL)]),
+        (INSubquery, [('item', _LITERAL), ('subquery', _STRUCTURE)]),
+        (NOTINSubquery, [('item', _LITERAL), ('subquery', _STRUCTURE)]),
+        (Subquery, [('op', _STRUCTURE), ('subquery', _STRUCTURE)]),
+        (SQLJoin, [('op', _STRUCTURE), ('table1', _STRUCTURE),
+                   ('table2', _STRUCTURE)]),
+        ]:
+    _shapes[_cls] = _shape
+for _cls in [SQLJoinConditional, SQLJoinOn, SQLJoinUsing]:
+    _shapes[_cls] = _shapes[SQLJoin] + [('on_condition', _STRUCTURE),
+                                        ('using_columns', _STRUCTURE)]
+del _cls, _shape
+
+class SelectCache(object):
+    """
+    Keeps ``Select`` statements compiled into SQL templates, keyed by
+    the shape of their expression tree (the classes of the nodes, the
+    tables, columns and operators -- everything but the literal
+    values) and the database, up to ``size`` shapes.  A Select of a
+    known shape is rendered by substituting its literal values into
+    the template.
+
+    A template is checked against the normal rendering when it is
+    made; Selects using expression classes it doesn't know (including
+    subclasses) are rendered normally.
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.templates = {}
+        self.tick = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = self.misses = self.uncached = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'uncached': self.uncached,
+                'size': len(self.templates), 'maxSize': self.size}
+
+    def clear(self):
+        self.templates.clear()
+
+    def sqlrepr(self, select, db):
+        key = [db]
+        values = []
+        try:
+            _shapeOf(select, db, key, values)
+            key = tuple(key)
+            entry = self.templates.get(key)
+        except (_Uncacheable, TypeError):
+            # TypeError: unhashable structural values
+            self.uncached += 1
+            return select._sqlrepr(db)
+        self.tick += 1
+        if entry is None:
+            self.misses += 1
+            sql = select._sqlrepr(db)
+            self._put(key, self._compile(select, db, values, sql))
+            return sql
+        template = entry[0]
+        if template is None:
+            self.uncached += 1
+            return select._sqlrepr(db)
+        self.hits += 1
+        entry[1] = self.tick
+        texts, indexes = template
+        parts = [texts[0]]
+        for i in range(len(indexes)):
+            parts.append(values[indexes[i]])
+            parts.append(texts[i + 1])
+        return ''.join(parts)
+
+    def _compile(self, select, db, values, sql):
+        """
+        Returns the template (texts between the values and the indexes
+        of the values) for the select, or None if it cannot be made.
+        """
+        clone = _template(select, db, [])
+        parts = _slotRE.split(clone._sqlrepr(db))
+        texts = parts[::3]
+        indexes = []
+        for i in range(1, len(parts), 3):
+            indexes.append(int(parts[i] or parts[i + 1]))
+        result = [texts[0]]
+        for i in range(len(indexes)):
+            if indexes[i] >= len(values):
+                return None
+            result.append(values[indexes[i]])
+            result.append(texts[i + 1])
+        if ''.join(result) != sql:
+            return None
+        return (texts, indexes)
+
+    def _put(self, key, template):
+        self.templates[key] = [template, self.tick]
+        if len(self.templates) > self.size:
+            entries = [(entry[1], key) for key, entry in self.templates.items()]
+            entries.sort()
+            for tick, key in entries[:len(entries) - self.size * 3 // 4]:
+                self.templates.pop(key, None)
+
+# Set to None to render every Select from scratch
+selectCache = SelectCache()
+
 ########################################
 ## Global initializations
 ########################################
@@ -19,6 +19,9 @@ class ErrorMessage(str):
 class SQLiteConnection(DBAPI):
 
     supportTransactions = True
+    # A cursor steps through its statement as the rows are fetched,
+    # and the connection runs other statements in between
+    streamInterleaves = True
     dbName = 'sqlite'
     schemes = [dbName]
 
@@ -50,6 +53,9 @@ class SQLiteConnection(DBAPI):
             sqlite.encode = base64.encodestring
             sqlite.decode = base64.decodestring
         self.module = sqlite
+        # Multi-row VALUES lists appeared in SQLite 3.7.11
+        self.multiRowInsert = self.using_sqlite2 and \
+            sqlite.sqlite_version_info >= (3, 7, 11)
         self.filename = filename  # full path to sqlite-db-file
         self._memory = filename == ':memory:'
         if self._memory and not self.using_sqlite2:
@@ -79,6 +85,9 @@ class SQLiteConnection(DBAPI):
                 opts['timeout'] = float(kw.pop('timeout'))
             else:
                 opts['timeout'] = int(float(kw.pop('timeout')) * 1000)
+        if 'cached_statements' in kw and self.using_sqlite2:
+            # The size of the driver's cache of prepared statements
+            opts['cached_statements'] = int(kw.pop('cached_statements'))
         if 'check_same_thread' in kw:
             opts["check_same_thread"] = Boolean(kw.pop('check_same_thread'))
         # use only one connection for sqlite - supports multiple)
@@ -195,11 +204,13 @@ class SQLiteConnection(DBAPI):
         DBAPI.close(self)
         self._threadPool = {}
 
-    def _executeRetry(self, conn, cursor, query):
+    def _executeRetry(self, conn, cursor, query, params=None):
         if self.debug:
             self.printDebug(conn, query, 'QueryR')
         try:
-            return cursor.execute(query)
+            if params is None:
+                return cursor.execute(query)
+            return cursor.execute(query, params)
         except self.module.OperationalError, e:
             raise OperationalError(ErrorMessage(e))
         except self.module.IntegrityError, e:
@@ -243,6 +254,11 @@ class SQLiteConnection(DBAPI):
             self.printDebug(conn, id, 'QueryIns', 'result')
         return id
 
+    def _insertedIDs(self, soClass, cursor, count):
+        # lastrowid is the id of the last row of the VALUES list
+        lastID = int(cursor.lastrowid)
+        return range(lastID - count + 1, lastID + 1)
+
     def _insertSQL(self, table, names, values):
         if not names:
             assert not values
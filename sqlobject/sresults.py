@@ -1,10 +1,73 @@
+import cascade
 import dbconnection
 import joins
 import main
+import parallel
 import sqlbuilder
 
 __all__ = ['SelectResults']
 
+def _chunks(items, size):
+    return [items[start:start+size] for start in range(0, len(items), size)]
+
+_rowClasses = {}
+
+class _Row(object):
+
+    """
+    The base of the record classes of ``makeRowClass()``; a record
+    equals the records and tuples with the same values.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __iter__(self):
+        return iter([getattr(self, field) for field in self._fields])
+
+    def __eq__(self, other):
+        if not isinstance(other, (_Row, tuple)) \
+               or len(tuple(other)) != len(self._fields):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            ['%s=%r' % (field, getattr(self, field)) for field in self._fields]))
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+def makeRowClass(name, fields):
+    """
+    Returns a class for records with the attributes ``fields``; it
+    uses ``__slots__`` and compares, hashes and iterates like a tuple.
+    The classes are made once per name and fields.
+    """
+    fields = tuple(fields)
+    rowClass = _rowClasses.get((name, fields))
+    if rowClass is not None:
+        return rowClass
+    namespace = {}
+    source = 'def __init__(self, %s):\n' % ', '.join(fields)
+    for field in fields:
+        source += '    self.%s = %s\n' % (field, field)
+    exec source in namespace
+    rowClass = type(name, (_Row,), {
+        '__slots__': fields, '_fields': fields,
+        '__init__': namespace['__init__']})
+    _rowClasses[(name, fields)] = rowClass
+    return rowClass
+
 class SelectResults(object):
     IterationClass = dbconnection.Iteration
 
@@ -112,6 +175,83 @@ class SelectResults(object):
     def distinct(self):
         return self.clone(distinct=True)
 
+    def prefetch(self, *attributes):
+        """
+        Returns a copy of these results that loads the objects
+        referenced by the given ForeignKey attributes while iterating:
+        for each batch of rows there is one ``IN (...)`` query per
+        attribute, instead of one query per row when the attribute is
+        accessed.  MultipleJoin and RelatedJoin names are preloaded
+        the same way (see ``SQLObject.preloadJoins()``).  Attributes can
+        be chained with dots, like ``'author.company'``.
+        """
+        for attribute in attributes:
+            self._prefetchPath(attribute)
+        return self.clone(prefetch=self.ops.get('prefetch', ()) + attributes)
+
+    def _prefetchPath(self, attribute):
+        """
+        Returns a list of ``(column, join, otherClass)`` for the dotted
+        ``attribute``; one of column and join is None.
+        """
+        path = []
+        soClass = self.sourceClass
+        for name in attribute.split('.'):
+            columns = soClass.sqlmeta.getColumns()
+            column = columns.get(name)
+            if column is None or not column.foreignKey:
+                column = columns.get(name + 'ID')
+            if column is not None and column.foreignKey:
+                if column.refColumn:
+                    raise ValueError("Cannot prefetch %s, it does not refer to the id of %s" % (attribute, column.foreignKey))
+                soClass = getattr(soClass, '_SO_class_' + column.foreignKey)
+                path.append((column, None, soClass))
+                continue
+            for join in soClass.sqlmeta.joins:
+                if join is not None and join.joinMethodName == name:
+                    break
+            else:
+                raise AttributeError("prefetch argument (got %s) should be a foreignKey or a join of %s" % (attribute, soClass))
+            if not join.preloadable:
+                raise ValueError("Cannot prefetch %s, %s joins cannot be preloaded" % (attribute, join.__class__.__name__))
+            soClass = join.otherClass
+            path.append((None, join, soClass))
+        return path
+
+    def _prefetch(self, objects):
+        """
+        Loads the objects referenced from ``objects`` by the
+        attributes given to ``.prefetch()``, with one query per
+        attribute.  Returns the loaded objects.
+        """
+        loaded = []
+        for attribute in self.ops.get('prefetch', ()):
+            level = [obj for obj in objects if obj is not None]
+            for column, join, otherClass in self._prefetchPath(attribute):
+                if not level:
+                    break
+                if join is not None:
+                    join.preload(level)
+                    level = [obj for inst in level
+                             for obj in inst._SO_joinCache[join.joinMethodName]]
+                    loaded.extend(level)
+                    continue
+                ids = {}
+                for obj in level:
+                    value = getattr(obj, column.name)
+                    if value is not None:
+                        ids[value] = None
+                if level[0].sqlmeta._perConnection:
+                    connection = level[0]._connection
+                else:
+                    connection = None
+                level = [obj for obj in
+                         otherClass.getMany(ids.keys(), connection=connection,
+                                            default=None)
+                         if obj is not None]
+                loaded.extend(level)
+        return loaded
+
     def newClause(self, new_clause):
         return self.__class__(self.sourceClass, new_clause,
                               self.clauseTables, **self.ops)
@@ -180,6 +320,15 @@ class SelectResults(object):
         # etc., like we do with .lazyIter()
         return iter(list(self.lazyIter()))
 
+    def cached(self, ttl=True):
+        """
+        Returns a copy of the results whose rows, ``count()`` and other
+        accumulated values are kept in the connection's result cache
+        (for ``ttl`` seconds, or the connection's ``resultCacheTTL``)
+        until one of the tables read by the query is changed.
+        """
+        return self.clone(cached=ttl)
+
     def lazyIter(self):
         """
         Returns an iterator that will lazily pull rows out of the
@@ -188,6 +337,221 @@ class SelectResults(object):
         conn = self._getConnection()
         return conn.iterSelect(self)
 
+    def stream(self, batchSize=1000, cache=True):
+        """
+        Returns an iterator over the results that reads ``batchSize``
+        rows at a time through a server-side cursor (a named cursor on
+        Postgres, ``SSCursor`` on MySQL), so memory use doesn't grow
+        with the size of the result set.  With ``cache=False`` the
+        instances are neither looked up in nor stored in the cache.
+        """
+        conn = self._getConnection()
+        return conn.streamSelect(self, batchSize, cache=cache)
+
+    def parallelMap(self, func, workers=4, partitionBy=None, mode='thread',
+                    ordered=True, batchSize=100):
+        """
+        Returns an iterator over ``func(instance)`` for the rows,
+        computed by ``workers`` threads (or processes, with
+        ``mode='process'``), each scanning a range of the numeric
+        column ``partitionBy`` (by default the id) between its minimum
+        and maximum.  The results come back ``batchSize`` at a time,
+        range after range, or as soon as they are ready with
+        ``ordered=False``.  See ``sqlobject.parallel``.
+        """
+        return parallel.parallelMap(self, func, workers, partitionBy, mode,
+                                    ordered, batchSize)
+
+    def values(self, *columns):
+        """
+        Returns a list of tuples with the values of ``columns`` (names
+        of columns or ``'id'``; by default the id and all the columns)
+        for each row, converted by the columns' validators.  No
+        instances are created, and the cache is not used.
+        """
+        return self._values(columns)[1]
+
+    def namedtuples(self, *columns):
+        """
+        Like ``values()``, but returns compact records (with
+        ``__slots__``) whose attributes are the column names.
+        """
+        names, rows = self._values(columns)
+        rowClass = makeRowClass(self.sourceClass.__name__ + 'Row', names)
+        return [rowClass(*row) for row in rows]
+
+    def _values(self, columns):
+        soClass = self.sourceClass
+        if not columns:
+            columns = ['id'] + [col.name for col in soClass.sqlmeta.columnList]
+        items = []
+        converters = []
+        for name in columns:
+            if name == 'id':
+                items.append(soClass.q.id)
+                converters.append(None)
+                continue
+            column = soClass.sqlmeta.columns.get(name)
+            if column is None:
+                raise AttributeError("%s has no column %r" % (soClass.__name__, name))
+            items.append(getattr(soClass.q, name))
+            converters.append(column.to_python)
+        conn = self._getConnection()
+        query = self.queryForSelect().newItems(items).lazyColumns(False)
+        rows = conn.queryAll(conn.sqlrepr(query))
+        # Apply the converters in one tight loop, column by column
+        state = sqlbuilder.SQLObjectState(soClass, connection=conn)
+        convert = [(i, to_python) for i, to_python in enumerate(converters)
+                   if to_python]
+        if convert:
+            converted = []
+            for row in rows:
+                row = list(row)
+                for i, to_python in convert:
+                    row[i] = to_python(row[i], state)
+                converted.append(tuple(row))
+            rows = converted
+        else:
+            rows = [tuple(row) for row in rows]
+        return list(columns), rows
+
+    def update(self, **values):
+        """
+        Sets ``values`` (keyword arguments like ``set()`` gets) on all
+        the rows with one ``UPDATE``; the validators are applied once.
+        The cached instances of the changed rows get the new values.
+        No RowUpdateSignal or RowUpdatedSignal is sent.
+        """
+        cls = self.sourceClass
+        if cls._inheritable:
+            raise TypeError("%s.select().update() does not support inheritable classes" % cls.__name__)
+        conn = self._getConnection()
+        state = sqlbuilder.SQLObjectState(cls, connection=conn)
+        dbValues = {}
+        newValues = []
+        for name, value in values.items():
+            column = cls.sqlmeta.columns.get(name)
+            if column is None:
+                for column in cls.sqlmeta.columnList:
+                    if column.foreignName == name:
+                        break
+                else:
+                    raise TypeError, "%s.select().update() got an unexpected column %s" % (cls.__name__, name)
+                value = main.getID(value, column.refColumn)
+            from_python = getattr(cls, '_SO_from_python_%s' % column.name, None)
+            if from_python:
+                value = from_python(value, state)
+            dbValues[column.dbName] = value
+            to_python = getattr(cls, '_SO_to_python_%s' % column.name, None)
+            if to_python:
+                value = to_python(value, state)
+            newValues.append((main.instanceName(column.name), value))
+        if not dbValues:
+            return
+        def statement(where):
+            return sqlbuilder.Update(cls.sqlmeta.table, dbValues, where=where)
+        for inst in self._writeRows(conn, statement, conn.updateReturning):
+            if inst.sqlmeta.expired or not inst.sqlmeta.cacheValues:
+                continue
+            for attr, value in newValues:
+                setattr(inst, attr, value)
+
+    def delete(self):
+        """
+        Deletes all the rows with one ``DELETE``; the cached instances
+        of the rows become obsolete.  Rows depending on them through
+        ForeignKeys with ``cascade`` are deleted or updated with
+        set-based statements too, as ``sqlmeta.cascadeMode`` allows;
+        when the dependent rows have to be deleted one by one, every
+        row is destroyed with ``destroySelf()``.  Otherwise no row
+        signals are sent for the rows selected.
+        """
+        cls = self.sourceClass
+        if cls._inheritable:
+            raise TypeError("%s.select().delete() does not support inheritable classes" % cls.__name__)
+        conn = self._getConnection()
+        plan = cascade.getPlan(cls)
+        if plan.steps or plan.joinTables:
+            strategy = cascade.getStrategy(cls)
+            if strategy == 'rows':
+                for inst in list(self):
+                    inst.destroySelf()
+                return
+            clause = self._writeClause()
+            if clause is None:
+                clauses = [sqlbuilder.IN(cls.q.id, chunk)
+                           for chunk in _chunks(self._ids(), conn.maxInListSize)]
+            else:
+                clauses = [clause]
+            cascade.deleteRows(cls, clauses, conn, '%s rows' % cls.__name__,
+                               strategy == 'batches')
+            return
+        def statement(where):
+            return sqlbuilder.Delete(cls.sqlmeta.table, where=where)
+        for inst in self._writeRows(conn, statement, conn.deleteReturning):
+            inst.sqlmeta._obsolete = True
+            conn.cache.expire(inst.id, cls)
+
+    def _writeClause(self):
+        """
+        Returns the clause that picks the rows in an UPDATE or DELETE
+        of the class' table, or None when they have to be picked by id
+        (joins, other tables, slices or DISTINCT).
+        """
+        ops = self.ops
+        if ops.get('join', sqlbuilder.NoDefault) not in (None, sqlbuilder.NoDefault) \
+               or ops.get('start') or ops.get('end') is not None \
+               or ops.get('distinct') or self.clauseTables:
+            return None
+        for table in self.tables:
+            if table != self.sourceClass.sqlmeta.table:
+                return None
+        return self.clause
+
+    def _ids(self):
+        return [row[0] for row in self._values(['id'])[1]]
+
+    def _writeRows(self, conn, statement, returning):
+        """
+        Runs the UPDATE or DELETE ``statement(where)`` on the rows and
+        returns the cached instances of the rows it changed, which are
+        found by a SELECT before it (or with RETURNING) only if the
+        cache holds instances of the class at all.
+        """
+        cls = self.sourceClass
+        caches = [conn.cache]
+        if isinstance(conn, dbconnection.Transaction):
+            caches.append(conn._dbConnection.cache)
+        cached = []
+        for cache in caches:
+            cached.extend(cache.allIDs(cls))
+        clause = self._writeClause()
+        if clause is None:
+            ids = self._ids()
+            for chunk in _chunks(ids, conn.maxInListSize):
+                conn.query(conn.sqlrepr(statement(sqlbuilder.IN(cls.q.id, chunk))))
+        elif not cached:
+            ids = []
+            conn.query(conn.sqlrepr(statement(clause)))
+        elif returning:
+            ids = [row[0] for row in conn.queryAll("%s RETURNING %s" % (
+                conn.sqlrepr(statement(clause)), cls.sqlmeta.idName))]
+        else:
+            ids = []
+            for chunk in _chunks(cached, conn.maxInListSize):
+                ids.extend(self.filter(sqlbuilder.IN(cls.q.id, chunk))._ids())
+            conn.query(conn.sqlrepr(statement(clause)))
+        conn._forgetTable(cls.sqlmeta.table, rowsTracked=True)
+        if len(caches) > 1:
+            # The parent connection's instances are expired on commit
+            conn._deletedCache.setdefault(cls.__name__, []).extend(ids)
+        instances = []
+        for id in ids:
+            inst = conn.cache.tryGet(id, cls)
+            if inst is not None:
+                instances.append(inst)
+        return instances
+
     def accumulate(self, *expressions):
         """ Use accumulate expression(s) to select result
             using another SQL select through current
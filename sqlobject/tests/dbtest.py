@@ -50,7 +50,7 @@ supportsMatrix = {
     }
 
 
-def setupClass(soClasses, force=False):
+def setupClass(soClasses, force=False, connection=None):
     """
     Makes sure the classes have a corresponding and correct table.
     This won't recreate the table if it already exists.  It will check
@@ -64,12 +64,14 @@ def setupClass(soClasses, force=False):
     until after A is destroyed or cleared.
 
     If force is true, then the database will be recreated no matter
-    what.
+    what.  The tables are made in the database of ``connection``, by
+    default the test database.
     """
     global hub
     if not isinstance(soClasses, (list, tuple)):
         soClasses = [soClasses]
-    connection = getConnection()
+    if connection is None:
+        connection = getConnection()
     for soClass in soClasses:
         ## This would be an alternate way to register connections...
         #try:
@@ -97,6 +99,19 @@ def getConnection(**kw):
         conn.debugOutput = True
     return conn
 
+sharedDBFilename = os.path.join(getcwd(), 'dbs_shared.tmp')
+
+def getSharedConnection():
+    """
+    Returns the test connection, or a connection to an SQLite file if
+    the test database is an in-memory SQLite one, which other threads
+    and processes cannot share.
+    """
+    conn = getConnection()
+    if getattr(conn, '_memory', False):
+        conn = sqlobject.connectionForURI('sqlite:///' + sharedDBFilename)
+    return conn
+
 def getConnectionURI():
     name = conftest.option.Database
     if name in conftest.connectionShortcuts:
@@ -324,6 +339,7 @@ def setupLogging():
     logger = logging.getLogger()
     logger.addHandler(hdlr)
 
-__all__ = ['getConnection', 'getConnectionURI', 'setupClass', 'Dummy', 'raises',
+__all__ = ['getConnection', 'getConnectionURI', 'getSharedConnection',
+           'setupClass', 'Dummy', 'raises',
            'd', 'inserts', 'supports', 'deprecated_module',
            'setup_module', 'teardown_module', 'setupLogging']
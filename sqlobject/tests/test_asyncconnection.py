@@ -0,0 +1,165 @@
+import logging
+import threading
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.asyncconnection import AsyncConnection, Future, TimeoutError, \
+     _WorkerPool
+
+########################################
+## Running the work on a connection in worker threads
+########################################
+
+class AsyncRow(SQLObject):
+    name = StringCol(length=20)
+    number = IntCol(default=0)
+
+def makeConnection(workers=2):
+    # The workers need a database they can share
+    setupClass(AsyncRow, connection=getSharedConnection())
+    for i in range(10):
+        AsyncRow(name='row%d' % i, number=i)
+    return AsyncConnection(AsyncRow._connection, workers=workers)
+
+class LogRecords(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def test_future():
+    future = Future()
+    assert not future.done()
+    raises(TimeoutError, future.result, 0)
+    done = []
+    future.addDoneCallback(done.append)
+    future._set(5)
+    assert future.done()
+    assert future.result() == 5
+    assert future.exception() is None
+    assert done == [future]
+    try:
+        raise ValueError('failed')
+    except ValueError:
+        import sys
+        failed = Future()
+        failed._set(excInfo=sys.exc_info())
+    raises(ValueError, failed.result)
+    assert isinstance(failed.exception(), ValueError)
+
+def test_failing_callback():
+    logger = logging.getLogger('sqlobject.asyncconnection')
+    handler = LogRecords()
+    logger.addHandler(handler)
+    pool = _WorkerPool(1)
+    try:
+        def fail(future):
+            raise ValueError('callback')
+        done = []
+        future = pool.submit(threading.Event().wait, 0.05)
+        future.addDoneCallback(fail)
+        future.addDoneCallback(done.append)
+        future.result(10)
+        # The other callbacks are called, the worker goes on
+        assert pool.submit(lambda: 7).result(10) == 7
+        assert done == [future]
+        assert handler.records
+        future.addDoneCallback(fail)
+    finally:
+        pool.close()
+        logger.removeHandler(handler)
+
+def test_pool():
+    pool = _WorkerPool(2)
+    try:
+        release = threading.Event()
+        futures = [pool.submit(release.wait, 10) for i in range(4)]
+        assert len(pool.threads) == 2
+        release.set()
+        for future in futures:
+            future.result(10)
+        assert pool.submit(lambda x: x * 2, 21).result(10) == 42
+        assert len(pool.threads) == 2
+    finally:
+        pool.close()
+    raises(RuntimeError, pool.submit, len, ())
+    for thread in pool.threads:
+        assert not thread.isAlive()
+
+def test_queries():
+    aconn = makeConnection()
+    try:
+        first = AsyncRow.select(orderBy='number')[0]
+        futures = [aconn.get(AsyncRow, first.id),
+                   aconn.count(AsyncRow.select(AsyncRow.q.number < 5)),
+                   aconn.list(AsyncRow.select(orderBy='number')),
+                   aconn.getOne(AsyncRow.selectBy(name='none'), None)]
+        assert futures[0].result() is first
+        assert futures[1].result() == 5
+        assert [row.number for row in futures[2].result()] == range(10)
+        assert futures[3].result() is None
+        missing = aconn.get(AsyncRow, -1)
+        raises(SQLObjectNotFound, missing.result)
+        assert isinstance(missing.exception(), SQLObjectNotFound)
+    finally:
+        aconn.close()
+
+def test_callbacks():
+    aconn = makeConnection()
+    try:
+        event = threading.Event()
+        done = []
+        release = threading.Event()
+        future = aconn.call(release.wait)
+        raises(TimeoutError, future.result, 0.01)
+        future.addDoneCallback(lambda future: done.append(future))
+        future.addDoneCallback(lambda future: event.set())
+        release.set()
+        event.wait(10)
+        assert done == [future]
+        # Called at once when done
+        future.addDoneCallback(lambda future: done.append(future))
+        assert len(done) == 2
+    finally:
+        aconn.close()
+
+def test_batches():
+    aconn = makeConnection(workers=1)
+    try:
+        reader = aconn.batches(AsyncRow.select(orderBy='number'),
+                               batchSize=4)
+        numbers = []
+        while True:
+            batch = reader.next().result()
+            if not batch:
+                break
+            numbers.append([row.number for row in batch])
+        assert numbers == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        assert reader.next().result() == []
+        # Stopped before the end, the worker is free again
+        reader = aconn.batches(AsyncRow.select(), batchSize=2)
+        assert len(reader.next().result()) == 2
+        reader.close()
+        future = aconn.count(AsyncRow.select())
+        assert future.result(10) == 10
+    finally:
+        aconn.close()
+
+def test_transaction():
+    if not supports('transactions'):
+        return
+    aconn = makeConnection()
+    try:
+        def add(trans, name):
+            return AsyncRow(name=name, connection=trans).id
+        id = aconn.transaction(add, 'added').result()
+        assert AsyncRow.get(id).name == 'added'
+        def fail(trans):
+            AsyncRow(name='failed', connection=trans)
+            raise ValueError()
+        raises(ValueError, aconn.transaction(fail).result)
+        assert AsyncRow.selectBy(name='failed').count() == 0
+    finally:
+        aconn.close()
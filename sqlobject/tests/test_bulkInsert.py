@@ -0,0 +1,81 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class BulkOwner(SQLObject):
+    name = StringCol(length=50)
+
+class BulkItem(SQLObject):
+    name = StringCol(length=50)
+    value = IntCol(default=42)
+    flag = BoolCol(default=False)
+    owner = ForeignKey('BulkOwner', default=None)
+
+_serials = []
+
+def nextSerial():
+    _serials.append(len(_serials))
+    return _serials[-1]
+
+class BulkSerial(SQLObject):
+    name = StringCol(length=50)
+    serial = IntCol(default=nextSerial)
+
+def setup():
+    setupClass([BulkOwner, BulkItem])
+
+def test_bulkInsert():
+    setup()
+    rows = [{'name': 'item%d' % i, 'value': i} for i in range(10)]
+    ids = BulkItem.bulkInsert(rows, batchSize=4)
+    assert len(ids) == 10
+    items = BulkItem.getMany(ids)
+    assert [item.name for item in items] == ['item%d' % i for i in range(10)]
+    assert [item.value for item in items] == range(10)
+    assert BulkItem.select().count() == 10
+
+def test_bulkInsert_defaults():
+    setup()
+    owner = BulkOwner(name='owner')
+    items = BulkItem.bulkInsert([{'name': 'a', 'owner': owner},
+                                 {'name': 'b', 'flag': True},
+                                 {'name': 'c', 'ownerID': owner.id}],
+                                returnObjects=True)
+    assert [item.name for item in items] == ['a', 'b', 'c']
+    assert [item.value for item in items] == [42, 42, 42]
+    assert [item.flag for item in items] == [False, True, False]
+    assert [item.owner for item in items] == [owner, None, owner]
+
+def test_bulkInsert_ids():
+    setup()
+    ids = BulkItem.bulkInsert([{'id': 100, 'name': 'a'},
+                               {'id': 101, 'name': 'b'}])
+    assert ids == [100, 101]
+    assert BulkItem.get(101).name == 'b'
+
+def test_bulkInsert_errors():
+    setup()
+    raises(TypeError, BulkItem.bulkInsert, [{'value': 1}])
+    raises(TypeError, BulkItem.bulkInsert, [{'name': 'a', 'color': 'red'}])
+    assert BulkItem.bulkInsert([]) == []
+
+def test_bulkInsert_rowByRow():
+    setup()
+    conn = BulkItem._connection
+    multiRowInsert = conn.multiRowInsert
+    conn.multiRowInsert = False
+    try:
+        ids = BulkItem.bulkInsert([{'name': 'a'}, {'id': 200, 'name': 'b'}])
+    finally:
+        conn.multiRowInsert = multiRowInsert
+    assert ids[1] == 200
+    assert [item.name for item in BulkItem.getMany(ids)] == ['a', 'b']
+
+def test_bulkInsert_callableDefault():
+    setupClass(BulkSerial)
+    items = BulkSerial.bulkInsert([{'name': 'a'}, {'name': 'b'},
+                                   {'name': 'c', 'serial': -1}],
+                                  returnObjects=True)
+    serials = [item.serial for item in items]
+    # Called for each row that does not set the column
+    assert serials[0] != serials[1]
+    assert serials[2] == -1
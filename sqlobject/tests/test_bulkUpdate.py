@@ -0,0 +1,142 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.inheritance import InheritableSQLObject
+from sqlobject import events
+
+########################################
+## SelectResults.update() and .delete()
+########################################
+
+class BulkAuthor(SQLObject):
+    name = StringCol(length=20)
+
+class BulkBook(SQLObject):
+    title = StringCol(length=20)
+    pages = IntCol(default=100)
+    inPrint = BoolCol(default=True)
+    author = ForeignKey('BulkAuthor', default=None, cascade=True)
+
+class BulkReview(SQLObject):
+    book = ForeignKey('BulkBook', cascade=True)
+
+def setup():
+    setupClass([BulkAuthor, BulkBook, BulkReview])
+    author = BulkAuthor(name='author')
+    books = [BulkBook(title='book%d' % i, pages=i * 10) for i in range(6)]
+    return author, books
+
+def test_update():
+    author, books = setup()
+    BulkBook.select(BulkBook.q.pages >= 30).update(inPrint=False, author=author)
+    assert [book.inPrint for book in books] == [True] * 3 + [False] * 3
+    assert [book.authorID for book in books] == [None] * 3 + [author.id] * 3
+    assert books[5].author is author
+    # The cached values are patched, the database changed as well
+    books[5].expire()
+    assert books[5].inPrint is False
+    assert BulkBook.select(BulkBook.q.inPrint == False).count() == 3
+    BulkBook.select().update(authorID=None)
+    assert books[3].author is None
+
+def test_update_errors():
+    setup()
+    raises(TypeError, BulkBook.select().update, nonexistent=1)
+
+def test_update_sliced():
+    author, books = setup()
+    BulkBook.select(orderBy='-pages')[:2].update(title='top')
+    assert [book.title for book in books[-2:]] == ['top', 'top']
+    assert BulkBook.selectBy(title='top').count() == 2
+    BulkBook.select(AND(BulkBook.q.authorID == BulkAuthor.q.id,
+                        BulkAuthor.q.name == 'author')).update(pages=1)
+    assert BulkBook.selectBy(pages=1).count() == 0
+
+def test_delete():
+    author, books = setup()
+    BulkBook.select(BulkBook.q.pages < 20).delete()
+    assert BulkBook.select().count() == 4
+    assert books[0].sqlmeta._obsolete
+    raises(SQLObjectNotFound, BulkBook.get, books[0].id)
+    assert not books[2].sqlmeta._obsolete
+    BulkBook.select(orderBy='pages')[:1].delete()
+    assert BulkBook.select().count() == 3
+    raises(SQLObjectNotFound, BulkBook.get, books[2].id)
+
+def test_delete_cascade():
+    author, books = setup()
+    for book in books:
+        book.author = author
+        BulkReview(book=book)
+    BulkAuthor.select().delete()
+    assert BulkBook.select().count() == 0
+    assert BulkReview.select().count() == 0
+    for book in books:
+        assert book.sqlmeta._obsolete
+
+class BulkHolder(SQLObject):
+    name = StringCol(length=20)
+
+class BulkPart(InheritableSQLObject):
+    owner = ForeignKey('BulkHolder', cascade=True)
+
+class BulkGear(BulkPart):
+    size = IntCol(default=1)
+
+def test_delete_inheritable_dependents():
+    setupClass([BulkHolder, BulkPart, BulkGear])
+    owner = BulkHolder(name='owner')
+    BulkGear(owner=owner)
+    BulkPart(owner=owner)
+    BulkHolder.select().delete()
+    assert BulkHolder.select().count() == 0
+    assert BulkPart.select().count() == 0
+    # The rows of the child class are deleted too
+    assert BulkGear.select().count() == 0
+    assert not BulkGear._connection.queryAll(
+        'SELECT id FROM %s' % BulkGear.sqlmeta.table)
+
+def test_delete_observed():
+    author, books = setup()
+    for book in books:
+        book.author = author
+    destroyed = []
+    def onDestroy(instance, post_funcs):
+        destroyed.append(instance)
+    events.listen(onDestroy, BulkBook, events.RowDestroySignal)
+    try:
+        BulkAuthor.select().delete()
+    finally:
+        events.disconnect(onDestroy, signal=events.RowDestroySignal,
+                          sender=BulkBook)
+    assert len(destroyed) == 6
+    assert BulkBook.select().count() == 0
+
+def test_delete_batches():
+    author, books = setup()
+    for book in books:
+        book.author = author
+    destroyed = []
+    def onDestroy(instance, post_funcs):
+        destroyed.append(instance)
+    events.listen(onDestroy, BulkBook, events.RowDestroySignal)
+    BulkAuthor.sqlmeta.cascadeMode = 'batches'
+    try:
+        BulkAuthor.select().delete()
+    finally:
+        del BulkAuthor.sqlmeta.cascadeMode
+        events.disconnect(onDestroy, signal=events.RowDestroySignal,
+                          sender=BulkBook)
+    assert len(destroyed) == 6
+    assert BulkBook.select().count() == 0
+
+def test_transaction():
+    author, books = setup()
+    trans = BulkBook._connection.transaction()
+    try:
+        book = BulkBook.get(books[0].id, connection=trans)
+        BulkBook.select(connection=trans).update(pages=7)
+        assert book.pages == 7
+        trans.commit()
+        assert books[0].pages == 7
+    finally:
+        trans.commit(close=True)
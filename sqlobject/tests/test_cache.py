@@ -1,6 +1,6 @@
 from sqlobject import *
 from dbtest import *
-from sqlobject.cache import CacheSet
+from sqlobject.cache import CacheSet, LRUCacheFactory
 
 class Something(object):
     pass
@@ -49,3 +49,116 @@ def test_cache_cull():
     s = CacheTest(name='test_cache_create')
     list = [CacheTest(name='test_cache_create %d' % count) for count in range(s._connection.cache.caches['CacheTest'].cullFrequency)]
     assert len(s._connection.cache.caches['CacheTest'].cache) < s._connection.cache.caches['CacheTest'].cullFrequency
+
+def test_lru_cache():
+    x = CacheSet(policy='lru', cacheSize=3)
+    objs = [Something() for i in range(5)]
+    for i, obj in enumerate(objs[:3]):
+        assert x.get(i, Something) is None
+        x.put(i, Something, obj)
+        x.finishPut(Something)
+    # Touch the oldest object, so it becomes the most recently used
+    assert x.get(0, Something) is objs[0]
+    x.created(3, Something, objs[3])
+    cache = x.caches['Something']
+    assert sorted(cache.cache.keys()) == [0, 2, 3]
+    stats = x.stats(Something)
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+    assert stats['size'] == 3
+    # The evicted object is still reachable through its weak reference
+    assert x.get(1, Something) is objs[1]
+    assert sorted(cache.cache.keys()) == [0, 1, 3]
+    x.expire(3, Something)
+    assert sorted(cache.cache.keys()) == [0, 1]
+    x.created(4, Something, objs[4])
+    assert sorted(cache.cache.keys()) == [0, 1, 4]
+
+def test_lfu_cache():
+    x = CacheSet(policy='lfu', cacheSize=2, cullFraction=2)
+    objs = [Something() for i in range(4)]
+    x.created(0, Something, objs[0])
+    for i in range(5):
+        assert x.get(0, Something) is objs[0]
+    for i in range(1, 4):
+        x.created(i, Something, objs[i])
+    cache = x.caches['Something']
+    assert 0 in cache.cache
+    assert len(cache.cache) == 2
+    assert x.stats(Something)['evictions'] == 2
+
+def test_cache_policy_errors():
+    raises(ValueError, CacheSet(policy='nonexistent').get, 1, Something)
+
+class CacheLRUTest(SQLObject):
+    class sqlmeta:
+        cachePolicy = 'lru'
+        cacheSize = 5
+    name = StringCol(length=100)
+
+def test_cache_sqlmeta_policy():
+    setupClass(CacheLRUTest)
+    objs = [CacheLRUTest(name='lru %d' % count) for count in range(10)]
+    cache = CacheLRUTest._connection.cache.caches['CacheLRUTest']
+    assert isinstance(cache, LRUCacheFactory)
+    assert cache.cacheSize == 5
+    assert len(cache.cache) == 5
+    assert sorted(cache.cache.keys()) == [obj.id for obj in objs[5:]]
+    assert CacheLRUTest.get(objs[0].id) is objs[0]
+
+def test_cache_connection_policy():
+    conn = getConnection(cachePolicy='lru', cacheSize='7')
+    assert conn.cacheSize == 7
+    assert conn.cache.get(1, Something) is None
+    conn.cache.finishPut(Something)
+    assert isinstance(conn.cache.caches['Something'], LRUCacheFactory)
+    assert conn.cache.caches['Something'].cacheSize == 7
+
+def test_single_flight():
+    import threading
+    from sqlobject.cache import CacheFactory
+    cache = CacheFactory()
+    assert cache.get(1) is None
+    results = {}
+    def load(key):
+        val = cache.get(key)
+        if val is None:
+            val = Something()
+            cache.put(key, val)
+            cache.finishPut()
+        results[key] = val
+    # Another id is not held up by the pending creation of id 1
+    other = threading.Thread(target=load, args=(2,))
+    other.start()
+    other.join(5)
+    assert not other.isAlive()
+    assert 2 in results
+    # The same id waits for the pending creation
+    waiter = threading.Thread(target=load, args=(1,))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.isAlive()
+    obj = Something()
+    cache.put(1, obj)
+    cache.finishPut()
+    waiter.join(5)
+    assert not waiter.isAlive()
+    assert results[1] is obj
+    assert cache.stats()['misses'] == 2
+
+def test_single_flight_failure():
+    import threading
+    from sqlobject.cache import CacheFactory
+    cache = CacheFactory()
+    assert cache.get(1) is None
+    results = []
+    def load():
+        results.append(cache.get(1))
+        cache.finishPut()
+    waiter = threading.Thread(target=load)
+    waiter.start()
+    # The creation fails: nothing is put, the waiter creates it itself
+    cache.finishPut()
+    waiter.join(5)
+    assert results == [None]
@@ -0,0 +1,220 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject import cascade, events
+
+########################################
+## Set-based cascading deletes
+########################################
+
+class CascadeCustomer(SQLObject):
+    name = StringCol(length=20)
+    tags = RelatedJoin('CascadeTag')
+
+class CascadeOrder(SQLObject):
+    customer = ForeignKey('CascadeCustomer', cascade=True)
+
+class CascadeNote(SQLObject):
+    customer = ForeignKey('CascadeCustomer', default=None, cascade='null')
+
+class CascadeLine(SQLObject):
+    order = ForeignKey('CascadeOrder', cascade=True)
+    quantity = IntCol(default=1)
+
+class CascadeTag(SQLObject):
+    name = StringCol(length=20)
+    customers = RelatedJoin('CascadeCustomer')
+
+def setup():
+    setupClass([CascadeCustomer, CascadeTag, CascadeOrder, CascadeNote,
+                CascadeLine])
+    alice = CascadeCustomer(name='alice')
+    bob = CascadeCustomer(name='bob')
+    tag = CascadeTag(name='vip')
+    alice.addCascadeTag(tag)
+    for i in range(3):
+        order = CascadeOrder(customer=alice)
+        for j in range(4):
+            CascadeLine(order=order)
+    order = CascadeOrder(customer=bob)
+    CascadeLine(order=order)
+    note = CascadeNote(customer=alice)
+    return alice, bob, tag, order, note
+
+def test_plan():
+    setup()
+    plan = cascade.getPlan(CascadeCustomer)
+    assert plan.setBased()
+    steps = dict([(step.soClass, step) for step in plan.steps])
+    assert len(steps) == 2
+    assert steps[CascadeOrder].delete and not steps[CascadeOrder].restrict
+    assert not steps[CascadeNote].delete
+    assert [col.name for col in steps[CascadeNote].nullColumns] == \
+           ['customerID']
+    assert len(plan.joinTables) == 1
+    assert cascade.getPlan(CascadeCustomer) is plan
+
+def test_sets():
+    alice, bob, tag, bobOrder, note = setup()
+    line = CascadeLine.select(CascadeLine.q.orderID != bobOrder.id)[0]
+    conn = CascadeCustomer._connection
+    conn.debug = True
+    conn.debugOutput = True
+    queries = []
+    old_printDebug = conn.printDebug
+    def printDebug(conn_, s, name, type='query'):
+        if name == 'Query':
+            queries.append(s)
+    conn.printDebug = printDebug
+    try:
+        alice.destroySelf()
+    finally:
+        conn.printDebug = old_printDebug
+        conn.debug = False
+        conn.debugOutput = False
+    assert len([q for q in queries
+                if q.startswith('DELETE FROM cascade_line')]) == 1
+    assert list(CascadeCustomer.select()) == [bob]
+    assert list(CascadeOrder.select()) == [bobOrder]
+    assert CascadeLine.select().count() == 1
+    assert note.customerID is None
+    assert tag.customers == []
+    raises(SQLObjectNotFound, CascadeLine.get, line.id)
+
+class Statements(object):
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, event):
+        self.statements.append(str(event.statement))
+
+def runStatements(conn, func):
+    statements = Statements()
+    conn.addQuerySink(statements)
+    try:
+        func()
+    finally:
+        conn.removeQuerySink(statements)
+    return statements.statements
+
+class CascadeLeaf(SQLObject):
+    name = StringCol(length=20)
+
+def test_leaf():
+    setupClass(CascadeLeaf)
+    leaves = [CascadeLeaf(name='leaf%d' % i) for i in range(5)]
+    statements = runStatements(CascadeLeaf._connection,
+                               leaves[0].destroySelf)
+    # No transaction and no lookup of the cached rows
+    assert len(statements) == 1
+    assert statements[0].startswith('DELETE FROM cascade_leaf')
+    assert CascadeLeaf.select().count() == 4
+
+def test_cached_lookups():
+    alice, bob, tag, bobOrder, note = setup()
+    statements = runStatements(CascadeCustomer._connection,
+                               alice.destroySelf)
+    # The customer's id is known; the ids of the cached dependent
+    # rows are selected once per table
+    assert not [s for s in statements
+                if s.startswith('SELECT') and 'cascade_customer ' in s + ' ']
+    assert len([s for s in statements
+                if s.startswith('SELECT cascade_order.id')]) == 1
+    assert len([s for s in statements
+                if s.startswith('DELETE FROM cascade_customer_cascade_tag')]) == 1
+    assert statements[-1].startswith('DELETE FROM cascade_customer ')
+
+def test_restrict():
+    setupClass([CascadeRestricted, CascadeRestrictedChild])
+    parent = CascadeRestricted()
+    child = CascadeRestrictedChild(parent=parent)
+    raises(SQLObjectIntegrityError, parent.destroySelf)
+    assert CascadeRestricted.get(parent.id) is parent
+    child.destroySelf()
+    parent.destroySelf()
+    assert CascadeRestricted.select().count() == 0
+
+class CascadeRestricted(SQLObject):
+    pass
+
+class CascadeRestrictedChild(SQLObject):
+    parent = ForeignKey('CascadeRestricted', cascade=False)
+
+class CascadeNode(SQLObject):
+    name = StringCol(length=20)
+    parent = ForeignKey('CascadeNode', default=None, cascade=True)
+
+def test_tree():
+    setupClass(CascadeNode)
+    root = CascadeNode(name='root')
+    other = CascadeNode(name='other')
+    nodes = [root]
+    for i in range(20):
+        nodes.append(CascadeNode(name='n%d' % i, parent=nodes[i // 2]))
+    # A cycle in the data must not loop forever
+    root.parent = nodes[-1]
+    root.destroySelf()
+    assert list(CascadeNode.select()) == [other]
+
+def test_batches_signals():
+    alice, bob, tag, bobOrder, note = setup()
+    destroyed = []
+    updated = []
+    def onDestroy(instance, post_funcs):
+        destroyed.append(instance)
+    def onUpdate(instance, kwargs):
+        updated.append((instance, kwargs))
+    events.listen(onDestroy, CascadeLine, events.RowDestroySignal)
+    events.listen(onUpdate, CascadeNote, events.RowUpdateSignal)
+    try:
+        CascadeCustomer.sqlmeta.cascadeMode = 'batches'
+        alice.destroySelf()
+    finally:
+        del CascadeCustomer.sqlmeta.cascadeMode
+        events.disconnect(onDestroy, signal=events.RowDestroySignal,
+                          sender=CascadeLine)
+        events.disconnect(onUpdate, signal=events.RowUpdateSignal,
+                          sender=CascadeNote)
+    assert len(destroyed) == 12
+    assert updated == [(note, {'customerID': None})]
+    assert note.customerID is None
+    assert CascadeLine.select().count() == 1
+
+def test_observed():
+    alice, bob, tag, bobOrder, note = setup()
+    destroyed = []
+    def onDestroy(instance, post_funcs):
+        destroyed.append(instance)
+    events.listen(onDestroy, CascadeLine, events.RowDestroySignal)
+    try:
+        assert cascade.getPlan(CascadeCustomer).observed()
+        # Listeners get their per-row signals
+        alice.destroySelf()
+    finally:
+        events.disconnect(onDestroy, signal=events.RowDestroySignal,
+                          sender=CascadeLine)
+    assert len(destroyed) == 12
+    assert not cascade.getPlan(CascadeCustomer).observed()
+
+def test_cache():
+    alice, bob, tag, bobOrder, note = setup()
+    orders = list(CascadeOrder.select(CascadeOrder.q.customerID == alice.id))
+    assert note.customerID == alice.id
+    alice.destroySelf()
+    assert note.customerID is None
+    for order in orders:
+        assert order.sqlmeta._obsolete
+        raises(SQLObjectNotFound, CascadeOrder.get, order.id)
+
+def test_transaction():
+    alice, bob, tag, bobOrder, note = setup()
+    conn = CascadeCustomer._connection
+    trans = conn.transaction()
+    try:
+        CascadeCustomer.get(alice.id, connection=trans).destroySelf()
+        assert CascadeOrder.select(connection=trans).count() == 1
+        trans.rollback()
+        trans.begin()
+        assert CascadeOrder.select(connection=trans).count() == 4
+    finally:
+        trans.commit(close=True)
@@ -0,0 +1,113 @@
+import pickle
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.main import _Unloaded
+
+########################################
+## Compact instance layout
+########################################
+
+class CompactTest(SQLObject):
+
+    class sqlmeta:
+        compact = True
+
+    name = StringCol(length=20)
+    number = IntCol(default=0)
+
+class CompactSubTest(CompactTest):
+    other = IntCol(default=None)
+
+def getFresh(id):
+    CompactTest._connection.cache.clear()
+    return CompactTest.get(id)
+
+def test_layout():
+    setupClass(CompactTest)
+    row = getFresh(CompactTest(name='one', number=1).id)
+    assert row.name == 'one'
+    assert row.number == 1
+    assert row.__dict__['_SO_values'] == ['one', 1]
+    for attr in ('_SO_val_name', '_SO_writeLock', '_SO_validatorState',
+                 '_SO_createValues'):
+        assert attr not in row.__dict__
+    # The sqlmeta instance keeps its attributes in slots
+    assert not hasattr(row.sqlmeta, '__dict__') or not row.sqlmeta.__dict__
+    assert row.sqlmeta.table == CompactTest.sqlmeta.table
+    assert row.sqlmeta.asDict() == {'id': row.id, 'name': 'one',
+                                    'number': 1}
+
+def test_update():
+    setupClass(CompactTest)
+    row = getFresh(CompactTest(name='one').id)
+    row.number = 2
+    row.set(name='two')
+    assert '_SO_writeLock' in row.__dict__
+    assert (row.name, row.number) == ('two', 2)
+    row = getFresh(row.id)
+    assert (row.name, row.number) == ('two', 2)
+    CompactTest.select().update(number=3)
+    assert row.number == 3
+
+def test_expire():
+    setupClass(CompactTest)
+    row = getFresh(CompactTest(name='one').id)
+    row.expire()
+    assert row.sqlmeta.expired
+    assert row.__dict__['_SO_values'] == [_Unloaded, _Unloaded]
+    CompactTest._connection.query(
+        "UPDATE %s SET number = 5" % CompactTest.sqlmeta.table)
+    assert row.number == 5
+    assert not row.sqlmeta.expired
+
+def test_lazyUpdate():
+    setupClass(CompactTest)
+    row = getFresh(CompactTest(name='one').id)
+    row.sqlmeta.lazyUpdate = True
+    row.number = 4
+    assert row.sqlmeta.dirty
+    assert row.__dict__['_SO_createValues'] == {'number': 4}
+    row.syncUpdate()
+    assert not row.sqlmeta.dirty
+    assert getFresh(row.id).number == 4
+
+def test_subclass():
+    setupClass(CompactSubTest)
+    row = CompactSubTest(name='one', other=2)
+    CompactSubTest._connection.cache.clear()
+    row = CompactSubTest.get(row.id)
+    assert (row.name, row.number, row.other) == ('one', 0, 2)
+    assert len(row.__dict__['_SO_values']) == 3
+
+def test_pickle():
+    setupClass(CompactTest)
+    row = getFresh(CompactTest(name='one', number=1).id)
+    data = pickle.dumps(row, pickle.HIGHEST_PROTOCOL)
+    CompactTest._connection.cache.clear()
+    row = pickle.loads(data)
+    assert (row.name, row.number) == ('one', 1)
+
+def test_columns():
+    setupClass(CompactTest)
+    id = CompactTest(name='one').id
+    connection = CompactTest._connection
+    for name in 'extra', 'extra2':
+        connection.query("ALTER TABLE %s ADD COLUMN %s INT"
+                         % (CompactTest.sqlmeta.table, name))
+    CompactTest.sqlmeta.addColumn(IntCol('extra', default=None))
+    try:
+        row = getFresh(id)
+        assert row.extra is None
+        row.extra = 1
+    finally:
+        CompactTest.sqlmeta.delColumn('extra')
+    assert not hasattr(row, 'extra')
+    CompactTest.sqlmeta.addColumn(IntCol('extra2', default=None))
+    try:
+        # Not at the position of the deleted column
+        assert CompactTest.sqlmeta._slots['extra2'] == 3
+        row = getFresh(id)
+        assert row.extra2 is None
+        assert row.__dict__['_SO_values'][2] is _Unloaded
+    finally:
+        CompactTest.sqlmeta.delColumn('extra2')
@@ -117,3 +117,39 @@ def test_inheritance_row_created():
     events.listen(_signal, InheritableEventTestA, events.RowCreatedSignal)
 
     InheritableEventTestC(a=1, b=2, c=3)
+
+class EventIndexTester(SQLObject):
+    name = StringCol()
+
+def test_receiver_index():
+    setupClass(EventIndexTester)
+    signal = events.RowUpdateSignal
+    assert not events.hasReceivers(signal, EventIndexTester)
+    assert events.send(signal, EventIndexTester, None, {}) == []
+    watcher = make_listen(signal, EventIndexTester)
+    assert events.hasReceivers(signal, EventIndexTester)
+    row = EventIndexTester(name='foo')
+    row.name = 'bar'
+    assert watcher.log == [(row, {'name': 'bar'})]
+    events.disconnect(watcher, signal=signal, sender=EventIndexTester)
+    assert not events.hasReceivers(signal, EventIndexTester)
+    row.name = 'baz'
+    assert len(watcher.log) == 1
+
+def test_receiver_arguments():
+    calls = []
+    def onlyInstance(instance):
+        calls.append(instance)
+    def withSender(instance, sender):
+        calls.append((instance, sender))
+    class Signal(events.Signal):
+        pass
+    events.listen(onlyInstance, EventIndexTester, Signal)
+    events.listen(withSender, EventIndexTester, Signal)
+    for i in range(2):
+        events.send(Signal, EventIndexTester, i)
+    assert calls == [0, (0, EventIndexTester), 1, (1, EventIndexTester)]
+    def conflict(sender):
+        pass
+    events.listen(conflict, EventIndexTester, Signal)
+    raises(TypeError, events.send, Signal, EventIndexTester, 1)
@@ -0,0 +1,60 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class TestGetMany(SQLObject):
+    name = StringCol(length=50)
+    value = IntCol(default=0)
+
+def setup():
+    setupClass(TestGetMany)
+    return [TestGetMany(name='name%d' % i, value=i) for i in range(10)]
+
+def test_getMany_order():
+    objs = setup()
+    ids = [objs[5].id, objs[1].id, objs[7].id, objs[1].id]
+    results = TestGetMany.getMany(ids)
+    assert [o.id for o in results] == ids
+    assert results[1] is results[3]
+    assert results[0] is objs[5]
+
+def test_getMany_uncached():
+    objs = setup()
+    ids = [o.id for o in objs]
+    values = [o.value for o in objs]
+    TestGetMany._connection.cache.clear(TestGetMany)
+    del objs
+    results = TestGetMany.getMany(ids)
+    assert [o.id for o in results] == ids
+    assert [o.value for o in results] == values
+    # The fetched instances are now in the cache
+    assert TestGetMany.get(ids[3]) is results[3]
+
+def test_getMany_chunked():
+    objs = setup()
+    ids = [o.id for o in objs]
+    TestGetMany._connection.cache.clear(TestGetMany)
+    conn = TestGetMany._connection
+    conn.maxInListSize = 3
+    try:
+        results = TestGetMany.getMany(ids)
+    finally:
+        del conn.maxInListSize
+    assert [o.name for o in results] == ['name%d' % i for i in range(10)]
+
+def test_getMany_missing():
+    objs = setup()
+    maxId = max([o.id for o in objs])
+    ids = [objs[0].id, maxId + 1, objs[2].id, maxId + 2]
+    try:
+        TestGetMany.getMany(ids)
+    except SQLObjectNotFound, e:
+        assert str(maxId + 1) in str(e)
+        assert str(maxId + 2) in str(e)
+    else:
+        assert False, "SQLObjectNotFound expected"
+    results = TestGetMany.getMany(ids, default=None)
+    assert results == [objs[0], None, objs[2], None]
+
+def test_getMany_empty():
+    setup()
+    assert TestGetMany.getMany([]) == []
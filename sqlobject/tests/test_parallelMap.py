@@ -0,0 +1,105 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+import Queue
+from sqlobject.parallel import keyRanges, multiprocessing, ParallelResults
+
+########################################
+## Parallel scans of a select
+########################################
+
+class ParallelRow(SQLObject):
+    name = StringCol(length=20)
+    number = IntCol(default=0)
+    price = FloatCol(default=0.0)
+
+def number(row):
+    return row.number
+
+def failing(row):
+    if row.number == 7:
+        raise ValueError(row.number)
+    return row.number
+
+def makeRows():
+    # The workers need a database they can share
+    setupClass(ParallelRow, connection=getSharedConnection())
+    for i in range(20):
+        ParallelRow(name='row%d' % i, number=i, price=i / 2.0)
+
+def test_key_ranges():
+    assert keyRanges(1, 10, 3) == [(1, 4, False), (4, 7, False),
+                                   (7, 11, False)]
+    assert keyRanges(5, 6, 4) == [(5, 6, False), (6, 7, False)]
+    assert keyRanges(0.0, 1.0, 2) == [(0.0, 0.5, False), (0.5, 1.0, True)]
+    assert keyRanges(2.0, 2.0, 3) == [(2.0, 2.0, True)]
+
+def test_results():
+    stops = []
+    queues = [Queue.Queue(), Queue.Queue()]
+    queues[1].put((1, 'rows', [3, 4]))
+    queues[1].put((1, 'done', None))
+    queues[0].put((0, 'rows', [1, 2]))
+    queues[0].put((0, 'done', None))
+    assert list(ParallelResults(queues, True, stops.append)) == [1, 2, 3, 4]
+    assert stops == [True]
+    queue = Queue.Queue()
+    queue.put((0, 'rows', [1]))
+    queue.put((1, 'error', KeyError(5)))
+    results = ParallelResults([queue] * 2, False, stops.append)
+    assert results.next() == 1
+    raises(KeyError, results.next)
+    assert stops == [True, False]
+    raises(StopIteration, results.next)
+
+def test_threads():
+    makeRows()
+    select = ParallelRow.select(ParallelRow.q.number >= 3, orderBy='number')
+    assert list(select.parallelMap(number, workers=3, batchSize=2)) \
+           == range(3, 20)
+    numbers = list(select.parallelMap(number, workers=4, ordered=False))
+    numbers.sort()
+    assert numbers == range(3, 20)
+    assert list(select.parallelMap(number, partitionBy='price',
+                                   workers=3)) == range(3, 20)
+    assert list(ParallelRow.selectBy(name='none').parallelMap(number)) == []
+    raises(ValueError, select.parallelMap, number, partitionBy='name')
+    raises(ValueError, select[:5].parallelMap, number)
+
+def test_refused():
+    makeRows()
+    select = ParallelRow.select()
+    memory = connectionForURI('sqlite:/:memory:')
+    raises(ValueError, select.connection(memory).parallelMap, number)
+    trans = ParallelRow._connection.transaction()
+    try:
+        raises(ValueError, select.connection(trans).parallelMap, number)
+    finally:
+        trans.rollback()
+    raises(ValueError, select.parallelMap, number, mode='fork')
+    raises(ValueError, select.parallelMap, number, workers=0)
+
+def test_errors():
+    makeRows()
+    results = ParallelRow.select(orderBy='number').parallelMap(
+        failing, workers=2, batchSize=1)
+    raises(ValueError, list, results)
+    # Stopped before the end
+    results = ParallelRow.select().parallelMap(number, workers=2,
+                                               batchSize=1)
+    results.next()
+    results.close()
+    assert list(results) == []
+
+def test_processes():
+    if multiprocessing is None:
+        return
+    makeRows()
+    select = ParallelRow.select(ParallelRow.q.number < 15, orderBy='number')
+    assert list(select.parallelMap(number, workers=3, mode='process')) \
+           == range(15)
+    numbers = list(select.parallelMap(number, workers=3, mode='process',
+                                      ordered=False))
+    numbers.sort()
+    assert numbers == range(15)
+    raises(ValueError, list,
+           select.parallelMap(failing, workers=2, mode='process'))
@@ -0,0 +1,70 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class ParamQueryPerson(SQLObject):
+    name = StringCol(length=50)
+    age = IntCol(default=None)
+    born = DateCol(default=None)
+    addresses = MultipleJoin('ParamQueryAddress', joinColumn='person_id')
+    tags = RelatedJoin('ParamQueryTag')
+
+class ParamQueryAddress(SQLObject):
+    street = StringCol(length=50)
+    person = ForeignKey('ParamQueryPerson')
+
+class ParamQueryTag(SQLObject):
+    name = StringCol(length=50)
+    people = RelatedJoin('ParamQueryPerson')
+
+def setup():
+    setupClass([ParamQueryPerson, ParamQueryAddress, ParamQueryTag])
+    conn = ParamQueryPerson._connection
+    conn.paramQueries = True
+    conn.statementCache.clear()
+    conn.statementCache.resetStats()
+    return conn
+
+def test_paramQueries():
+    conn = setup()
+    try:
+        person = ParamQueryPerson(name="O'Brien")
+        person.age = 30
+        person.set(name='Bob', age=31)
+        person.expire()
+        assert person.name == 'Bob'
+        assert person.age == 31
+        # Values that are not plain types are rendered as literals
+        import datetime
+        person.born = datetime.date(1970, 1, 2)
+        person.expire()
+        assert person.born == datetime.date(1970, 1, 2)
+        ParamQueryAddress(street='Main St', person=person)
+        tag = ParamQueryTag(name='t')
+        person.addParamQueryTag(tag)
+        assert [a.street for a in person.addresses] == ['Main St']
+        assert person.tags == [tag]
+        assert tag.people == [person]
+        person.destroySelf()
+        assert ParamQueryPerson.select().count() == 0
+        stats = conn.statementCache.stats()
+        assert stats['misses'] > 0
+        assert stats['hits'] > 0
+    finally:
+        conn.paramQueries = False
+
+def test_statementCache_size():
+    conn = setup()
+    try:
+        cache = conn.statementCache
+        size = cache.size
+        cache.size = 4
+        try:
+            for i in range(10):
+                cache.put(('test', i), 'SELECT %i' % i)
+                assert len(cache.statements) <= 4
+            assert cache.get(('test', 9)) == 'SELECT 9'
+            assert cache.get(('test', 0)) is None
+        finally:
+            cache.size = size
+    finally:
+        conn.paramQueries = False
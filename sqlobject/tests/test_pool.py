@@ -0,0 +1,103 @@
+import py
+import threading
+import time
+from sqlobject import *
+from sqlobject.dbconnection import DBAPI
+from sqlobject.dberrors import PoolTimeoutError
+from sqlobject.tests.dbtest import *
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+class PoolTestConnection(DBAPI):
+    # A plain DBAPI connection; SQLiteConnection has its own
+    # per-thread connection handling
+
+    supportTransactions = False
+    dbName = 'sqlite'
+
+    def __init__(self, **kw):
+        self.module = sqlite3
+        self.made = 0
+        DBAPI.__init__(self, **kw)
+
+    def makeConnection(self):
+        self.made += 1
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+def setup_module(module):
+    if sqlite3 is None:
+        py.test.skip("These tests require sqlite3")
+
+def test_pool_reuse():
+    conn = PoolTestConnection()
+    assert conn.queryOne('SELECT 1') == (1,)
+    assert conn.queryOne('SELECT 2') == (2,)
+    assert conn.made == 1
+    stats = conn.poolStats()
+    assert stats['checkedOut'] == 0
+    assert stats['idle'] == 1
+    assert stats['created'] == 1
+
+def test_pool_overflow():
+    conn = PoolTestConnection(poolSize='1', maxOverflow='1', poolTimeout='0.1')
+    c1 = conn.getConnection()
+    c2 = conn.getConnection()
+    assert conn.poolStats()['checkedOut'] == 2
+    raises(PoolTimeoutError, conn.getConnection)
+    stats = conn.poolStats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] == 1
+    conn.releaseConnection(c1)
+    conn.releaseConnection(c2)
+    # Only poolSize connections are kept
+    assert conn.poolStats()['idle'] == 1
+
+def test_pool_wait():
+    conn = PoolTestConnection(poolSize='1', maxOverflow='0', poolTimeout='5')
+    c1 = conn.getConnection()
+    def release():
+        time.sleep(0.1)
+        conn.releaseConnection(c1)
+    thread = threading.Thread(target=release)
+    thread.start()
+    c2 = conn.getConnection()
+    thread.join()
+    assert c2 is c1
+    stats = conn.poolStats()
+    assert stats['waits'] == 1
+    assert stats['waitTime'] > 0
+    conn.releaseConnection(c2)
+
+def test_pool_recycle():
+    conn = PoolTestConnection(poolRecycle='0')
+    c1 = conn.getConnection()
+    conn.releaseConnection(c1)
+    time.sleep(0.01)
+    c2 = conn.getConnection()
+    assert c2 is not c1
+    assert conn.poolStats()['recycled'] == 1
+    conn.releaseConnection(c2)
+
+def test_pool_prePing():
+    conn = PoolTestConnection(poolPrePing='1')
+    c1 = conn.getConnection()
+    conn.releaseConnection(c1)
+    c1.close()
+    c2 = conn.getConnection()
+    assert c2 is not c1
+    assert conn.poolStats()['pingFailures'] == 1
+    assert conn.queryOne('SELECT 1') == (1,)
+    conn.releaseConnection(c2)
+
+def test_pool_defaultOverflow():
+    conn = PoolTestConnection(poolSize='1', poolTimeout='0.1')
+    conns = [conn.getConnection()
+             for i in range(1 + conn.defaultMaxOverflow)]
+    raises(PoolTimeoutError, conn.getConnection)
+    for c in conns:
+        conn.releaseConnection(c)
+    assert conn.poolStats()['idle'] == 1
+    raises(ValueError, PoolTestConnection, maxOverflow='1')
@@ -0,0 +1,60 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class PrefetchCompany(SQLObject):
+    name = StringCol(length=50)
+
+class PrefetchAuthor(SQLObject):
+    name = StringCol(length=50)
+    company = ForeignKey('PrefetchCompany', default=None)
+
+class PrefetchBook(SQLObject):
+    title = StringCol(length=50)
+    author = ForeignKey('PrefetchAuthor', default=None)
+
+def setup():
+    setupClass([PrefetchCompany, PrefetchAuthor, PrefetchBook])
+    companies = [PrefetchCompany(name='company%d' % i) for i in range(2)]
+    authors = [PrefetchAuthor(name='author%d' % i, company=companies[i % 2])
+               for i in range(3)]
+    for i in range(7):
+        PrefetchBook(title='book%d' % i, author=authors[i % 3])
+    PrefetchBook(title='orphan')
+    for soClass in PrefetchCompany, PrefetchAuthor, PrefetchBook:
+        soClass._connection.cache.clear(soClass)
+
+def test_prefetch():
+    setup()
+    cache = PrefetchAuthor._connection.cache
+    books = []
+    for book in PrefetchBook.select(orderBy='title').prefetch('author'):
+        books.append(book)
+        if book.authorID is not None:
+            assert cache.tryGet(book.authorID, PrefetchAuthor) is not None
+    assert [book.title for book in books] == \
+           ['book%d' % i for i in range(7)] + ['orphan']
+    assert [book.author.name for book in books[:3]] == \
+           ['author0', 'author1', 'author2']
+    assert books[-1].author is None
+
+def test_prefetch_chained():
+    setup()
+    cache = PrefetchCompany._connection.cache
+    results = PrefetchBook.select(PrefetchBook.q.authorID != None)
+    for book in results.prefetch('author.company'):
+        assert cache.tryGet(book.author.companyID, PrefetchCompany) is not None
+    assert results.prefetch('author').prefetch('author.company').ops['prefetch'] == \
+           ('author', 'author.company')
+
+def test_prefetch_batches():
+    setup()
+    results = PrefetchBook.select(orderBy='title').prefetch('authorID')
+    iterator = results.lazyIter()
+    iterator.defaultArraySize = 3
+    assert [book.title for book in iterator] == \
+           ['book%d' % i for i in range(7)] + ['orphan']
+
+def test_prefetch_errors():
+    setup()
+    raises(AttributeError, PrefetchBook.select().prefetch, 'title')
+    raises(AttributeError, PrefetchBook.select().prefetch, 'author.title')
@@ -0,0 +1,82 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class PreloadTeam(SQLObject):
+    name = StringCol(length=50)
+    players = MultipleJoin('PreloadPlayer', joinColumn='team_id',
+                           orderBy='name')
+    sponsors = RelatedJoin('PreloadSponsor')
+    sqlPlayers = SQLMultipleJoin('PreloadPlayer', joinColumn='team_id')
+
+class PreloadPlayer(SQLObject):
+    name = StringCol(length=50)
+    team = ForeignKey('PreloadTeam')
+
+class PreloadSponsor(SQLObject):
+    name = StringCol(length=50)
+    teams = RelatedJoin('PreloadTeam')
+
+def setup():
+    setupClass([PreloadTeam, PreloadPlayer, PreloadSponsor])
+    teams = [PreloadTeam(name='team%d' % i) for i in range(3)]
+    sponsors = [PreloadSponsor(name='sponsor%d' % i) for i in range(2)]
+    for i in range(7):
+        PreloadPlayer(name='player%d' % (6 - i), team=teams[i % 2])
+    teams[0].addPreloadSponsor(sponsors[0])
+    teams[0].addPreloadSponsor(sponsors[1])
+    teams[1].addPreloadSponsor(sponsors[1])
+    return teams
+
+def test_preloadJoins():
+    teams = setup()
+    expected = [[p.name for p in team.players] for team in teams]
+    PreloadTeam.preloadJoins(teams, 'players', 'sponsors')
+    for team in teams:
+        assert team._SO_joinCache is not None
+    assert [[p.name for p in team.players] for team in teams] == expected
+    assert expected[2] == []
+    assert [s.name for s in teams[0].sponsors] == ['sponsor0', 'sponsor1']
+    assert [s.name for s in teams[1].sponsors] == ['sponsor1']
+    assert teams[2].sponsors == []
+
+def test_preloadJoins_cached():
+    teams = setup()
+    PreloadTeam.preloadJoins(PreloadTeam.select(), 'players')
+    # The preloaded list is used until the instance is expired
+    PreloadPlayer(name='new', team=teams[2])
+    assert teams[2].players == []
+    teams[2].expire()
+    assert [p.name for p in teams[2].players] == ['new']
+
+def test_preloadJoins_add_remove():
+    teams = setup()
+    PreloadTeam.preloadJoins(teams, 'sponsors')
+    sponsor = teams[0].sponsors[0]
+    teams[0].removePreloadSponsor(sponsor)
+    assert [s.name for s in teams[0].sponsors] == ['sponsor1']
+    teams[2].addPreloadSponsor(sponsor)
+    assert teams[2].sponsors == [sponsor]
+
+def test_preloadJoins_chunked():
+    teams = setup()
+    conn = PreloadTeam._connection
+    conn.maxInListSize = 2
+    try:
+        PreloadTeam.preloadJoins(teams, 'players')
+    finally:
+        del conn.maxInListSize
+    assert [len(team.players) for team in teams] == [4, 3, 0]
+
+def test_prefetch_joins():
+    setup()
+    results = PreloadTeam.select(orderBy='name').prefetch('players.team')
+    teams = list(results)
+    for team in teams:
+        assert team._SO_joinCache is not None
+    assert [len(team.players) for team in teams] == [4, 3, 0]
+
+def test_preloadJoins_errors():
+    teams = setup()
+    raises(AttributeError, PreloadTeam.preloadJoins, teams, 'name')
+    raises(TypeError, PreloadTeam.preloadJoins, teams, 'sqlPlayers')
+    raises(ValueError, PreloadTeam.select().prefetch, 'sqlPlayers')
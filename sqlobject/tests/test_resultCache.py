@@ -0,0 +1,127 @@
+import time
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.cache import ResultCache
+from sqlobject.sqlbuilder import Alias, Select, LEFTJOINOn
+
+########################################
+## Query result cache
+########################################
+
+class ResultCacheAuthor(SQLObject):
+    name = StringCol(length=20)
+    books = MultipleJoin('ResultCacheBook', joinColumn='author_id')
+    tags = RelatedJoin('ResultCacheTag')
+
+class ResultCacheBook(SQLObject):
+    title = StringCol(length=20)
+    author = ForeignKey('ResultCacheAuthor')
+
+class ResultCacheTag(SQLObject):
+    name = StringCol(length=20)
+    authors = RelatedJoin('ResultCacheAuthor')
+
+def setup():
+    setupClass([ResultCacheAuthor, ResultCacheBook, ResultCacheTag])
+    conn = ResultCacheAuthor._connection
+    conn.resultCache.clear()
+    conn.resultCache.resetStats()
+    author = ResultCacheAuthor(name='a')
+    ResultCacheBook(title='b', author=author)
+    return conn.resultCache, author
+
+def test_count():
+    cache, author = setup()
+    authors = ResultCacheAuthor.select().cached()
+    assert authors.count() == 1
+    assert authors.count() == 1
+    assert cache.stats()['hits'] == 1
+    # Not cached unless asked for
+    ResultCacheAuthor.select().count()
+    assert cache.stats()['hits'] + cache.stats()['misses'] == 2
+    ResultCacheAuthor(name='b')
+    assert authors.count() == 2
+    assert cache.stats()['misses'] == 2
+
+def test_rows():
+    cache, author = setup()
+    books = ResultCacheBook.select(ResultCacheBook.q.title == 'b').cached()
+    book = list(books)[0]
+    assert list(books) == [book]
+    assert cache.stats()['hits'] == 1
+    book.title = 'c'
+    assert list(books) == []
+
+def test_tables():
+    cache, author = setup()
+    books = ResultCacheBook.select(
+        IN(ResultCacheBook.q.authorID,
+           ResultCacheAuthor.select(ResultCacheAuthor.q.name == 'a'))
+        ).cached()
+    other = ResultCacheBook.select().cached()
+    assert books.count() == 1
+    assert other.count() == 1
+    author.name = 'x'
+    # Only the results reading the changed table are dropped
+    assert cache.stats()['size'] == 1
+    assert books.count() == 0
+    assert other.count() == 1
+    tag = ResultCacheTag(name='t')
+    joinTable = [join.intermediateTable
+                 for join in ResultCacheAuthor.sqlmeta.joins
+                 if join.joinMethodName == 'tags'][0]
+    tagged = ResultCacheAuthor.select(clauseTables=[joinTable]).cached()
+    tagged.count()
+    author.addResultCacheTag(tag)
+    assert cache.stats()['invalidations'] == 2
+
+def test_alias():
+    cache, author = setup()
+    book = Alias(ResultCacheBook, 'book_alias')
+    authors = ResultCacheAuthor.select(
+        join=LEFTJOINOn(ResultCacheAuthor, book,
+                        book.q.authorID == ResultCacheAuthor.q.id)).cached()
+    assert authors.count() == 1
+    ResultCacheBook(title='c', author=author)
+    assert authors.count() == 2
+    titles = ResultCacheBook.select(IN(ResultCacheBook.q.title, Select(
+        book.q.title, where=book.q.authorID == author.id))).cached()
+    assert titles.count() == 2
+    ResultCacheBook(title='d', author=author)
+    assert titles.count() == 3
+
+def test_delete():
+    cache, author = setup()
+    books = ResultCacheBook.select().cached()
+    assert books.count() == 1
+    ResultCacheBook.deleteMany(ResultCacheBook.q.authorID == author.id)
+    assert books.count() == 0
+
+def test_transaction():
+    cache, author = setup()
+    authors = ResultCacheAuthor.select().cached()
+    assert authors.count() == 1
+    trans = ResultCacheAuthor._connection.transaction()
+    try:
+        ResultCacheAuthor(name='b', connection=trans)
+        assert authors.connection(trans).count() == 2
+        # The main connection may read the old count until commit
+        assert authors.count() in (1, 2)
+        trans.commit()
+        assert authors.count() == 2
+    finally:
+        trans.commit(close=True)
+
+def test_limits():
+    cache = ResultCache(size=4, ttl=None)
+    for i in range(5):
+        cache.put(i, ['t%d' % i], i)
+    assert cache.stats()['size'] == 3
+    assert cache.get(4) == 4
+    cache.put('old', ['t'], 'value', ttl=-1)
+    assert cache.get('old', 'missing') == 'missing'
+    generation = cache.generation
+    cache.invalidate(['t4'])
+    cache.put('late', ['t'], 'value', generation=generation)
+    assert cache.get('late') is None
+    assert cache.get(4) is None
@@ -0,0 +1,139 @@
+import os
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.rowcache import MemoryRowCache, SQLiteRowCache, makeRowCache
+
+########################################
+## Second-level row cache
+########################################
+
+class RowCacheTest(SQLObject):
+    name = StringCol(length=20)
+    number = IntCol(default=0)
+
+class RowCacheTable(object):
+    """
+    Runs a test with a row cache on the connection of RowCacheTest.
+    """
+
+    def __init__(self, rowCache):
+        setupClass(RowCacheTest)
+        self.conn = RowCacheTest._connection
+        self.rowCache = rowCache
+
+    def reload(self, id):
+        # As if another process got the row
+        self.conn.cache.clear()
+        return RowCacheTest.get(id)
+
+def run(rowCache, test):
+    table = RowCacheTable(rowCache)
+    table.conn.rowCache = rowCache
+    try:
+        test(table)
+    finally:
+        table.conn.rowCache = None
+
+def check_reads(table):
+    # The row is read (and cached) after the INSERT
+    row = RowCacheTest(name='one')
+    assert table.rowCache.stats() == {'hits': 0, 'misses': 1}
+    row = table.reload(row.id)
+    assert row.name == 'one'
+    assert table.rowCache.stats() == {'hits': 1, 'misses': 1}
+    table.reload(row.id).number = 2
+    assert table.reload(row.id).number == 2
+    assert table.rowCache.stats() == {'hits': 2, 'misses': 2}
+    table.reload(row.id).destroySelf()
+    raises(SQLObjectNotFound, table.reload, row.id)
+
+def check_race(table):
+    row = RowCacheTest(name='one')
+    table.rowCache.clear()
+    conn = table.conn
+    selectOne = conn._SO_selectOne
+    def racingSelect(so, columnNames):
+        result = selectOne(so, columnNames)
+        # Another connection changes the row once it has been read
+        conn.query("UPDATE row_cache_test SET number = 5 WHERE id = %s"
+                   % row.id)
+        conn._forgetRows(RowCacheTest.sqlmeta.table, [row.id])
+        return result
+    conn._SO_selectOne = racingSelect
+    try:
+        assert table.reload(row.id).number == 0
+    finally:
+        del conn._SO_selectOne
+    # The old row was not stored
+    assert table.rowCache.get(RowCacheTest.sqlmeta.table, row.id) is None
+    assert table.reload(row.id).number == 5
+
+def test_memory():
+    run(MemoryRowCache(), check_reads)
+    run(MemoryRowCache(), check_race)
+
+def test_sqlite_file():
+    filename = os.path.join(os.path.dirname(__file__), 'rowcache.tmp')
+    if os.path.exists(filename):
+        os.unlink(filename)
+    try:
+        rowCache = makeRowCache(filename)
+        assert isinstance(rowCache, SQLiteRowCache)
+        run(rowCache, check_reads)
+        run(rowCache, check_race)
+        def shared(table):
+            # The rows are in the file for the other processes
+            row = RowCacheTest(name='two')
+            other = SQLiteRowCache(filename)
+            columnNames, values = other.get(RowCacheTest.sqlmeta.table,
+                                            row.id)
+            assert columnNames == ('name', 'number')
+            assert values == ('two', 0)
+        run(rowCache, shared)
+    finally:
+        os.unlink(filename)
+
+def test_bulk():
+    def test(table):
+        row = RowCacheTest(name='one')
+        table.reload(row.id)
+        RowCacheTest.select().update(number=3)
+        assert table.reload(row.id).number == 3
+        table.reload(row.id)
+        RowCacheTest.deleteMany(RowCacheTest.q.id == row.id)
+        raises(SQLObjectNotFound, table.reload, row.id)
+        row = RowCacheTest(name='two')
+        table.reload(row.id)
+        RowCacheTest.clearTable()
+        raises(SQLObjectNotFound, table.reload, row.id)
+    run(MemoryRowCache(), test)
+
+def test_not_cached():
+    def test(table):
+        RowCacheTest.sqlmeta.rowCache = False
+        try:
+            row = RowCacheTest(name='one')
+            table.reload(row.id)
+            table.reload(row.id)
+        finally:
+            del RowCacheTest.sqlmeta.rowCache
+        assert table.rowCache.stats() == {'hits': 0, 'misses': 0}
+    run(MemoryRowCache(), test)
+
+def test_transaction():
+    def test(table):
+        row = RowCacheTest(name='one')
+        table.reload(row.id)
+        trans = table.conn.transaction()
+        try:
+            inTrans = RowCacheTest.get(row.id, connection=trans)
+            inTrans.number = 4
+            # Another connection caches the row again before the commit
+            assert table.reload(row.id).number in (0, 4)
+            trans.commit()
+            assert table.rowCache.get(RowCacheTest.sqlmeta.table,
+                                      row.id) is None
+            assert table.reload(row.id).number == 4
+        finally:
+            trans.commit(close=True)
+    run(MemoryRowCache(), test)
@@ -0,0 +1,103 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from formencode import validators
+
+########################################
+## Loading rows into instances
+########################################
+
+class UpperValidator(validators.Validator):
+    calls = 0
+
+    def to_python(self, value, state):
+        UpperValidator.calls += 1
+        if value is None:
+            return None
+        return value.upper()
+
+class RowLoaderTest(SQLObject):
+    name = StringCol(length=20)
+    number = IntCol(default=None)
+    flag = BoolCol(default=False)
+    plain = Col(default=None)
+    upper = StringCol(length=20, default=None)
+
+def setup():
+    setupClass(RowLoaderTest)
+    RowLoaderTest(name='one', number=1, flag=True, plain='p', upper='u')
+    RowLoaderTest(name='two')
+    RowLoaderTest._connection.cache.clear()
+
+def check(row):
+    assert type(row.number) in (int, long, type(None))
+    assert type(row.flag) is bool
+    assert isinstance(row.name, str)
+
+def test_iteration():
+    setup()
+    rows = list(RowLoaderTest.select(orderBy='id'))
+    for row in rows:
+        check(row)
+    assert [row.name for row in rows] == ['one', 'two']
+    assert rows[0].number == 1
+    assert rows[1].number is None
+    assert rows[0].plain == 'p'
+
+def test_get():
+    setup()
+    row = list(RowLoaderTest.select(RowLoaderTest.q.name == 'one'))[0]
+    RowLoaderTest._connection.cache.clear()
+    row = RowLoaderTest.get(row.id)
+    check(row)
+    assert row.flag is True
+
+def test_plan():
+    loader = RowLoaderTest.sqlmeta._getRowLoader()
+    # Col() has no converter
+    assert len(loader.converters) == 4
+    assert RowLoaderTest.sqlmeta._getRowLoader() is loader
+    # A short row leaves the missing columns unloaded
+    row = RowLoaderTest(name='three')
+    loader.load(row, ('four',))
+    assert row.name == 'four'
+
+def test_validator_change():
+    setup()
+    column = RowLoaderTest.sqlmeta.columns['upper']
+    validator = column.validator
+    column.validator = UpperValidator()
+    try:
+        UpperValidator.calls = 0
+        RowLoaderTest._connection.cache.clear()
+        rows = list(RowLoaderTest.select(orderBy='id'))
+        assert rows[0].upper == 'U'
+        assert UpperValidator.calls == 2
+    finally:
+        column.validator = validator
+    RowLoaderTest._connection.cache.clear()
+    rows = list(RowLoaderTest.select(orderBy='id'))
+    assert rows[0].upper == 'u'
+
+class StateValidator(validators.Validator):
+    instances = []
+
+    def to_python(self, value, state):
+        StateValidator.instances.append(
+            isinstance(state.soObject, RowLoaderTest))
+        return value
+
+def test_cached_rows():
+    setup()
+    column = RowLoaderTest.sqlmeta.columns['upper']
+    validator = column.validator
+    column.validator = StateValidator()
+    try:
+        one = RowLoaderTest.selectBy(name='one').getOne()
+        StateValidator.instances = []
+        rows = list(RowLoaderTest.select(orderBy='id'))
+        assert rows[0] is one
+        # The batch is converted for the class, the cached row for
+        # its own instance
+        assert StateValidator.instances == [False, True]
+    finally:
+        column.validator = validator
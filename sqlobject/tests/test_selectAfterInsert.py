@@ -0,0 +1,55 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class TrustInsert(SQLObject):
+    class sqlmeta:
+        selectAfterInsert = False
+    name = StringCol(length=50)
+    value = IntCol(default=1)
+    serverValue = IntCol(defaultSQL='7')
+
+class SelectInsert(SQLObject):
+    name = StringCol(length=50)
+    serverValue = IntCol(defaultSQL='7')
+
+def test_trustInsert():
+    setupClass(TrustInsert)
+    obj = TrustInsert(name='a')
+    assert obj.name == 'a'
+    assert obj.value == 1
+    if not TrustInsert._connection.insertReturning:
+        # Left to the database, so it is loaded when accessed
+        assert '_SO_val_serverValue' not in obj.__dict__
+    assert obj.serverValue == 7
+    assert TrustInsert.get(obj.id) is obj
+    obj.expire()
+    assert obj.name == 'a'
+
+def test_trustInsert_update():
+    setupClass(TrustInsert)
+    obj = TrustInsert(name='a')
+    obj.syncUpdate()
+    obj.sqlmeta.lazyUpdate = True
+    try:
+        obj.set(name='b', value=2)
+        assert obj.sqlmeta.dirty
+        obj.syncUpdate()
+    finally:
+        obj.sqlmeta.lazyUpdate = False
+    assert not obj.sqlmeta.dirty
+    obj.expire()
+    assert (obj.name, obj.value) == ('b', 2)
+
+def test_selectAfterInsert_connection():
+    setupClass(SelectInsert)
+    obj = SelectInsert(name='a')
+    assert '_SO_val_serverValue' in obj.__dict__
+    conn = SelectInsert._connection
+    conn.selectAfterInsert = False
+    try:
+        obj = SelectInsert(name='b')
+    finally:
+        conn.selectAfterInsert = True
+    assert obj.name == 'b'
+    assert obj.serverValue == 7
+    assert not getConnection(selectAfterInsert='0').selectAfterInsert
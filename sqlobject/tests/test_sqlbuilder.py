@@ -69,3 +69,31 @@ def test_str_or_sqlrepr():
     delete = Delete('employees', where=None)
     assert sqlrepr(delete, 'sqlite') == \
         "DELETE FROM employees"
+
+def test_select_cache():
+    setupClass(TestSQLBuilder)
+    from sqlobject import sqlbuilder
+    cache = sqlbuilder.SelectCache()
+    def select(name, values):
+        return Select([TestSQLBuilder.q.name],
+                      where=AND(TestSQLBuilder.q.name == name,
+                                IN(TestSQLBuilder.q.value, values),
+                                LIKE(TestSQLBuilder.q.name, 'x%')),
+                      orderBy=TestSQLBuilder.q.value, start=5, end=10)
+    for name, values in [('a', [1, 2]), ("b'c", [3]), (None, [])]:
+        query = select(name, values)
+        assert cache.sqlrepr(query, 'sqlite') == query._sqlrepr('sqlite')
+    assert cache.stats()['misses'] == 2 # None is part of the shape
+    assert cache.stats()['hits'] == 1
+    assert cache.sqlrepr(select('d', [4, 5]), 'sqlite') == \
+        "SELECT test_sql_builder.name FROM test_sql_builder WHERE " \
+        "(((test_sql_builder.name) = ('d')) AND " \
+        "(((test_sql_builder.value) IN (4, 5)) AND " \
+        "(test_sql_builder.name LIKE ('x%'))))" \
+        " ORDER BY test_sql_builder.value LIMIT 5 OFFSET 5"
+    assert cache.stats()['hits'] == 2
+
+    # Other expression classes are rendered as usual
+    query = Select(['id'], where=Outer(TestSQLBuilder).q.value == 1)
+    assert cache.sqlrepr(query, 'sqlite') == query._sqlrepr('sqlite')
+    assert cache.stats()['uncached'] == 1
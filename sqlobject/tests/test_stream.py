@@ -0,0 +1,73 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class StreamRow(SQLObject):
+    name = StringCol(length=50)
+    value = IntCol()
+
+def setup():
+    setupClass(StreamRow)
+    for i in range(25):
+        StreamRow(name='row%02d' % i, value=i)
+    StreamRow._connection.cache.clear(StreamRow)
+
+def test_stream():
+    setup()
+    rows = StreamRow.select(orderBy='name').stream(batchSize=7)
+    assert [row.value for row in rows] == range(25)
+
+def test_stream_cache():
+    setup()
+    cache = StreamRow._connection.cache
+    first = StreamRow.select(StreamRow.q.value == 3).getOne()
+    rows = list(StreamRow.select(orderBy='value').stream(batchSize=10,
+                                                         cache=False))
+    assert [row.name for row in rows] == ['row%02d' % i for i in range(25)]
+    # Uncached instances are new objects, and not put in the cache
+    assert rows[3] is not first
+    assert rows[3].id == first.id
+    assert cache.tryGet(rows[4].id, StreamRow) is None
+    cached = list(StreamRow.select(orderBy='value').stream())
+    assert cached[3] is first
+
+def test_stream_abandon():
+    setup()
+    rows = StreamRow.select(orderBy='value').stream(batchSize=5)
+    assert rows.next().value == 0
+    del rows
+    assert StreamRow.select().count() == 25
+
+def test_stream_transaction():
+    setup()
+    conn = StreamRow._connection
+    if not conn.supportTransactions:
+        return
+    trans = conn.transaction()
+    try:
+        rows = StreamRow.select(orderBy='value', connection=trans)
+        assert [row.value for row in rows.stream(batchSize=4)] == range(25)
+    finally:
+        trans.commit(close=True)
+
+def test_stream_transaction_interleaved():
+    setup()
+    conn = StreamRow._connection
+    if not conn.supportTransactions or not conn.streamInterleaves:
+        return
+    trans = conn.transaction()
+    try:
+        rows = StreamRow.select(orderBy='value',
+                                connection=trans).stream(batchSize=4)
+        # Not read in advance
+        assert rows.cursor is not None
+        values = []
+        for row in rows:
+            values.append(row.value)
+            # Other statements on the connection of the cursor
+            row.value = row.value + 100
+            assert StreamRow.select(connection=trans).count() == 25
+        assert values == range(25)
+        assert StreamRow.select(StreamRow.q.value >= 100,
+                                connection=trans).count() == 25
+    finally:
+        trans.commit(close=True)
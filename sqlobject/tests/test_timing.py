@@ -0,0 +1,122 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+from sqlobject.timing import QueryHistogram, SlowQueryLog, RequestStats, \
+     statementShape
+
+########################################
+## Query timing
+########################################
+
+class TimingTest(SQLObject):
+    name = StringCol(length=20)
+
+class EventList(object):
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event):
+        self.events.append(event)
+
+class TextList(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+def run(sink, test):
+    setupClass(TimingTest)
+    TimingTest(name='one')
+    TimingTest(name='two')
+    conn = TimingTest._connection
+    conn.addQuerySink(sink)
+    try:
+        test(conn)
+    finally:
+        conn.removeQuerySink(sink)
+
+def test_shape():
+    assert statementShape("SELECT x FROM t WHERE a = 'it''s' AND b = 12") \
+           == "SELECT x FROM t WHERE a = ? AND b = ?"
+    assert statementShape("SELECT x1 FROM t WHERE id IN (1, 2, 3)") \
+           == "SELECT x1 FROM t WHERE id IN (...)"
+    assert statementShape("INSERT INTO t (a, b) VALUES (1, 'x'), (-2.5, 'y')") \
+           == "INSERT INTO t (a, b) VALUES (...)"
+
+def test_events():
+    sink = EventList()
+    def test(conn):
+        assert len(list(TimingTest.select())) == 2
+        assert TimingTest.select().count() == 2
+        TimingTest.select().update(name='three')
+        assert sink.events[0].rows == 2
+        assert sink.events[0].shape.startswith('SELECT')
+        assert sink.events[1].rows == 1
+        if conn.dbName == 'sqlite':
+            assert sink.events[2].rows == 2
+        for event in sink.events:
+            assert event.duration >= 0
+            assert event.error is None
+        raises(Exception, conn.queryAll, 'SELECT nothing FROM nowhere')
+        assert sink.events[-1].error is not None
+    run(sink, test)
+    assert sink not in TimingTest._connection._querySinks
+    # Not timed any more
+    count = len(sink.events)
+    list(TimingTest.select())
+    assert len(sink.events) == count
+
+def test_transaction():
+    sink = EventList()
+    def test(conn):
+        trans = conn.transaction()
+        try:
+            rows = list(TimingTest.select(connection=trans))
+            TimingTest(name='three', connection=trans)
+        finally:
+            trans.commit(close=True)
+        assert sink.events[0].rows == 2
+        assert [event for event in sink.events
+                if event.statement.startswith('INSERT')]
+    run(sink, test)
+
+def test_histogram():
+    histogram = QueryHistogram(buckets=[10.0])
+    def test(conn):
+        for name in ('one', 'two', 'three'):
+            list(TimingTest.selectBy(name=name))
+        shape, stats = histogram.top(1, 'count')[0]
+        assert shape.startswith('SELECT')
+        assert stats['count'] == 3
+        assert stats['rows'] == 2
+        assert stats['buckets'] == [3, 0]
+        assert stats['max'] <= stats['total']
+    run(histogram, test)
+
+def test_slow_log():
+    writer = TextList()
+    def test(conn):
+        conn.queryAll('SELECT name FROM timing_test')
+        assert writer.lines[0].startswith('SLOW')
+        assert writer.lines[0].endswith('SELECT name FROM timing_test')
+    run(SlowQueryLog(0.0, writer), test)
+    def test(conn):
+        conn.queryAll('SELECT name FROM timing_test')
+        assert not writer.lines[1:]
+    run(SlowQueryLog(100, writer), test)
+
+def test_request_stats():
+    requestStats = RequestStats()
+    def test(conn):
+        list(TimingTest.select())
+        requestStats.begin()
+        list(TimingTest.select())
+        TimingTest.get(1).name
+        assert requestStats.current()['queries'] == 1
+        totals = requestStats.end()
+        assert totals['rows'] == 2
+        assert len(totals['shapes']) == 1
+        assert requestStats.current() is None
+    run(requestStats, test)
@@ -0,0 +1,143 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+########################################
+## Merging the rows written by a transaction on commit
+########################################
+
+class TransMerge(SQLObject):
+    name = StringCol(length=20)
+    number = IntCol(default=0)
+
+class QueryCount(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def record(self, event):
+        self.count += 1
+
+def makeRows(merge):
+    setupClass(TransMerge)
+    conn = TransMerge._connection
+    written = TransMerge(name='written')
+    read = TransMerge(name='read')
+    gone = TransMerge(name='gone')
+    trans = conn.transaction()
+    trans.mergeOnCommit = merge
+    return conn, trans, written, read, gone
+
+def test_merge():
+    if not supports('transactions'):
+        return
+    conn, trans, written, read, gone = makeRows(True)
+    try:
+        TransMerge.get(written.id, connection=trans).set(name='new', number=2)
+        TransMerge.get(read.id, connection=trans).name
+        TransMerge.get(gone.id, connection=trans).destroySelf()
+        trans.commit()
+        queries = QueryCount()
+        conn.addQuerySink(queries)
+        try:
+            assert not written.sqlmeta.expired
+            assert (written.name, written.number) == ('new', 2)
+            assert not read.sqlmeta.expired
+            assert queries.count == 0
+        finally:
+            conn.removeQuerySink(queries)
+        assert gone.sqlmeta.expired
+        raises(SQLObjectNotFound, TransMerge.get, gone.id)
+    finally:
+        trans.commit(close=True)
+
+def test_set_based():
+    if not supports('transactions'):
+        return
+    conn, trans, written, read, gone = makeRows(True)
+    try:
+        TransMerge.get(written.id, connection=trans).name = 'new'
+        # Changes the row behind the instance of the transaction
+        TransMerge.select(TransMerge.q.id == written.id,
+                          connection=trans).update(number=3)
+        trans.commit()
+        assert written.sqlmeta.expired
+        # The cached rows changed by update() are known
+        assert not read.sqlmeta.expired
+        assert (written.name, written.number) == ('new', 3)
+        # Not those deleted by deleteMany()
+        TransMerge.deleteMany(TransMerge.q.id == gone.id, connection=trans)
+        trans.commit()
+        assert read.sqlmeta.expired
+    finally:
+        trans.commit(close=True)
+
+def test_lazy():
+    if not supports('transactions'):
+        return
+    conn, trans, written, read, gone = makeRows(True)
+    try:
+        inTrans = TransMerge.get(written.id, connection=trans)
+        inTrans.name = 'new'
+        inTrans.sqlmeta.lazyUpdate = True
+        inTrans.number = 4
+        trans.commit()
+        # The pending change is not merged
+        assert written.sqlmeta.expired
+        assert (written.name, written.number) == ('new', 0)
+    finally:
+        trans.commit(close=True)
+
+def test_expire():
+    if not supports('transactions'):
+        return
+    conn, trans, written, read, gone = makeRows(False)
+    try:
+        TransMerge.get(written.id, connection=trans).name = 'new'
+        TransMerge.get(read.id, connection=trans).name
+        trans.commit()
+        assert written.sqlmeta.expired
+        assert read.sqlmeta.expired
+        assert written.name == 'new'
+    finally:
+        trans.commit(close=True)
+
+class TransMergeAuthor(SQLObject):
+    name = StringCol(length=20)
+    books = RelatedJoin('TransMergeBook')
+
+class TransMergeBook(SQLObject):
+    title = StringCol(length=20)
+    authors = RelatedJoin('TransMergeAuthor')
+
+def test_related_join():
+    if not supports('transactions'):
+        return
+    setupClass([TransMergeAuthor, TransMergeBook])
+    conn = TransMergeAuthor._connection
+    author = TransMergeAuthor(name='a')
+    first = TransMergeBook(title='b1')
+    second = TransMergeBook(title='b2')
+    author.addTransMergeBook(first)
+    # Preloaded in the parent connection
+    list(TransMergeAuthor.select().prefetch('books'))
+    list(TransMergeBook.select().prefetch('authors'))
+    assert [book.title for book in author.books] == ['b1']
+    assert second.authors == []
+    trans = conn.transaction()
+    trans.mergeOnCommit = True
+    try:
+        inTrans = TransMergeAuthor.get(author.id, connection=trans)
+        inTrans.addTransMergeBook(
+            TransMergeBook.get(second.id, connection=trans))
+        trans.commit()
+        titles = [book.title for book in author.books]
+        titles.sort()
+        assert titles == ['b1', 'b2']
+        assert second.authors == [author]
+        inTrans.removeTransMergeBook(
+            TransMergeBook.get(first.id, connection=trans))
+        trans.commit()
+        assert [book.title for book in author.books] == ['b2']
+        assert first.authors == []
+    finally:
+        trans.commit(close=True)
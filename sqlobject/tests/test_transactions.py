@@ -101,3 +101,31 @@ def test_transaction_delete(close=False):
 
 def test_transaction_delete_with_close():
     test_transaction_delete(close=True)
+
+
+def test_transaction_delegation():
+    if not supports('transactions'):
+        return
+    setupClass(TestSOTrans)
+    conn = TestSOTrans._connection
+    trans = conn.transaction()
+    other = conn.transaction()
+    try:
+        # The methods of the connection are on the class of the
+        # transaction, made once per class of connection
+        assert trans.__class__ is other.__class__
+        assert 'queryForSelect' in trans.__class__.__dict__
+        assert 'queryAll' not in trans.__class__.__dict__
+        assert trans.queryForSelect.im_self is trans
+        # The attributes of the connection are still looked up
+        conn.maxInListSize = 7
+        try:
+            assert trans.maxInListSize == 7
+        finally:
+            del conn.maxInListSize
+        assert trans.maxInListSize == conn.maxInListSize
+        TestSOTrans(name='bob', connection=trans)
+        assert TestSOTrans.select(connection=trans).count() == 1
+    finally:
+        trans.commit(close=True)
+        other.commit(close=True)
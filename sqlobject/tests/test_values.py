@@ -0,0 +1,50 @@
+from sqlobject import *
+from sqlobject.tests.dbtest import *
+
+class ValuesRow(SQLObject):
+    name = StringCol(length=50)
+    value = IntCol(default=None)
+    flag = BoolCol(default=False)
+
+def setup():
+    setupClass(ValuesRow)
+    for i in range(5):
+        ValuesRow(name='row%d' % i, value=i, flag=bool(i % 2))
+
+def test_values():
+    setup()
+    results = ValuesRow.select(orderBy='name')
+    assert results.values('name', 'value') == \
+           [('row%d' % i, i) for i in range(5)]
+    rows = results.values()
+    assert len(rows) == 5
+    assert rows[1][1:] == ('row1', 1, True)
+    assert rows[0][3] is False
+    assert results.filter(ValuesRow.q.value > 2).values('value') == [(3,), (4,)]
+    assert results.lazyColumns(True).values('name')[0] == ('row0',)
+
+def test_values_errors():
+    setup()
+    raises(AttributeError, ValuesRow.select().values, 'nonexistent')
+
+def test_namedtuples():
+    setup()
+    rows = ValuesRow.select(orderBy='-value').namedtuples('id', 'name', 'flag')
+    assert [row.name for row in rows] == ['row%d' % i for i in range(4, -1, -1)]
+    row = rows[0]
+    assert row.flag is False
+    assert tuple(row) == (row.id, 'row4', False)
+    assert row._asdict()['name'] == 'row4'
+    raises(AttributeError, setattr, row, 'other', 1)
+    assert type(row) is type(ValuesRow.select().namedtuples('id', 'name', 'flag')[0])
+
+def test_namedtuples_compare():
+    setup()
+    select = ValuesRow.select(ValuesRow.q.value == 2)
+    row, = select.namedtuples('name', 'value')
+    other, = select.namedtuples('name', 'value')
+    assert row == other and not row != other
+    assert row == ('row2', 2) and ('row2', 2) == row
+    assert len(set([row, other])) == 1
+    assert not row == None and row != None
+    assert row != ('row2',) and row != 'row2'
@@ -0,0 +1,221 @@
+"""
+Query timing.
+
+A connection with query sinks (``connection.addQuerySink(sink)``)
+times every statement it runs and passes a ``QueryEvent`` -- the
+statement, how long it took, the rows it returned (or changed) and
+how long the thread waited for the database connection -- to
+``sink.record(event)``.  Without sinks nothing is timed.
+
+A ``SELECT`` read by ``queryAll()``/``queryOne()`` is timed up to the
+fetch of its rows; the one of ``select()`` until the iteration over
+the results ends (or the iterator is dropped).  For other statements
+``rows`` is the row count of the cursor, or None when the driver
+does not know it.
+
+Three sinks are provided: ``QueryHistogram`` counts the statements by
+shape (the statement with its literals replaced by ``?``),
+``SlowQueryLog`` writes the statements that took longer than a
+threshold, and ``RequestStats`` adds up the statements of each
+request of a thread.  The ``slowQueryThreshold`` connection parameter
+adds a ``SlowQueryLog`` writing to the debug output of the
+connection.
+"""
+
+from bisect import bisect_left
+import re
+import threading
+
+from util.threadinglocal import local as threading_local
+
+_stringLiteral = re.compile(r"'(?:[^']|'')*'")
+_numberLiteral = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_valueList = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)")
+_rowList = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_spaces = re.compile(r"\s+")
+
+def statementShape(statement):
+    """
+    Returns ``statement`` with its string and number literals replaced
+    by ``?`` and its lists of values by ``(...)``, so the statements
+    differing only by their values have the same shape.
+    """
+    shape = _stringLiteral.sub('?', statement)
+    shape = _numberLiteral.sub('?', shape)
+    shape = _valueList.sub('(...)', shape)
+    shape = _rowList.sub('(...)', shape)
+    return _spaces.sub(' ', shape).strip()
+
+class QueryEvent(object):
+
+    """
+    A statement run by ``connection``: ``duration`` and ``wait`` (the
+    time spent getting the database connection first) are in seconds;
+    ``error`` is the exception the statement raised, if any.
+    """
+
+    def __init__(self, connection, statement, params=None, wait=0.0):
+        self.connection = connection
+        self.statement = statement
+        self.params = params
+        self.wait = wait
+        self.duration = 0.0
+        self.rows = None
+        self.error = None
+        self._shape = None
+
+    def shape(self):
+        if self._shape is None:
+            self._shape = statementShape(str(self.statement))
+        return self._shape
+    shape = property(shape)
+
+    def __repr__(self):
+        return '<%s %.6fs rows=%s %r>' % (
+            self.__class__.__name__, self.duration, self.rows,
+            self.statement)
+
+class QueryHistogram(object):
+
+    """
+    Counts the statements by shape, with their total and longest
+    duration, the rows and the wait time, and how many of them took
+    up to each of the ``buckets`` (in seconds) -- the last count is
+    of the statements that took longer.
+    """
+
+    buckets = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+    def __init__(self, buckets=None):
+        if buckets is not None:
+            self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.shapes = {}
+
+    def record(self, event):
+        shape = event.shape
+        bucket = bisect_left(self.buckets, event.duration)
+        self.lock.acquire()
+        try:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                stats = self.shapes[shape] = {
+                    'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0,
+                    'wait': 0.0, 'errors': 0,
+                    'buckets': [0] * (len(self.buckets) + 1)}
+            stats['count'] += 1
+            stats['total'] += event.duration
+            if event.duration > stats['max']:
+                stats['max'] = event.duration
+            if event.rows:
+                stats['rows'] += event.rows
+            stats['wait'] += event.wait
+            if event.error is not None:
+                stats['errors'] += 1
+            stats['buckets'][bucket] += 1
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        """
+        Returns a dictionary of the counters by shape.
+        """
+        self.lock.acquire()
+        try:
+            result = {}
+            for shape, stats in self.shapes.items():
+                stats = stats.copy()
+                stats['buckets'] = list(stats['buckets'])
+                result[shape] = stats
+            return result
+        finally:
+            self.lock.release()
+
+    def top(self, count=10, key='total'):
+        """
+        Returns the ``(shape, counters)`` of the ``count`` shapes with
+        the largest ``key`` counter, largest first.
+        """
+        items = [(stats[key], shape, stats)
+                 for shape, stats in self.stats().items()]
+        items.sort()
+        items.reverse()
+        return [(shape, stats) for value, shape, stats in items[:count]]
+
+class SlowQueryLog(object):
+
+    """
+    Writes the statements that took ``threshold`` seconds or longer to
+    ``writer`` (anything with a ``write(text)`` method); by default
+    they are logged as warnings to the ``sqlobject.slowquery`` logger.
+    """
+
+    def __init__(self, threshold=1.0, writer=None):
+        self.threshold = threshold
+        if writer is None:
+            import logging
+            writer = _LoggerWriter(logging.getLogger('sqlobject.slowquery'))
+        self.writer = writer
+
+    def record(self, event):
+        if event.duration < self.threshold:
+            return
+        if event.error is not None:
+            status = 'error=%s' % event.error.__class__.__name__
+        else:
+            status = 'rows=%s' % event.rows
+        self.writer.write('SLOW %.3fs wait=%.3fs %s: %s' % (
+            event.duration, event.wait, status, event.statement))
+
+class _LoggerWriter(object):
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def write(self, text):
+        self.logger.warning(text)
+
+class RequestStats(object):
+
+    """
+    Adds up the statements each thread runs between ``begin()`` and
+    ``end()`` -- typically while handling a request.  ``end()`` returns
+    the totals: the number of ``queries``, their ``duration``,
+    ``rows`` and ``wait`` time, and the number and duration of the
+    statements of each shape in ``shapes``.
+    """
+
+    def __init__(self):
+        self.local = threading_local()
+
+    def begin(self):
+        self.local.totals = {'queries': 0, 'duration': 0.0, 'rows': 0,
+                             'wait': 0.0, 'shapes': {}}
+
+    def end(self):
+        totals = self.current()
+        self.local.totals = None
+        return totals
+
+    def current(self):
+        """
+        Returns the totals of the thread so far, or None outside of
+        ``begin()``/``end()``.
+        """
+        return getattr(self.local, 'totals', None)
+
+    def record(self, event):
+        totals = self.current()
+        if totals is None:
+            return
+        totals['queries'] += 1
+        totals['duration'] += event.duration
+        if event.rows:
+            totals['rows'] += event.rows
+        totals['wait'] += event.wait
+        shape = totals['shapes'].setdefault(event.shape, [0, 0.0])
+        shape[0] += 1
+        shape[1] += event.duration